@@ -1,23 +1,35 @@
 import asyncio
 import atexit
 import datetime
+import json
 import logging
 import nest_asyncio
 import os
 import signal
 import uvicorn
 from dotmap import DotMap
-from fastapi import FastAPI, Response
+from fastapi import FastAPI, HTTPException, Response, WebSocket, WebSocketDisconnect
 from pathlib import Path
 from starlette.requests import Request
 from starlette.responses import JSONResponse
-from typing import Any, Dict
+from typing import Any, Dict, Set
 
 from core import controller
+from core.cache import single_flight, response_cache
+from core.candle_store import candle_store
+from core.history import history
+from core.dispatcher import dispatcher
 from core.constants import constants
 from core.model import model
+from core.order_books import order_book_engine
 from core.properties import properties
-from core.types import SystemStatus, APIResponse, CCXTAPIRequest, Credentials, APIResponseStatus
+from core.rate_limiter import rate_limiter
+from core.registry import exchange_registry
+from core.streams import StreamKey, stream_hub
+from core.telegram_client import telegram_client
+from core.telegram_outbox import telegram_outbox
+from core.types import SystemStatus, APIResponse, CCXTAPIRequest, Credentials, APIResponseStatus, Protocol, Environment, \
+	StreamChannel
 from tests.integration_tests import IntegrationTests
 
 RUN_INTEGRATION_TESTS = os.getenv("RUN_INTEGRATION_TESTS", properties.get_or_default("testing.integration.run", "false")).lower() in ["true", "1"]
@@ -30,9 +42,32 @@ properties.load(app)
 # Needs to come after properties loading
 from core.logger import logger
 from core.helpers import authenticate, unauthorized_exception, create_jwt_token, update_user, validate, \
-	delete_user, get_user, extract_jwt_token, extract_all_parameters, validate_request_token
+	delete_user, get_user, extract_jwt_token, extract_all_parameters, validate_request_token, update_user_token
 from core.telegram_bot import telegram
 
+TOKEN_EXPIRATION_DELTA = datetime.timedelta(
+	seconds=properties.get_or_default("server.authentication.cookie.maxAge", constants.authentication.cookie.maxAge)
+)
+COOKIE_HTTP_ONLY = properties.get_or_default("server.authentication.cookie.httpOnly", constants.authentication.cookie.httpOnly)
+COOKIE_SECURE = properties.get_or_default("server.authentication.cookie.secure", constants.authentication.cookie.secure)
+COOKIE_SAME_SITE = properties.get_or_default("server.authentication.cookie.sameSite", constants.authentication.cookie.sameSite)
+COOKIE_MAX_AGE = properties.get_or_default("server.authentication.cookie.maxAge", constants.authentication.cookie.maxAge)
+COOKIE_PATH = properties.get_or_default("server.authentication.cookie.path", constants.authentication.cookie.path)
+COOKIE_DOMAIN = properties.get_or_default("server.authentication.cookie.domain", constants.authentication.cookie.domain)
+
+
+def set_token_cookie(response: Response, token: str):
+	response.set_cookie(
+		key="token",
+		value=f"Bearer {token}",
+		httponly=COOKIE_HTTP_ONLY,
+		secure=COOKIE_SECURE,
+		samesite=COOKIE_SAME_SITE,
+		max_age=COOKIE_MAX_AGE,
+		path=COOKIE_PATH,
+		domain=COOKIE_DOMAIN,
+	)
+
 
 @app.post("/auth/signIn")
 async def auth_sign_in(request: Credentials, response: Response):
@@ -43,26 +78,14 @@ async def auth_sign_in(request: Credentials, response: Response):
 
 	credentials: Credentials = credentials
 
-	token_expiration_delta = datetime.timedelta(
-		seconds=properties.get_or_default("server.authentication.cookie.maxAge", constants.authentication.cookie.maxAge)
-	)
 	token = create_jwt_token(
 		data={
 			"sub": credentials.id
 		},
-		expires_delta=token_expiration_delta
+		expires_delta=TOKEN_EXPIRATION_DELTA
 	)
 
-	response.set_cookie(
-		key="token",
-		value=f"Bearer {token}",
-		httponly=properties.get_or_default("server.authentication.cookie.httpOnly", constants.authentication.cookie.httpOnly),
-		secure=properties.get_or_default("server.authentication.cookie.secure", constants.authentication.cookie.secure),
-		samesite=properties.get_or_default("server.authentication.cookie.sameSite", constants.authentication.cookie.sameSite),
-		max_age=properties.get_or_default("server.authentication.cookie.maxAge", constants.authentication.cookie.maxAge),
-		path=properties.get_or_default("server.authentication.cookie.path", constants.authentication.cookie.path),
-		domain=properties.get_or_default("server.authentication.cookie.domain", constants.authentication.cookie.domain),
-	)
+	set_token_cookie(response, token)
 
 	credentials.jwtToken = token
 
@@ -96,23 +119,13 @@ async def auth_refresh(request: Request, response: Response):
 
 	user = get_user(token)
 
-	token_expiration_delta = datetime.timedelta(
-		seconds=properties.get_or_default("server.authentication.cookie.maxAge", constants.authentication.cookie.maxAge)
-	)
 	token = create_jwt_token(
-		data={"sub": str(user.id)}, expires_delta=token_expiration_delta
+		data={"sub": str(user.id)}, expires_delta=TOKEN_EXPIRATION_DELTA
 	)
 
-	response.set_cookie(
-		key="token",
-		value=f"Bearer {token}",
-		httponly=properties.get_or_default("server.authentication.cookie.httpOnly", constants.authentication.cookie.httpOnly),
-		secure=properties.get_or_default("server.authentication.cookie.secure", constants.authentication.cookie.secure),
-		samesite=properties.get_or_default("server.authentication.cookie.sameSite", constants.authentication.cookie.sameSite),
-		max_age=properties.get_or_default("server.authentication.cookie.maxAge", constants.authentication.cookie.maxAge),
-		path=properties.get_or_default("server.authentication.cookie.path", constants.authentication.cookie.path),
-		domain=properties.get_or_default("server.authentication.cookie.domain", constants.authentication.cookie.domain),
-	)
+	update_user_token(user.id, token)
+
+	set_token_cookie(response, token)
 
 	return {"token": token, "type": constants.authentication.jwt.token.type}
 
@@ -160,6 +173,96 @@ async def service_status(request: Request) -> Dict[str, Any]:
 	}).toDict()
 
 
+@app.get("/service/statistics")
+async def service_statistics(request: Request) -> Dict[str, Any]:
+	await validate(request)
+
+	return DotMap({
+		"dispatcher": dispatcher.summary(),
+		"registry": exchange_registry.summary(),
+		"single_flight": single_flight.summary(),
+		"response_cache": response_cache.summary(),
+		"rate_limiter": rate_limiter.summary(),
+		"streams": stream_hub.summary(),
+		"order_books": order_book_engine.summary(),
+		"candles": candle_store.summary(),
+		"history": history.summary(),
+		"telegram": {
+			"outbox": telegram_outbox.summary(),
+			"client": telegram_client.summary(),
+		},
+	}).toDict()
+
+
+def is_batch_call(call: Any) -> bool:
+	# Checked before anything is dispatched, a malformed call must not fail the calls next to it.
+	return isinstance(call, dict) and isinstance(call.get("method"), str) and len(call.get("method")) > 0
+
+
+@app.post("/run/batch")
+async def run_batch(request: Request) -> JSONResponse:
+	await validate(request)
+
+	parameters = await extract_all_parameters(request)
+
+	token = extract_jwt_token(parameters)
+
+	user = get_user(token)
+
+	calls = parameters.get("calls") or []
+	fail_fast = str(parameters.get("failFast", False)).lower() in ["true", "1"]
+
+	if not isinstance(calls, list) or not all(is_batch_call(call) for call in calls) or len(calls) > int(properties.get_or_default("server.batch.size", 20)):
+		return JSONResponse(
+			status_code=APIResponseStatus.EXPECTATION_FAILED_ERROR.http_code,
+			content={
+				"title": "batch",
+				"message": f"""Expected "calls" to be a list of at most {properties.get_or_default("server.batch.size", 20)} calls, each naming its "method".""",
+				"status": APIResponseStatus.EXPECTATION_FAILED_ERROR.id,
+				"result": None
+			}
+		)
+
+	calls = [DotMap(call, _dynamic=False) for call in calls]
+
+	responses = await controller.ccxt_batch([
+		CCXTAPIRequest(
+			user_id=user.id if user else None,
+			exchange_id=call.get("exchangeId") or parameters.get("exchangeId"),
+			exchange_environment=call.get("environment") or parameters.get("environment"),
+			exchange_protocol=call.get("protocol") or parameters.get("protocol"),
+			exchange_method=call.get("method"),
+			exchange_method_parameters=call.get("parameters"),
+			cache_policy=call.get("cache") or parameters.get("cache"),
+			output_format=call.get("format"),
+			output_options=DotMap({
+				"resample": call.get("resample"),
+				"indicators": call.get("indicators"),
+			}, _dynamic=False)
+		) for call in calls
+	], fail_fast)
+
+	json_response = JSONResponse(
+		status_code=APIResponseStatus.SUCCESS.http_code,
+		content={
+			"title": "batch",
+			"message": f"""Executed {len(responses)} calls.""",
+			"status": APIResponseStatus.SUCCESS.id,
+			"result": [
+				{
+					"title": response.title,
+					"message": response.message,
+					"status": response.status.id,
+					"statusCode": response.status.http_code,
+					"result": response.result
+				} for response in responses
+			]
+		}
+	)
+
+	return json_response
+
+
 @app.get("/run")
 @app.post("/run")
 @app.put("/run")
@@ -190,7 +293,13 @@ async def run(request: Request) -> JSONResponse:
 		exchange_environment=parameters.get("environment"),
 		exchange_protocol=parameters.get("protocol"),
 		exchange_method=parameters.get("method"),
-		exchange_method_parameters=parameters.get("parameters")
+		exchange_method_parameters=parameters.get("parameters"),
+		cache_policy=parameters.get("cache"),
+		output_format=parameters.get("format"),
+		output_options=DotMap({
+			"resample": parameters.get("resample"),
+			"indicators": parameters.get("indicators"),
+		}, _dynamic=False)
 	)
 
 	response = await controller.ccxt(options)
@@ -208,6 +317,56 @@ async def run(request: Request) -> JSONResponse:
 	return json_response
 
 
+@app.websocket("/stream")
+async def stream(websocket: WebSocket):
+	# noinspection PyUnusedLocal
+	try:
+		await validate(websocket)
+	except HTTPException as exception:
+		return
+
+	await websocket.accept()
+
+	outbox = stream_hub.create_outbox()
+	subscriptions: Set[StreamKey] = set()
+
+	async def send():
+		while True:
+			await websocket.send_text(await outbox.get())
+
+	sender = asyncio.create_task(send())
+
+	try:
+		while True:
+			text = await websocket.receive_text()
+
+			try:
+				message = DotMap(json.loads(text), _dynamic=False)
+
+				key = (
+					message.get("exchangeId") or properties.get_or_default("exchange.id", constants.default.exchange.id),
+					message.get("environment") or properties.get_or_default("exchange.environment", Environment.PRODUCTION.value),
+					message.get("symbol"),
+					StreamChannel.get_by_id(message.get("channel")),
+				)
+
+				if message.get("action", "subscribe") == "unsubscribe":
+					stream_hub.unsubscribe(key, outbox)
+					subscriptions.discard(key)
+				else:
+					stream_hub.subscribe(key, outbox)
+					subscriptions.add(key)
+			except (ValueError, TypeError) as exception:
+				stream_hub.deliver(outbox, json.dumps({"error": str(exception)}))
+	except WebSocketDisconnect:
+		pass
+	finally:
+		sender.cancel()
+
+		for key in subscriptions:
+			stream_hub.unsubscribe(key, outbox)
+
+
 @app.get("/development/example")
 @app.post("/development/example")
 @app.put("/development/example")
@@ -274,9 +433,20 @@ async def startup():
 	pass
 
 
+async def bind_logger():
+	# Without a polling loop, alerts raised off the API loop are delivered on it.
+	if logger.loop is None:
+		logger.bind_loop(asyncio.get_running_loop())
+
+
 # noinspection PyUnusedLocal
 def shutdown(*args):
-	pass
+	dispatcher.shutdown()
+
+
+async def close_clients():
+	await exchange_registry.shutdown()
+	await telegram_client.close()
 
 
 @atexit.register
@@ -288,6 +458,8 @@ def shutdown_helper():
 
 # app.add_event_handler("startup", startup)
 # app.add_event_handler("shutdown", shutdown)
+app.add_event_handler("startup", bind_logger)
+app.add_event_handler("shutdown", close_clients)
 
 
 def initialize():
@@ -307,8 +479,8 @@ def test():
 		credentials.exchangeOptions = raw_credentials.get("exchange.options")
 
 		user = update_user(credentials)
-		rest_exchange = user.get("exchange.rest")
-		websocket_exchange = user.get("exchange.websocket")
+		rest_exchange = exchange_registry.get(user.id, user.exchangeId, user.exchangeEnvironment, Protocol.REST.value)
+		websocket_exchange = exchange_registry.get(user.id, user.exchangeId, user.exchangeEnvironment, Protocol.WebSocket.value)
 
 		IntegrationTests.instance().initialize(
 			rest_exchange,
@@ -0,0 +1,216 @@
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from functools import partial
+from singleton.singleton import ThreadSafeSingleton
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from core.candle_store import candle_store, get_ohlcv_arguments
+from core.history import HISTORY_KINDS, get_history_arguments, history
+from core.order_books import order_book_engine
+from core.properties import properties
+from core.types import CachePolicy, MagicMethod
+
+
+def resolve_magic_method(method_name: str) -> Optional[MagicMethod]:
+	# noinspection PyBroadException,PyUnusedLocal
+	try:
+		return MagicMethod.find(method_name)
+	except Exception as exception:
+		return None
+
+
+def build_key(exchange_id: str, exchange_environment: str, magic_method: MagicMethod, args: Tuple = (), kwargs: Dict[str, Any] = None, scope: str = None) -> str:
+	arguments = json.dumps([args, kwargs or {}], sort_keys=True, default=str)
+
+	return f"""{scope or "*"}|{exchange_id}|{exchange_environment}|{magic_method.id}|{arguments}"""
+
+
+@ThreadSafeSingleton
+class SingleFlight(object):
+	def __init__(self):
+		self.flights: Dict[Tuple[int, str], asyncio.Task] = {}
+		self.executed = 0
+		self.coalesced = 0
+
+	async def execute(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+		loop = asyncio.get_running_loop()
+		flight_key = (id(loop), key)
+
+		task = self.flights.get(flight_key)
+
+		if task is None:
+			# The fetch runs as its own task, cancelling the caller that started it does not cancel it for the others.
+			task = loop.create_task(self.run(flight_key, fetch))
+			task.add_done_callback(self.retrieve)
+			self.flights[flight_key] = task
+			self.executed += 1
+		else:
+			self.coalesced += 1
+
+		return await asyncio.shield(task)
+
+	async def run(self, flight_key: Tuple[int, str], fetch: Callable[[], Awaitable[Any]]) -> Any:
+		try:
+			return await fetch()
+		finally:
+			self.flights.pop(flight_key, None)
+
+	# noinspection PyMethodMayBeStatic
+	def retrieve(self, task: asyncio.Task):
+		# Marks the exception as retrieved when every caller was cancelled before it arrived.
+		if not task.cancelled():
+			task.exception()
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"in_flight": len(self.flights),
+			"executed": self.executed,
+			"coalesced": self.coalesced,
+		}
+
+
+@ThreadSafeSingleton
+class ResponseCache(object):
+	def __init__(self):
+		self.lock = Lock()
+		self.entries: OrderedDict[str, Tuple[float, Any]] = OrderedDict()
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.expirations = 0
+
+	# noinspection PyMethodMayBeStatic
+	def get_ttl(self, magic_method: MagicMethod) -> float:
+		return float(properties.get_or_default(f"""cache.responses.ttl.{magic_method.id}""", 0))
+
+	def get(self, key: str) -> Tuple[bool, Any]:
+		with self.lock:
+			entry = self.entries.get(key)
+
+			if entry is None:
+				self.misses += 1
+
+				return False, None
+
+			if entry[0] <= time.monotonic():
+				del self.entries[key]
+				self.expirations += 1
+				self.misses += 1
+
+				return False, None
+
+			self.entries.move_to_end(key)
+			self.hits += 1
+
+			return True, entry[1]
+
+	def put(self, key: str, value: Any, ttl: float):
+		size = int(properties.get_or_default("cache.responses.size", 1024))
+
+		with self.lock:
+			# Stored as is, the value is handed to every caller and the formatters never edit it in place.
+			self.entries[key] = (time.monotonic() + ttl, value)
+			self.entries.move_to_end(key)
+
+			while len(self.entries) > size:
+				self.entries.popitem(last=False)
+				self.evictions += 1
+
+	def invalidate(self, key: str):
+		with self.lock:
+			self.entries.pop(key, None)
+
+	def clear(self):
+		with self.lock:
+			self.entries.clear()
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"size": len(self.entries),
+			"hits": self.hits,
+			"misses": self.misses,
+			"evictions": self.evictions,
+			"expirations": self.expirations,
+		}
+
+
+def get_local_order_book(exchange_id: str, exchange_environment: str, args: Tuple = (), kwargs: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+	kwargs = kwargs or {}
+
+	# Exchange specific params cannot be honoured by the local book.
+	if set(kwargs.keys()) - {"symbol", "limit"} or len(args) > 2:
+		return None
+
+	symbol = kwargs.get("symbol") or (args[0] if args else None)
+	limit = kwargs.get("limit") or (args[1] if len(args) > 1 else None)
+
+	book = order_book_engine.get(exchange_id, exchange_environment, symbol, limit)
+
+	if book is None:
+		# Later calls for the same market are answered from the stream maintained book.
+		order_book_engine.track(exchange_id, exchange_environment, symbol)
+
+	return book
+
+
+single_flight = SingleFlight.instance()
+response_cache = ResponseCache.instance()
+
+
+async def execute_shared(exchange_id: str, exchange_environment: str, method_name: str, call: Callable[..., Awaitable[Any]], args: Tuple = (), kwargs: Dict[str, Any] = None, user_id: str = None, cache_policy: CachePolicy = None) -> Any:
+	fetch = partial(call, *args, **(kwargs or {}))
+	magic_method = resolve_magic_method(method_name)
+
+	if magic_method is None:
+		return await fetch()
+
+	if magic_method == MagicMethod.FETCH_ORDER_BOOK and cache_policy is None:
+		book = get_local_order_book(exchange_id, exchange_environment, args, kwargs)
+
+		if book is not None:
+			return book
+
+	if magic_method == MagicMethod.FETCH_OHLCV and cache_policy != CachePolicy.BYPASS and candle_store.is_enabled():
+		arguments = get_ohlcv_arguments(args, kwargs)
+
+		if arguments is not None:
+			fetch = partial(candle_store.get, call, exchange_id, exchange_environment, **arguments)
+
+	if magic_method in HISTORY_KINDS and user_id and cache_policy != CachePolicy.BYPASS and history.is_enabled():
+		arguments = get_history_arguments(args, kwargs)
+
+		if arguments is not None:
+			fetch = partial(history.get, call, magic_method, user_id, **arguments, force=cache_policy == CachePolicy.INVALIDATE)
+
+	ttl = response_cache.get_ttl(magic_method)
+
+	if magic_method.is_private and (not ttl or not user_id):
+		return await fetch()
+
+	scope = user_id if magic_method.is_private else None
+	key = build_key(exchange_id, exchange_environment, magic_method, args, kwargs, scope)
+
+	if ttl:
+		if cache_policy == CachePolicy.INVALIDATE:
+			response_cache.invalidate(key)
+		elif cache_policy != CachePolicy.BYPASS:
+			hit, value = response_cache.get(key)
+
+			if hit:
+				return value
+
+	async def fetch_and_store():
+		result = await fetch()
+
+		if ttl and cache_policy != CachePolicy.BYPASS:
+			response_cache.put(key, result, ttl)
+
+		return result
+
+	if magic_method.is_private:
+		return await fetch_and_store()
+
+	return await single_flight.execute(key, fetch_and_store)
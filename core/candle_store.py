@@ -0,0 +1,284 @@
+import asyncio
+import logging
+import threading
+import time
+import traceback
+from singleton.singleton import ThreadSafeSingleton
+from threading import Lock
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+# noinspection PyUnresolvedReferences
+import ccxt as sync_ccxt
+from core.properties import properties
+from core.utils import DatabaseMixin
+
+SeriesKey = Tuple[str, str, str, str]
+Candle = List[float]
+
+
+@ThreadSafeSingleton
+class CandleStore(DatabaseMixin):
+	def __init__(self):
+		self.lock = Lock()
+		self.read_at: Dict[SeriesKey, float] = {}
+		self.refresher: Optional[threading.Thread] = None
+		self.hits = 0
+		self.fetched = 0
+
+	# noinspection PyMethodMayBeStatic
+	def is_enabled(self) -> bool:
+		return bool(properties.get_or_default("candles.store.enabled", True))
+
+	def select(self, key: SeriesKey, start: int, end: int) -> List[Candle]:
+		rows = self.database.select(
+			"""
+			select timestamp, open, high, low, close, volume from main.candle
+			where exchange_id = ? and exchange_environment = ? and symbol = ? and timeframe = ? and timestamp between ? and ?
+			order by timestamp
+			""",
+			(*key, start, end)
+		)
+
+		return [[row["timestamp"], row["open"], row["high"], row["low"], row["close"], row["volume"]] for row in rows]
+
+	def store(self, key: SeriesKey, candles: List[Candle]):
+		if not candles:
+			return
+
+		self.database.insert(
+			"""
+			insert or replace into main.candle (exchange_id, exchange_environment, symbol, timeframe, timestamp, open, high, low, close, volume)
+			values (:exchange_id, :exchange_environment, :symbol, :timeframe, :timestamp, :open, :high, :low, :close, :volume)
+			""",
+			[
+				{
+					"exchange_id": key[0],
+					"exchange_environment": key[1],
+					"symbol": key[2],
+					"timeframe": key[3],
+					"timestamp": int(candle[0]),
+					"open": candle[1],
+					"high": candle[2],
+					"low": candle[3],
+					"close": candle[4],
+					"volume": candle[5],
+				} for candle in candles
+			]
+		)
+
+	def get_coverage(self, key: SeriesKey) -> Optional[Tuple[int, int]]:
+		rows = self.database.select(
+			"""
+			select start_timestamp, end_timestamp from main.candle_series
+			where exchange_id = ? and exchange_environment = ? and symbol = ? and timeframe = ?
+			""",
+			key
+		)
+
+		return (rows[0]["start_timestamp"], rows[0]["end_timestamp"]) if rows else None
+
+	def set_coverage(self, key: SeriesKey, start: int, end: int):
+		self.database.insert(
+			"""
+			insert or replace into main.candle_series (exchange_id, exchange_environment, symbol, timeframe, start_timestamp, end_timestamp)
+			values (?, ?, ?, ?, ?, ?)
+			""",
+			(*key, start, end)
+		)
+
+	# noinspection PyMethodMayBeStatic
+	def get_missing_ranges(self, coverage: Optional[Tuple[int, int]], start: int, end: int, duration: int) -> List[Tuple[int, int]]:
+		if coverage is None or start > coverage[1] + duration or end < coverage[0] - duration:
+			return [(start, end)]
+
+		missing = []
+
+		if start < coverage[0]:
+			missing.append((start, coverage[0] - duration))
+
+		if end > coverage[1]:
+			missing.append((coverage[1] + duration, end))
+
+		return missing
+
+	# noinspection PyMethodMayBeStatic
+	def get_covered(self, coverage: Optional[Tuple[int, int]], start: int, end: int, candles: List[Candle], duration: int) -> Optional[Tuple[int, int]]:
+		# Coverage only grows as far as the candles actually written, a short or empty page is fetched again later.
+		if not candles:
+			return coverage
+
+		last = int(candles[-1][0])
+
+		if coverage is None or start > coverage[1] + duration:
+			return start, last
+
+		if end < coverage[0] - duration:
+			# An older window apart from the stored range is returned but not recorded.
+			return coverage
+
+		if start < coverage[0]:
+			# Below the stored range, it is only contiguous once the fill reached it.
+			return (start, coverage[1]) if last >= end else coverage
+
+		return coverage[0], max(coverage[1], last)
+
+	async def fill(self, fetch: Callable[..., Awaitable[List[Candle]]], key: SeriesKey, start: int, end: int, duration: int) -> List[Candle]:
+		page_size = int(properties.get_or_default("candles.store.page_size", 1000))
+		candles = []
+		cursor = start
+
+		while cursor <= end:
+			count = int((end - cursor) // duration) + 1
+			page = await fetch(key[2], key[3], cursor, min(count, page_size))
+			page = [candle for candle in page or [] if cursor <= candle[0] <= end]
+
+			if not page:
+				break
+
+			candles.extend(page)
+			cursor = int(page[-1][0]) + duration
+
+		self.fetched += len(candles)
+
+		return candles
+
+	async def get(self, fetch: Callable[..., Awaitable[List[Candle]]], exchange_id: str, exchange_environment: str, symbol: str, timeframe: str = "1m", since: Optional[int] = None, limit: Optional[int] = None) -> List[Candle]:
+		key = (exchange_id, exchange_environment, symbol, timeframe)
+		duration = sync_ccxt.Exchange.parse_timeframe(timeframe) * 1000
+		limit = int(limit or properties.get_or_default("candles.store.default_limit", 500))
+
+		# The candle being formed is never considered complete and is always refetched.
+		current = int(time.time() * 1000) // duration * duration
+		closed = current - duration
+
+		if since is None:
+			start = current - (limit - 1) * duration
+		else:
+			start = (int(since) + duration - 1) // duration * duration
+
+		end = min(start + (limit - 1) * duration, current)
+
+		if start > end:
+			return []
+
+		loop = asyncio.get_running_loop()
+		fetched = []
+		stored = []
+
+		if start <= closed:
+			coverage = await loop.run_in_executor(None, self.get_coverage, key)
+			missing = self.get_missing_ranges(coverage, start, min(end, closed), duration)
+			covered = coverage
+
+			for missing_start, missing_end in missing:
+				candles = [candle for candle in await self.fill(fetch, key, missing_start, missing_end, duration) if candle[0] <= closed]
+				fetched.extend(candles)
+				covered = self.get_covered(covered, missing_start, missing_end, candles, duration)
+
+			await loop.run_in_executor(None, self.store, key, fetched)
+
+			if not missing:
+				self.hits += 1
+			elif covered != coverage:
+				await loop.run_in_executor(None, self.set_coverage, key, covered[0], covered[1])
+
+			stored = await loop.run_in_executor(None, self.select, key, start, min(end, closed))
+
+		forming = []
+		if end == current:
+			forming = [candle for candle in await self.fill(fetch, key, current, current, duration) if candle[0] == current]
+
+		self.touch(key)
+
+		return (stored + forming)[-limit:]
+
+	def touch(self, key: SeriesKey):
+		with self.lock:
+			self.read_at[key] = time.monotonic()
+
+			if self.refresher is None and float(properties.get_or_default("candles.refresh.interval", 60)) > 0:
+				self.refresher = threading.Thread(target=self.refresh, name="candles-refresher", daemon=True)
+				self.refresher.start()
+
+	def refresh(self):
+		from core.markets import market_cache
+
+		fetchers: Dict[Tuple[str, str], Any] = {}
+
+		while True:
+			time.sleep(float(properties.get_or_default("candles.refresh.interval", 60)))
+
+			hot_for = float(properties.get_or_default("candles.refresh.hot_for", 900))
+			now = time.monotonic()
+
+			with self.lock:
+				keys = [key for key, read_at in self.read_at.items() if now - read_at <= hot_for]
+
+				for key in [key for key in self.read_at.keys() if key not in keys]:
+					del self.read_at[key]
+
+			for key in keys:
+				# noinspection PyBroadException
+				try:
+					fetcher = fetchers.get(key[:2])
+
+					if fetcher is None:
+						fetcher = market_cache.create_fetcher(key[:2])
+						market_cache.apply(fetcher, key[0], key[1])
+						fetchers[key[:2]] = fetcher
+
+					self.refresh_series(fetcher, key)
+				except Exception:
+					from core.logger import logger
+					logger.log(logging.WARNING, traceback.format_exc())
+
+	def refresh_series(self, fetcher, key: SeriesKey):
+		coverage = self.get_coverage(key)
+
+		if coverage is None:
+			return
+
+		duration = fetcher.parse_timeframe(key[3]) * 1000
+		closed = int(time.time() * 1000) // duration * duration - duration
+		cursor = coverage[1] + duration
+
+		while cursor <= closed:
+			page = [candle for candle in fetcher.fetch_ohlcv(key[2], key[3], cursor) or [] if cursor <= candle[0] <= closed]
+
+			if not page:
+				break
+
+			self.store(key, page)
+			self.fetched += len(page)
+			cursor = int(page[-1][0]) + duration
+
+			self.set_coverage(key, coverage[0], cursor - duration)
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"hot": len(self.read_at),
+			"hits": self.hits,
+			"fetched": self.fetched,
+		}
+
+
+candle_store = CandleStore.instance()
+
+
+def get_ohlcv_arguments(args: Tuple = (), kwargs: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+	names = ["symbol", "timeframe", "since", "limit"]
+	kwargs = kwargs or {}
+
+	# Exchange specific params cannot be replayed against stored candles.
+	if len(args) > len(names) or set(kwargs.keys()) - set(names):
+		return None
+
+	arguments = dict(zip(names, args))
+	arguments.update(kwargs)
+
+	if not arguments.get("symbol"):
+		return None
+
+	arguments.setdefault("timeframe", "1m")
+
+	return arguments
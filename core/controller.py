@@ -1,7 +1,14 @@
+import asyncio
 import traceback
+from functools import partial
+from typing import List
 
+from core.cache import execute_shared, resolve_magic_method
+from core.dispatcher import dispatcher
+from core.ohlcv import to_columnar
 from core.properties import properties
-from core.types import APIResponseStatus, CCXTAPIRequest, CCXTAPIResponse, Environment, Protocol
+from core.registry import exchange_registry
+from core.types import APIResponseStatus, CachePolicy, CCXTAPIRequest, CCXTAPIResponse, Environment, MagicMethod, Protocol
 
 
 async def ccxt(request: CCXTAPIRequest) -> CCXTAPIResponse:
@@ -12,7 +19,10 @@ async def ccxt(request: CCXTAPIRequest) -> CCXTAPIResponse:
 	exchange_method = request.exchange_method
 	exchange_method_parameters = request.exchange_method_parameters
 
-	target = properties.get_or_default(f"""users.{user_id}.exchange.{exchange_id}.{exchange_environment}.{exchange_protocol}""", None)
+	target = await exchange_registry.materialize(user_id, exchange_id, exchange_environment, exchange_protocol)
+
+	if exchange_protocol == Protocol.REST.value and properties.get_or_default("dispatcher.prefer_async", True):
+		target = prefer_async_target(target, user_id, exchange_id, exchange_environment, exchange_method)
 
 	response = CCXTAPIResponse()
 
@@ -26,10 +36,22 @@ async def ccxt(request: CCXTAPIRequest) -> CCXTAPIResponse:
 					response.message = f"""Successfully executed "{exchange_id}.{exchange_method}(***)"."""
 					response.status = APIResponseStatus.SUCCESS
 					response.status_code = response.status.http_code
-					if exchange_method_parameters is None:
-						response.result = attribute()
-					else:
-						response.result = attribute(**exchange_method_parameters.toDict())
+					parameters = {} if exchange_method_parameters is None else exchange_method_parameters.toDict()
+
+					with exchange_registry.lease(target):
+						response.result = await execute_shared(
+							exchange_id,
+							exchange_environment,
+							exchange_method,
+							partial(dispatcher.execute, exchange_id, attribute),
+							kwargs=parameters,
+							user_id=user_id,
+							cache_policy=CachePolicy.get_by_id(request.cache_policy)
+						)
+
+					if request.output_format == "columnar" and resolve_magic_method(exchange_method) == MagicMethod.FETCH_OHLCV:
+						options = request.output_options or {}
+						response.result = to_columnar(response.result, options.get("resample"), options.get("indicators"))
 
 					return response
 				except Exception as exception:
@@ -77,10 +99,63 @@ async def ccxt(request: CCXTAPIRequest) -> CCXTAPIResponse:
 		return response
 
 
+async def ccxt_batch(requests: List[CCXTAPIRequest], fail_fast: bool = False) -> List[CCXTAPIResponse]:
+	tasks = [asyncio.ensure_future(ccxt(request)) for request in requests]
+
+	if fail_fast:
+		for completed in asyncio.as_completed(tasks):
+			try:
+				failed = (await completed).status != APIResponseStatus.SUCCESS
+			except Exception:
+				failed = True
+
+			if failed:
+				for task in tasks:
+					task.cancel()
+
+				break
+
+	# Every call settles on its own, an exception only turns its own response into an error.
+	await asyncio.gather(*tasks, return_exceptions=True)
+
+	return [get_batch_call_response(task, request) for task, request in zip(tasks, requests)]
+
+
+def get_batch_call_response(task: asyncio.Future, request: CCXTAPIRequest) -> CCXTAPIResponse:
+	if task.cancelled():
+		return handle_cancelled_batch_call(request)
+
+	if task.exception() is not None:
+		return handle_method_call_exception(task.exception(), str(request.exchange_method), request.exchange_id)
+
+	return task.result()
+
+
+def handle_cancelled_batch_call(request: CCXTAPIRequest) -> CCXTAPIResponse:
+	response = CCXTAPIResponse()
+	response.title = f"""{request.exchange_id}.{request.exchange_method}"""
+	response.message = f"""Skipped "{request.exchange_id}.{request.exchange_method}(***)" because another call of the batch has failed."""
+	response.status = APIResponseStatus.EXPECTATION_FAILED_ERROR
+	response.status_code = response.status.http_code
+	response.result = None
+
+	return response
+
+
+def prefer_async_target(target, user_id: str, exchange_id: str, exchange_environment: str, exchange_method: str):
+	# Creating an async client just for this call would double the memory held per user, the sync one runs on the dispatcher instead.
+	async_target = exchange_registry.peek(user_id, exchange_id, exchange_environment, Protocol.WebSocket.value)
+
+	if async_target is not None and asyncio.iscoroutinefunction(getattr(async_target, exchange_method, None)):
+		return async_target
+
+	return target
+
+
 def handle_method_call_exception(exception: Exception, exchange_method: str, exchange_id: str) -> CCXTAPIResponse:
 	response = CCXTAPIResponse()
 	exchange_method = exchange_method.lower()
-	full_stack_trace = traceback.format_exc()
+	full_stack_trace = "".join(traceback.format_exception(exception))
 	response.title = f"""{exchange_id}.{exchange_method}"""
 
 	if exchange_method == 'create_order':
@@ -1,8 +1,10 @@
 from sqlite3 import Connection
+import os
 import sqlite3
 from enum import Enum
 from pathlib import Path
 from singleton.singleton import Singleton
+from threading import RLock
 from core.properties import properties
 
 
@@ -18,7 +20,10 @@ class Database(object):
 		self.read_write_connection: Connection = None
 		# noinspection PyTypeChecker
 		self.read_only_connection: Connection = None
+		# Connections are shared with executor and background threads, statements are serialized per process.
+		self.lock = RLock()
 		self.connect()
+		self.migrate()
 
 	# noinspection PyMethodMayBeStatic
 	def _initialize_database(self, path: Path):
@@ -36,23 +41,50 @@ class Database(object):
 				self.read_write_connection = sqlite3.connect(
 					str(database_path.absolute()),
 					detect_types=sqlite3.PARSE_DECLTYPES,
-					isolation_level=None
+					isolation_level=None,
+					check_same_thread=False
 				)
 				self.read_write_connection.row_factory = sqlite3.Row
+				self.read_write_connection.execute("pragma journal_mode=WAL")
 			except Exception as exception:
 				raise exception
 
 		if self.read_only_connection is None:
 			try:
+				# Read only instead of immutable, the file is written to while the application runs.
 				self.read_only_connection = sqlite3.connect(
-					f"file:{str(database_path.absolute())}?immutable=1",
+					f"file:{str(database_path.absolute())}?mode=ro",
 					uri=True,
-					detect_types=sqlite3.PARSE_DECLTYPES
+					detect_types=sqlite3.PARSE_DECLTYPES,
+					check_same_thread=False
 				)
 				self.read_only_connection.row_factory = sqlite3.Row
 			except Exception as exception:
 				raise exception
 
+	def migrate(self):
+		directory = Path(properties.get_or_default("database.migrations.path", os.path.join(properties.get("resources_path"), "migrations", "sqlite")))
+
+		if not directory.exists():
+			return
+
+		with self.lock:
+			self.read_write_connection.execute("create table if not exists main.migration (id TEXT not null primary key, applied_at TEXT default current_timestamp)")
+			applied = {row["id"] for row in self.read_write_connection.execute("select id from main.migration").fetchall()}
+
+			for path in sorted(directory.glob("*.sql")):
+				if path.stem in applied:
+					continue
+
+				try:
+					self.read_write_connection.executescript(path.read_text())
+				except sqlite3.OperationalError as exception:
+					# Databases created before migrations were tracked already contain the first tables.
+					if "already exists" not in str(exception):
+						raise
+
+				self.read_write_connection.execute("insert into main.migration (id) values (?)", (path.stem,))
+
 	def close(self):
 		if self.read_write_connection:
 			self.read_write_connection.close()
@@ -63,16 +95,18 @@ class Database(object):
 
 	def execute(self, connection_type: ConnectionType, query: str, parameters=None):
 		connection = self.read_write_connection if connection_type == ConnectionType.READ_WRITE else self.read_only_connection
-		cursor = connection.cursor()
 
-		if parameters is None:
-			cursor.execute(query)
-		elif isinstance(parameters, list) and isinstance(parameters[0], dict):
-			cursor.executemany(query, parameters)
-		else:
-			cursor.execute(query, parameters)
+		with self.lock:
+			cursor = connection.cursor()
+
+			if parameters is None:
+				cursor.execute(query)
+			elif isinstance(parameters, list) and len(parameters) > 0 and isinstance(parameters[0], dict):
+				cursor.executemany(query, parameters)
+			else:
+				cursor.execute(query, parameters)
 
-		rows = cursor.fetchall()
+			rows = cursor.fetchall()
 
 		return [dict(row) for row in rows]
 
@@ -0,0 +1,146 @@
+import asyncio
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from singleton.singleton import ThreadSafeSingleton
+from threading import Lock
+from typing import Any, Callable, Dict, Tuple
+
+from core.properties import properties
+
+
+class DispatcherStatistics(object):
+	def __init__(self, samples: int):
+		self.lock = Lock()
+		self.count = 0
+		self.errors = 0
+		self.queue_latencies = deque(maxlen=samples)
+		self.execution_latencies = deque(maxlen=samples)
+
+	def record(self, queue_latency: float, execution_latency: float, failed: bool):
+		with self.lock:
+			self.count += 1
+			if failed:
+				self.errors += 1
+			self.queue_latencies.append(queue_latency)
+			self.execution_latencies.append(execution_latency)
+
+	# noinspection PyMethodMayBeStatic
+	def percentiles(self, samples) -> Dict[str, float]:
+		if not samples:
+			return {"p50": 0.0, "p99": 0.0, "max": 0.0}
+
+		ordered = sorted(samples)
+		last = len(ordered) - 1
+
+		return {
+			"p50": ordered[int(last * 0.50)],
+			"p99": ordered[int(last * 0.99)],
+			"max": ordered[last],
+		}
+
+	def summary(self) -> Dict[str, Any]:
+		with self.lock:
+			queue_latencies = list(self.queue_latencies)
+			execution_latencies = list(self.execution_latencies)
+			count = self.count
+			errors = self.errors
+
+		return {
+			"count": count,
+			"errors": errors,
+			"queue": self.percentiles(queue_latencies),
+			"execution": self.percentiles(execution_latencies),
+		}
+
+
+@ThreadSafeSingleton
+class Dispatcher(object):
+	def __init__(self):
+		self.lock = Lock()
+		self.executors: Dict[str, ThreadPoolExecutor] = {}
+		self.statistics: Dict[str, DispatcherStatistics] = {}
+		self.semaphores: Dict[Tuple[int, str], asyncio.Semaphore] = {}
+
+	def get_executor(self, key: str) -> ThreadPoolExecutor:
+		executor = self.executors.get(key)
+
+		if executor is None:
+			with self.lock:
+				executor = self.executors.get(key)
+				if executor is None:
+					executor = ThreadPoolExecutor(
+						max_workers=int(properties.get_or_default("dispatcher.workers", 8)),
+						thread_name_prefix=f"""dispatcher-{key}"""
+					)
+					self.executors[key] = executor
+
+		return executor
+
+	def get_statistics(self, key: str) -> DispatcherStatistics:
+		statistics = self.statistics.get(key)
+
+		if statistics is None:
+			with self.lock:
+				statistics = self.statistics.get(key)
+				if statistics is None:
+					statistics = DispatcherStatistics(int(properties.get_or_default("dispatcher.statistics.samples", 1000)))
+					self.statistics[key] = statistics
+
+		return statistics
+
+	async def execute(self, key: str, method: Callable, *args, **kwargs) -> Any:
+		statistics = self.get_statistics(key)
+		enqueued_at = time.perf_counter()
+		timestamps = {}
+		failed = True
+
+		try:
+			if asyncio.iscoroutinefunction(method):
+				timestamps["started"] = time.perf_counter()
+				result = await method(*args, **kwargs)
+			else:
+				def run():
+					timestamps["started"] = time.perf_counter()
+
+					return method(*args, **kwargs)
+
+				result = await asyncio.get_running_loop().run_in_executor(self.get_executor(key), run)
+
+			failed = False
+
+			return result
+		finally:
+			finished_at = time.perf_counter()
+			started_at = timestamps.get("started", finished_at)
+			statistics.record(started_at - enqueued_at, finished_at - started_at, failed)
+
+	def get_semaphore(self, user_key: str) -> asyncio.Semaphore:
+		# A semaphore binds to the first loop that waits on it, the API and the bot loop each get their own.
+		key = (id(asyncio.get_running_loop()), user_key)
+		semaphore = self.semaphores.get(key)
+
+		if semaphore is None:
+			with self.lock:
+				semaphore = self.semaphores.get(key)
+				if semaphore is None:
+					semaphore = asyncio.Semaphore(int(properties.get_or_default("dispatcher.user.concurrency", 2)))
+					self.semaphores[key] = semaphore
+
+		return semaphore
+
+	async def execute_for(self, user_key: str, key: str, method: Callable, *args, **kwargs) -> Any:
+		async with self.get_semaphore(user_key):
+			return await self.execute(key, method, *args, **kwargs)
+
+	def summary(self) -> Dict[str, Any]:
+		return {key: statistics.summary() for key, statistics in list(self.statistics.items())}
+
+	def shutdown(self):
+		with self.lock:
+			for executor in self.executors.values():
+				executor.shutdown(wait=False, cancel_futures=True)
+			self.executors.clear()
+
+
+dispatcher = Dispatcher.instance()
@@ -2,6 +2,7 @@ import datetime
 import logging
 import traceback
 from dotmap import DotMap
+from functools import partial
 from fastapi import WebSocket, HTTPException
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt
@@ -18,9 +19,12 @@ from ccxt import Exchange as RESTExchange
 from ccxt.async_support import Exchange as WebSocketExchange
 from core.constants import constants
 # from core.database import database
+from core.markets import market_cache
 from core.properties import properties
-from core.types import Protocol, Credentials, Environment
-from core.utils import deep_merge
+from core.rate_limiter import rate_limiter
+from core.registry import exchange_registry
+from core.sessions import sessions, token_cache
+from core.types import Protocol, Credentials, Environment, RequestParameters
 
 ccxt = sync_ccxt
 
@@ -34,47 +38,34 @@ unauthorized_exception = HTTPException(
 )
 
 
-async def extract_all_parameters(request: Request):
-	headers = DotMap(dict(request.headers), _dynamic=False)
+async def extract_all_parameters(request: Request) -> RequestParameters:
+	parameters = getattr(request.state, "parameters", None)
 
-	path_parameters = DotMap(request.path_params, _dynamic=False)
-
-	query_parameters = DotMap(request.query_params, _dynamic=False)
+	if parameters is not None:
+		return parameters
 
 	# noinspection PyBroadException,PyUnusedLocal
 	try:
-		body = DotMap(await request.json())
+		body = await request.json()
+		if not isinstance(body, dict):
+			body = {}
 	except Exception as exception:
-		body = DotMap({})
-
-	parameters = DotMap({}, _dynamic=False)
-	parameters = DotMap(deep_merge(
-		parameters.toDict(),
-		headers
-	), _dynamic=False)
-	parameters = DotMap(deep_merge(
-		parameters.toDict(),
-		path_parameters
-	), _dynamic=False)
-	parameters = DotMap(deep_merge(
-		parameters.toDict(),
-		query_parameters
-	), _dynamic=False)
-	parameters = DotMap(deep_merge(
-		parameters.toDict(),
-		body.toDict()
-	), _dynamic=False)
-	parameters = DotMap(deep_merge(
-		parameters.toDict(),
-		request.cookies
-	), _dynamic=False)
-
-	parameters._dynamic = False
+		body = {}
+
+	parameters = RequestParameters(
+		request.cookies,
+		body,
+		request.query_params,
+		request.path_params,
+		request.headers
+	)
+
+	request.state.parameters = parameters
 
 	return parameters
 
 
-def extract_id_or_user_telegram_id_or_jwt_token(parameters: DotMap[str, Any]):
+def extract_id_or_user_telegram_id_or_jwt_token(parameters: RequestParameters):
 	id_or_user_telegram_id_or_jwt_token = parameters.get("id")
 	if not id_or_user_telegram_id_or_jwt_token:
 		id_or_user_telegram_id_or_jwt_token = parameters.get("userTelegramId")
@@ -84,7 +75,7 @@ def extract_id_or_user_telegram_id_or_jwt_token(parameters: DotMap[str, Any]):
 	return id_or_user_telegram_id_or_jwt_token
 
 
-def extract_jwt_token(parameters: DotMap[str, Any]):
+def extract_jwt_token(parameters: RequestParameters):
 	token = parameters.get("token")
 	if not token:
 		token = parameters.get("authorization")
@@ -99,30 +90,65 @@ def extract_jwt_token(parameters: DotMap[str, Any]):
 	return None
 
 
-def get_user_exchange(id_or_user_telegram_id_or_jwt_token: str | int, exchange_id: str, exchange_environment: Environment, exchange_protocol: Protocol) -> Optional[RESTExchange | WebSocketExchange]:
+async def get_user_exchange(id_or_user_telegram_id_or_jwt_token: str | int, exchange_id: str, exchange_environment: Environment, exchange_protocol: Protocol) -> Optional[RESTExchange | WebSocketExchange]:
 	user = get_user(id_or_user_telegram_id_or_jwt_token)
 
 	if user:
-		return properties.get_or_default(f"""users.{user.id}.exchange.{exchange_id}.{exchange_environment.value}.{exchange_protocol.value}""")
+		return await exchange_registry.materialize(user.id, exchange_id, exchange_environment.value, exchange_protocol.value)
 
 	return None
 
 
 def get_user(id_or_user_telegram_id_or_jwt_token: str | int) -> Optional[DotMap[str, Any]]:
-	user = properties.get_or_default(f"""users.{id}""", None)
+	user = sessions.get(id_or_user_telegram_id_or_jwt_token)
 
-	if not user:
-		user_id = properties.get_or_default(f"""telegram.ids.{id_or_user_telegram_id_or_jwt_token}""")
-		user = properties.get_or_default(f"""users.{user_id}""", None)
+	if not user and isinstance(id_or_user_telegram_id_or_jwt_token, str):
+		subject = token_cache.get_subject(id_or_user_telegram_id_or_jwt_token)
+		if subject:
+			user = sessions.get(subject)
 
-	if not user:
-		user_id = properties.get_or_default(f"""tokens.{id_or_user_telegram_id_or_jwt_token}""")
-		user = properties.get_or_default(f"""users.{user_id}""", None)
+	return user
 
-	if user:
-		return DotMap(user, _dynamic=False)
 
-	return None
+def get_token_expiration(token: str) -> Optional[float]:
+	# noinspection PyBroadException,PyUnusedLocal
+	try:
+		return float(jwt.get_unverified_claims(token).get("exp"))
+	except Exception as exception:
+		return None
+
+
+def update_user_token(user_id: str, token: str):
+	sessions.register_token(token, user_id, get_token_expiration(token))
+
+
+def create_exchange(credentials: Credentials, exchange_protocol: str) -> RESTExchange | WebSocketExchange:
+	if exchange_protocol == Protocol.REST.value:
+		exchange: RESTExchange = getattr(ccxt, credentials.exchangeId)({
+			"apiKey": credentials.exchangeApiKey,
+			"secret": credentials.exchangeApiSecret,
+			"options": {
+				"environment": credentials.exchangeEnvironment,
+				"subaccountId": credentials.exchangeOptions.get("subAccountId"),
+			}
+		})
+	else:
+		exchange: WebSocketExchange = getattr(async_ccxt, credentials.exchangeId)({
+			"apiKey": credentials.exchangeApiKey,
+			"secret": credentials.exchangeApiSecret,
+			"options": {
+				"environment": credentials.exchangeEnvironment,
+				"subaccountId": credentials.exchangeOptions.get("subaccountid"),
+			}
+		})
+
+	if credentials.exchangeEnvironment != constants.environments.production:
+		exchange.set_sandbox_mode(True)
+
+	market_cache.apply(exchange, credentials.exchangeId, credentials.exchangeEnvironment)
+	rate_limiter.bind(exchange, credentials.exchangeId, credentials.exchangeEnvironment, credentials.exchangeApiKey)
+
+	return exchange
 
 
 def update_user(credentials: Credentials) -> DotMap[str, Any]:
@@ -144,57 +170,46 @@ def update_user(credentials: Credentials) -> DotMap[str, Any]:
 	# 	}
 	# )
 
-	rest_exchange: RESTExchange = getattr(ccxt, credentials.exchangeId)({
-		"apiKey": credentials.exchangeApiKey,
-		"secret": credentials.exchangeApiSecret,
-		"options": {
-			"environment": credentials.exchangeEnvironment,
-			"subaccountId": credentials.exchangeOptions.get("subAccountId"),
-		}
-	})
-
-	websocket_exchange: WebSocketExchange = getattr(async_ccxt, credentials.exchangeId)({
-		"apiKey": credentials.exchangeApiKey,
-		"secret": credentials.exchangeApiSecret,
-		"options": {
-			"environment": credentials.exchangeEnvironment,
-			"subaccountId": credentials.exchangeOptions.get("subaccountid"),
-		}
-	})
-
-	if credentials.exchangeEnvironment != constants.environments.production:
-		rest_exchange.set_sandbox_mode(True)
-		websocket_exchange.set_sandbox_mode(True)
-
-	rest_exchange.fetch_markets()
-	rest_exchange.fetch_currencies()
+	exchange_registry.register(credentials.id, credentials.exchangeId, credentials.exchangeEnvironment, credentials, partial(create_exchange, credentials))
 
-	properties.set(f"""users.{credentials.id}.id""", credentials.id)
-	properties.set(f"""users.{credentials.id}.exchange.{credentials.exchangeId}.{credentials.exchangeEnvironment}.credentials""", credentials)
-	properties.set(f"""users.{credentials.id}.exchange.{credentials.exchangeId}.{credentials.exchangeEnvironment}.{Protocol.REST.value}""", rest_exchange)
-	properties.set(f"""users.{credentials.id}.exchange.{credentials.exchangeId}.{credentials.exchangeEnvironment}.{Protocol.WebSocket.value}""", websocket_exchange)
+	user = DotMap({
+		"id": credentials.id,
+		"telegramId": credentials.userTelegramId,
+		"exchangeId": credentials.exchangeId,
+		"exchangeEnvironment": credentials.exchangeEnvironment,
+	}, _dynamic=False)
 
-	properties.set(f"""telegram.ids.{credentials.userTelegramId}""", credentials.id)
-	properties.set(f"""tokens.{credentials.jwtToken}""", credentials.id)
+	sessions.register(
+		credentials.id,
+		user,
+		telegram_id=credentials.userTelegramId,
+		token=credentials.jwtToken,
+		expiration=get_token_expiration(credentials.jwtToken) if credentials.jwtToken else None
+	)
 
-	return properties.get_or_default(f"""users.{credentials.id}""")
+	return user
 
 
 def delete_user(idOrJwtToken: str):
 	user = get_user(idOrJwtToken)
 
+	token_cache.invalidate(idOrJwtToken)
+
 	if user:
-		properties.set(f"""users.{user.id}""", None)
-	# properties.set(f"""telegram.ids.{userTelegramId}""", None)
-	# properties.set(f"""tokens.{jwtToken}""", None)
+		for token in list(sessions.user_tokens.get(user.id, set())):
+			token_cache.invalidate(token)
+
+		exchange_registry.remove_user(user.id)
+		sessions.unregister(user.id)
+
+
+exchange_registry.add_eviction_listener(sessions.unregister)
 
 
 async def authenticate(credentials: Credentials):
 	# noinspection PyBroadException,PyUnusedLocal
 	try:
-		properties.set(credentials.id, credentials)
-
-		return properties.get(credentials.id)
+		return credentials
 	except Exception as exception:
 		return False
 
@@ -225,18 +240,22 @@ async def validate_token(request: Request | WebSocket) -> bool:
 		if not token:
 			return False
 
+		if token_cache.get(token):
+			return True
+
 		payload = jwt.decode(token, properties.get("admin.password"), algorithms=[constants.authentication.jwt.algorithm])
 		if not payload:
 			return False
 
 		token_expiration_timestamp = payload.get("exp")
-		token_expiration_datetime = datetime.datetime.fromtimestamp(token_expiration_timestamp, datetime.UTC)
-		if not token_expiration_datetime:
+		if not token_expiration_timestamp:
 			return False
 
-		if datetime.datetime.now(datetime.UTC) > token_expiration_datetime:
+		if datetime.datetime.now(datetime.UTC).timestamp() >= token_expiration_timestamp:
 			return False
 
+		token_cache.put(token, payload.get("sub"), float(token_expiration_timestamp))
+
 		return True
 	except Exception as exception:
 		from core.logger import logger
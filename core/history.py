@@ -0,0 +1,359 @@
+import asyncio
+import hashlib
+import json
+import time
+from singleton.singleton import ThreadSafeSingleton
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from core.properties import properties
+from core.types import MagicMethod
+from core.utils import DatabaseMixin
+
+HistoryKey = Tuple[str, str, str]
+TERMINAL_ORDER_STATUSES = ("closed", "canceled", "expired", "rejected")
+
+
+class HistoryKind(object):
+	def __init__(self, id: str, table: str, statuses: Optional[Tuple[str, ...]] = None, overlap: bool = False):
+		self.id = id
+		self.table = table
+		self.statuses = statuses
+		# Orders change state after they are created, so the last window is fetched again on every sync.
+		self.overlap = overlap
+
+
+HISTORY_KINDS: Dict[MagicMethod, HistoryKind] = {
+	MagicMethod.FETCH_MY_TRADES: HistoryKind("myTrades", "trade_history"),
+	MagicMethod.FETCH_CLOSED_ORDERS: HistoryKind("closedOrders", "order_history", TERMINAL_ORDER_STATUSES, overlap=True),
+	MagicMethod.FETCH_ORDERS: HistoryKind("orders", "order_history", overlap=True),
+}
+
+
+def get_account(user_id: str) -> str:
+	# Histories are keyed by a digest, API keys never reach the history tables.
+	return hashlib.sha256(user_id.encode()).hexdigest()[:32]
+
+
+def get_history_arguments(args: Tuple = (), kwargs: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
+	names = ["symbol", "since", "limit"]
+	kwargs = kwargs or {}
+
+	# Exchange specific params cannot be replayed against the local history.
+	if len(args) > len(names) or set(kwargs.keys()) - set(names):
+		return None
+
+	arguments = dict(zip(names, args))
+	arguments.update(kwargs)
+
+	return arguments
+
+
+@ThreadSafeSingleton
+class HistorySynchronizer(DatabaseMixin):
+	def __init__(self):
+		self.locks: Dict[Tuple[int, HistoryKey], asyncio.Lock] = {}
+		self.synced_at: Dict[HistoryKey, float] = {}
+		self.stale: Set[HistoryKey] = set()
+		self.synced = 0
+		self.backfilled = 0
+		self.refreshed = 0
+		self.queries = 0
+		self.passed_through = 0
+
+	# noinspection PyMethodMayBeStatic
+	def is_enabled(self) -> bool:
+		return bool(properties.get_or_default("history.enabled", True))
+
+	def get_lock(self, key: HistoryKey) -> asyncio.Lock:
+		lock_key = (id(asyncio.get_running_loop()), key)
+
+		lock = self.locks.get(lock_key)
+		if lock is None:
+			lock = self.locks.setdefault(lock_key, asyncio.Lock())
+
+		return lock
+
+	def get_coverage(self, key: HistoryKey) -> Optional[Tuple[int, int]]:
+		rows = self.database.select(
+			"select start_timestamp, timestamp from main.history_cursor where account = ? and kind = ? and symbol = ?",
+			key
+		)
+
+		return (rows[0]["start_timestamp"] or 0, rows[0]["timestamp"]) if rows else None
+
+	def set_coverage(self, key: HistoryKey, start: int, end: int):
+		# Everything between the low-water mark (start) and the high-water mark (end) is stored locally.
+		self.database.insert(
+			"insert or replace into main.history_cursor (account, kind, symbol, start_timestamp, timestamp, synced_at) values (?, ?, ?, ?, ?, ?)",
+			(*key, start, end, int(time.time() * 1000))
+		)
+
+	# noinspection PyMethodMayBeStatic
+	def get_timestamps(self, records: List[Dict[str, Any]]) -> List[int]:
+		return [int(record["timestamp"]) for record in records if record.get("timestamp") is not None]
+
+	def store(self, kind: HistoryKind, account: str, symbol: str, records: List[Dict[str, Any]]):
+		# Records keep their own market, an unfiltered sync must still be found by a per-market query.
+		records = [
+			{**record, "symbol": record.get("symbol") or symbol} for record in records
+			if record.get("id") is not None and record.get("timestamp") is not None
+		]
+
+		if not records:
+			return
+
+		if kind.table == "trade_history":
+			self.database.insert(
+				"""
+				insert or replace into main.trade_history (account, symbol, id, order_id, timestamp, side, price, amount, data)
+				values (:account, :symbol, :id, :order_id, :timestamp, :side, :price, :amount, :data)
+				""",
+				[
+					{
+						"account": account,
+						"symbol": record["symbol"],
+						"id": str(record["id"]),
+						"order_id": record.get("order"),
+						"timestamp": int(record["timestamp"]),
+						"side": record.get("side"),
+						"price": record.get("price"),
+						"amount": record.get("amount"),
+						"data": json.dumps(record, default=str),
+					} for record in records
+				]
+			)
+		else:
+			self.database.insert(
+				"""
+				insert or replace into main.order_history (account, symbol, id, client_order_id, timestamp, status, side, price, amount, filled, data)
+				values (:account, :symbol, :id, :client_order_id, :timestamp, :status, :side, :price, :amount, :filled, :data)
+				""",
+				[
+					{
+						"account": account,
+						"symbol": record["symbol"],
+						"id": str(record["id"]),
+						"client_order_id": record.get("clientOrderId"),
+						"timestamp": int(record["timestamp"]),
+						"status": record.get("status"),
+						"side": record.get("side"),
+						"price": record.get("price"),
+						"amount": record.get("amount"),
+						"filled": record.get("filled"),
+						"data": json.dumps(record, default=str),
+					} for record in records
+				]
+			)
+
+	def get_oldest_pending(self, account: str, symbol: str, before: int) -> Optional[int]:
+		conditions = ["account = ?", "timestamp < ?", f"""(status is null or status not in ({", ".join("?" for _ in TERMINAL_ORDER_STATUSES)}))"""]
+		parameters: List[Any] = [account, before, *TERMINAL_ORDER_STATUSES]
+
+		if symbol:
+			conditions.append("symbol = ?")
+			parameters.append(symbol)
+
+		rows = self.database.select(f"""select min(timestamp) as timestamp from main.order_history where {" and ".join(conditions)}""", tuple(parameters))
+
+		return rows[0]["timestamp"] if rows else None
+
+	def select(self, kind: HistoryKind, account: str, symbol: str, since: Optional[int] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+		conditions = ["account = ?"]
+		parameters: List[Any] = [account]
+
+		if symbol:
+			conditions.append("symbol = ?")
+			parameters.append(symbol)
+
+		if kind.statuses:
+			conditions.append(f"""status in ({", ".join("?" for _ in kind.statuses)})""")
+			parameters.extend(kind.statuses)
+
+		if since is not None:
+			conditions.append("timestamp >= ?")
+			parameters.append(int(since))
+
+		# Without since, the most recent records are returned, like exchanges do.
+		order = "asc" if since is not None else "desc"
+		query = f"""select data from main.{kind.table} where {" and ".join(conditions)} order by timestamp {order}"""
+
+		if limit:
+			query += " limit ?"
+			parameters.append(int(limit))
+
+		records = [json.loads(row["data"]) for row in self.database.select(query, tuple(parameters))]
+
+		return records if since is not None else list(reversed(records))
+
+	async def sync(self, fetch: Callable[..., Awaitable[List[Dict[str, Any]]]], kind: HistoryKind, account: str, symbol: str, force: bool = False) -> Tuple[int, int]:
+		key = (account, kind.id, symbol)
+
+		async with self.get_lock(key):
+			loop = asyncio.get_running_loop()
+			coverage = await loop.run_in_executor(None, self.get_coverage, key)
+			interval = float(properties.get_or_default("history.sync.interval", 30))
+
+			if coverage is not None and not force and time.monotonic() - self.synced_at.get(key, float("-inf")) < interval:
+				return coverage
+
+			page_size = int(properties.get_or_default("history.sync.page_size", 100))
+
+			if coverage is None:
+				# The first sync asks for the most recent records, a short page means it holds the whole history.
+				page = await fetch(symbol or None, None, page_size) or []
+
+				await loop.run_in_executor(None, self.store, kind, account, symbol, page)
+				self.synced += len(page)
+
+				timestamps = self.get_timestamps(page)
+				coverage = (min(timestamps) if timestamps and len(page) >= page_size else 0, max(timestamps) if timestamps else 0)
+
+				await loop.run_in_executor(None, self.set_coverage, key, *coverage)
+
+			start, cursor = coverage
+
+			if kind.overlap:
+				cursor = max(start, cursor - int(float(properties.get_or_default("history.sync.order_overlap", 86400)) * 1000))
+
+			window = cursor
+
+			while True:
+				# The cursor is inclusive, records sharing its timestamp are fetched again and overwritten in place.
+				page = await fetch(symbol or None, cursor, page_size) or []
+
+				await loop.run_in_executor(None, self.store, kind, account, symbol, page)
+				self.synced += len(page)
+
+				timestamps = self.get_timestamps(page)
+				latest = max(timestamps) if timestamps else None
+
+				if latest is not None and latest > coverage[1]:
+					# Persisted after every page, an interrupted sync resumes from the last stored page.
+					coverage = (start, latest)
+					await loop.run_in_executor(None, self.set_coverage, key, *coverage)
+
+				if latest is None or len(page) < page_size or latest <= cursor:
+					break
+
+				cursor = latest
+
+			if kind.overlap:
+				if await self.refresh(fetch, kind, account, symbol, window):
+					self.stale.discard(key)
+				else:
+					self.stale.add(key)
+
+			self.synced_at[key] = time.monotonic()
+
+			return coverage
+
+	async def refresh(self, fetch: Callable[..., Awaitable[List[Dict[str, Any]]]], kind: HistoryKind, account: str, symbol: str, window: int) -> bool:
+		loop = asyncio.get_running_loop()
+		# Orders stored as open before the refetched window may have been filled or canceled since.
+		cursor = await loop.run_in_executor(None, self.get_oldest_pending, account, symbol, window)
+
+		if cursor is None:
+			return True
+
+		page_size = int(properties.get_or_default("history.sync.page_size", 100))
+
+		for _ in range(int(properties.get_or_default("history.sync.refresh_pages", 10))):
+			page = await fetch(symbol or None, cursor, page_size) or []
+
+			await loop.run_in_executor(None, self.store, kind, account, symbol, page)
+			self.synced += len(page)
+			self.refreshed += len(page)
+
+			timestamps = self.get_timestamps(page)
+			latest = max(timestamps) if timestamps else None
+
+			if latest is None or len(page) < page_size or latest >= window:
+				return True
+
+			if latest <= cursor:
+				break
+
+			cursor = latest
+
+		return False
+
+	async def backfill(self, fetch: Callable[..., Awaitable[List[Dict[str, Any]]]], kind: HistoryKind, account: str, symbol: str, since: int) -> bool:
+		key = (account, kind.id, symbol)
+
+		async with self.get_lock(key):
+			loop = asyncio.get_running_loop()
+			start, end = await loop.run_in_executor(None, self.get_coverage, key)
+
+			if since >= start:
+				return True
+
+			page_size = int(properties.get_or_default("history.sync.page_size", 100))
+			cursor = since
+
+			# Pages forward from the requested since until they meet the stored range.
+			for _ in range(int(properties.get_or_default("history.sync.backfill_pages", 10))):
+				page = await fetch(symbol or None, cursor, page_size) or []
+
+				await loop.run_in_executor(None, self.store, kind, account, symbol, page)
+				self.synced += len(page)
+				self.backfilled += len(page)
+
+				timestamps = self.get_timestamps(page)
+				latest = max(timestamps) if timestamps else None
+
+				if latest is None or len(page) < page_size or latest >= start:
+					await loop.run_in_executor(None, self.set_coverage, key, since, max(end, latest or end))
+
+					return True
+
+				if latest <= cursor:
+					break
+
+				cursor = latest
+
+			return False
+
+	async def get(self, fetch: Callable[..., Awaitable[List[Dict[str, Any]]]], magic_method: MagicMethod, user_id: str, symbol: Optional[str] = None, since: Optional[int] = None, limit: Optional[int] = None, force: bool = False) -> List[Dict[str, Any]]:
+		kind = HISTORY_KINDS[magic_method]
+		account = get_account(user_id)
+		symbol = symbol or ""
+
+		start, _ = await self.sync(fetch, kind, account, symbol, force)
+
+		if (account, kind.id, symbol) in self.stale:
+			# Open orders too old to refresh within the page budget, the stored statuses cannot be trusted.
+			self.passed_through += 1
+
+			return await fetch(symbol or None, since, limit)
+
+		if since is not None and int(since) < start and not await self.backfill(fetch, kind, account, symbol, int(since)):
+			# Too far back to backfill within the page budget, the exchange answers this one directly.
+			self.passed_through += 1
+
+			return await fetch(symbol or None, since, limit)
+
+		records = await asyncio.get_running_loop().run_in_executor(None, self.select, kind, account, symbol, since, limit)
+
+		if since is None and start > 0 and limit and len(records) < int(limit):
+			# Older records than the low-water mark may exist, only the exchange can complete the answer.
+			self.passed_through += 1
+
+			return await fetch(symbol or None, since, limit)
+
+		self.queries += 1
+
+		return records
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"series": len(self.synced_at),
+			"synced": self.synced,
+			"backfilled": self.backfilled,
+			"refreshed": self.refreshed,
+			"stale": len(self.stale),
+			"queries": self.queries,
+			"passed_through": self.passed_through,
+		}
+
+
+history = HistorySynchronizer.instance()
@@ -1,15 +1,91 @@
-import inspect
+import asyncio
+import atexit
+import datetime
+import json
 import logging
+import sys
 import traceback
+from concurrent.futures import Future
+from functools import lru_cache
+from logging.handlers import QueueHandler, QueueListener
 from pathlib import Path
+from queue import SimpleQueue
 from singleton.singleton import ThreadSafeSingleton
-from typing import Any
+from threading import Lock
+from typing import Any, Dict, List, Optional, Set, TextIO
 
 from core.properties import properties
-from core.telegram_bot import telegram
+from core.telegram_bot import telegram, TELEGRAM_ADMIN_USERNAMES
 from core.utils import dump, escape_html
 
 
+@lru_cache(maxsize=1024)
+def get_source_path(filename: str) -> str:
+	return filename.removeprefix(f"""{properties.get("root_path")}/""")
+
+
+class JSONFormatter(logging.Formatter):
+	def format(self, record: logging.LogRecord) -> str:
+		entry = {
+			"timestamp": datetime.datetime.fromtimestamp(record.created, datetime.UTC).isoformat(),
+			"level": record.levelname,
+			"message": record.body if hasattr(record, "body") else record.getMessage(),
+			"prefix": getattr(record, "prefix", None) or None,
+			"file": getattr(record, "source_file", record.pathname),
+			"line": getattr(record, "source_line", record.lineno),
+			"function": getattr(record, "source_function", record.funcName),
+			"key": getattr(record, "sample_key", None),
+			"thread": record.threadName,
+		}
+
+		return json.dumps(entry, default=str)
+
+
+class LevelRouter(logging.Handler):
+	# Runs on the listener thread, each record is written to its level file and all.log in a single dispatch.
+	def __init__(self, directory: str, levels: List[int], queue: SimpleQueue, batch_size: int):
+		super().__init__(logging.DEBUG)
+		self.files: Dict[int, TextIO] = {
+			level: open(f'{directory}/{str(logging.getLevelName(level)).lower()}.log', mode='a', encoding='utf-8') for level in levels
+		}
+		self.all = open(f'{directory}/all.log', mode='a', encoding='utf-8')
+		self.queue = queue
+		self.batch_size = max(1, batch_size)
+		self.pending = 0
+
+	def emit(self, record: logging.LogRecord):
+		try:
+			line = self.format(record) + '\n'
+
+			file = self.files.get(record.levelno)
+			if file:
+				file.write(line)
+
+			self.all.write(line)
+			self.pending += 1
+
+			# Writes stay buffered while a burst is being drained and reach the disk once the queue runs dry.
+			if self.pending >= self.batch_size or self.queue.empty():
+				self.flush()
+		except Exception:
+			self.handleError(record)
+
+	def flush(self):
+		for file in [*self.files.values(), self.all]:
+			file.flush()
+
+		self.pending = 0
+
+	def close(self):
+		try:
+			self.flush()
+
+			for file in [*self.files.values(), self.all]:
+				file.close()
+		finally:
+			super().close()
+
+
 @ThreadSafeSingleton
 class Logger(object):
 
@@ -24,66 +100,134 @@ class Logger(object):
 
 		format = properties.get('logging.format')
 
-		logger = logging.getLogger()
-		logger.setLevel(logging.DEBUG)
-
-		for level in self.levels:
-			file_handler = logging.FileHandler(f'{directory}/{str(logging.getLevelName(level)).lower()}.log', mode='a')
-			file_handler.setLevel(level)
+		self.lock = Lock()
+		self.samples: Dict[str, int] = {}
+		self.loop: Optional[asyncio.AbstractEventLoop] = None
+		self.notifications: Set[asyncio.Task | Future] = set()
 
-			# Create a filter to only log messages of a specific level
-			class SpecificLevelFilter(logging.Filter):
-				def __init__(self, level):
-					super().__init__()
-					self.__level = level
+		logger = logging.getLogger()
+		logger.setLevel(properties.get_or_default('logging.capture_level', logging.DEBUG))
+		self.root = logger
 
-				def filter(self, logRecord):
-					return logRecord.levelno == self.__level
+		formatter = JSONFormatter() if properties.get_or_default('logging.output', 'text') == 'json' else logging.Formatter(format)
 
-			file_handler.addFilter(SpecificLevelFilter(level))
-			file_handler.setFormatter(logging.Formatter(format))
-			logger.addHandler(file_handler)
+		queue = SimpleQueue()
 
-		file_handler = logging.FileHandler(f'{directory}/all.log', mode='a')
-		file_handler.setLevel(logging.DEBUG)
-		file_handler.setFormatter(logging.Formatter(format))
-		logger.addHandler(file_handler)
+		router = LevelRouter(directory, self.levels, queue, int(properties.get_or_default('logging.queue.batch_size', 100)))
+		router.setFormatter(formatter)
 
 		stream_handler = logging.StreamHandler()
-		stream_handler.setFormatter(logging.Formatter(format))
+		stream_handler.setFormatter(formatter)
 		stream_handler.setLevel(self.level)
-		logger.addHandler(stream_handler)
 
-	def log(self, level: int, message: str = "", object: Any = None, prefix: str = "", frame: Any = None):
+		# Callers only enqueue the record, a single background thread writes the files and the console.
+		logger.addHandler(QueueHandler(queue))
+
+		self.router = router
+		self.listener = QueueListener(queue, router, stream_handler, respect_handler_level=True)
+		self.listener.start()
+		atexit.register(self.stop)
+
+	def stop(self):
+		# Drains the queue, then flushes whatever the last batch left buffered.
+		self.listener.stop()
+		self.router.close()
+
+	def is_enabled_for(self, level: int) -> bool:
+		return self.root.isEnabledFor(level) or self.is_telegram_enabled_for(level)
+
+	def is_telegram_enabled_for(self, level: int) -> bool:
+		return bool(self.use_telegram) and level >= self.level and level >= self.telegram_level
+
+	def sample(self, key: str) -> bool:
+		rate = int(properties.get_or_default(f"""logging.sampling.{key}""", 1))
+
+		if rate <= 1:
+			return True
+
+		with self.lock:
+			count = self.samples.get(key, 0)
+			self.samples[key] = count + 1
+
+		return count % rate == 0
+
+	def log(self, level: int, message: str = "", object: Any = None, prefix: str = "", frame: Any = None, key: str = None):
+		# Nothing below is evaluated for a record that no handler would accept.
+		if not self.is_enabled_for(level):
+			return
+
+		if key is not None and not self.sample(key):
+			return
+
 		if not frame:
-			frame = inspect.currentframe().f_back
+			frame = sys._getframe(1)
 
-		filename = frame.f_code.co_filename.removeprefix(f"""{properties.get("root_path")}/""")
+		filename = get_source_path(frame.f_code.co_filename)
 		line_number = frame.f_lineno
 		function_name = frame.f_code.co_name
 
 		if object:
 			message = f'{message}:\n{dump(object)}'
 
-		message = f"{prefix} {filename}:{line_number} {function_name}: {message}"
+		text = f"{prefix} {filename}:{line_number} {function_name}: {message}"
+
+		logging.log(level, text, extra={
+			"body": message,
+			"prefix": prefix,
+			"source_file": filename,
+			"source_line": line_number,
+			"source_function": function_name,
+			"sample_key": key,
+		})
+
+		if self.is_telegram_enabled_for(level):
+			if level >= logging.ERROR and not "/cc " in text:
+				text += f"""\n/cc {" ".join(f"@{username}" for username in TELEGRAM_ADMIN_USERNAMES)}"""
+
+			self.notify(escape_html(text))
+
+	def bind_loop(self, loop: asyncio.AbstractEventLoop):
+		# Alerts raised on other threads are handed over to this loop.
+		self.loop = loop
+
+	def notify(self, message: str):
+		coroutine = telegram.send_message(message, parse_mode=properties.get_or_default("telegram.parse_mode", "HTML"))
+
+		try:
+			running_loop = asyncio.get_running_loop()
+		except RuntimeError:
+			running_loop = None
+
+		loop = self.loop if self.loop is not None and not self.loop.is_closed() else None
+
+		if running_loop is not None and (loop is None or loop is running_loop):
+			notification = running_loop.create_task(coroutine)
+		elif loop is not None:
+			notification = asyncio.run_coroutine_threadsafe(coroutine, loop)
+		else:
+			coroutine.close()
+			# Logged without the Telegram path, it would only end up here again.
+			logging.warning("Telegram alert dropped, no event loop is bound to deliver it.")
 
-		logging.log(level, message)
+			return
 
-		if self.use_telegram and level >= self.level and level >= self.telegram_level:
-			if level >= logging.ERROR and not "/cc " in message:
-				message += f"\n/cc {telegram.admins}"
+		# References are kept until the alert is sent, otherwise the task could be collected before it runs.
+		self.notifications.add(notification)
+		notification.add_done_callback(self.on_notified)
 
-			message = escape_html(message)
+	def on_notified(self, notification: asyncio.Task | Future):
+		self.notifications.discard(notification)
 
-			telegram.send(message)
+		if not notification.cancelled() and notification.exception() is not None:
+			logging.error("".join(traceback.format_exception(notification.exception())))
 
-	def ignore_exception(self, exception: Exception, prefix: str = "", frame=inspect.currentframe().f_back):
+	def ignore_exception(self, exception: Exception, prefix: str = "", frame=None):
 		formatted_exception = traceback.format_exception(type(exception), exception, exception.__traceback__)
 		formatted_exception = "\n".join(formatted_exception)
 
 		message = f"""Ignored exception: {type(exception).__name__} {str(exception)}:\n{formatted_exception}"""
 
-		self.log(logging.ERROR, prefix=prefix, message=message, frame=frame)
+		self.log(logging.ERROR, prefix=prefix, message=message, frame=frame or sys._getframe(1))
 
 
 logger = Logger.instance()
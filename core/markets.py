@@ -0,0 +1,198 @@
+import json
+import logging
+import os
+import threading
+import time
+import traceback
+import weakref
+from pathlib import Path
+from singleton.singleton import ThreadSafeSingleton
+from threading import Lock, RLock
+from typing import Any, Dict, Optional, Tuple
+
+# noinspection PyUnresolvedReferences
+import ccxt as sync_ccxt
+from core.constants import constants
+from core.properties import properties
+from core.rate_limiter import rate_limiter
+
+MarketKey = Tuple[str, str]
+
+SHARED_ATTRIBUTES = [
+	"markets",
+	"markets_by_id",
+	"symbols",
+	"ids",
+	"currencies",
+	"currencies_by_id",
+	"codes",
+	"baseCurrencies",
+	"quoteCurrencies",
+]
+
+
+class MarketEntry(object):
+	def __init__(self, markets: Dict[str, Any], currencies: Dict[str, Any], fetched_at: float, shared: Dict[str, Any]):
+		self.markets = markets
+		self.currencies = currencies
+		self.fetched_at = fetched_at
+		self.shared = shared
+
+	def is_stale(self) -> bool:
+		return time.time() - self.fetched_at > float(properties.get_or_default("markets.cache.ttl", 3600))
+
+
+@ThreadSafeSingleton
+class MarketCache(object):
+	def __init__(self):
+		self.lock = RLock()
+		self.locks: Dict[MarketKey, Lock] = {}
+		self.entries: Dict[MarketKey, MarketEntry] = {}
+		self.refreshing: set[MarketKey] = set()
+		self.instances: Dict[MarketKey, weakref.WeakSet] = {}
+
+	def get_lock(self, key: MarketKey) -> Lock:
+		with self.lock:
+			return self.locks.setdefault(key, Lock())
+
+	# noinspection PyMethodMayBeStatic
+	def get_path(self, key: MarketKey) -> Path:
+		directory = properties.get_or_default("markets.cache.directory", os.path.join(properties.get("resources_path"), "cache", "markets"))
+
+		return Path(directory, f"""{key[0]}.{key[1]}.json""")
+
+	# noinspection PyMethodMayBeStatic
+	def create_fetcher(self, key: MarketKey):
+		exchange = getattr(sync_ccxt, key[0])({
+			"options": {
+				"environment": key[1],
+			}
+		})
+
+		if key[1] != constants.environments.production:
+			exchange.set_sandbox_mode(True)
+
+		rate_limiter.bind(exchange, key[0], key[1])
+
+		return exchange
+
+	# noinspection PyMethodMayBeStatic
+	def capture(self, exchange, fetched_at: float) -> MarketEntry:
+		shared = {attribute: getattr(exchange, attribute) for attribute in SHARED_ATTRIBUTES if hasattr(exchange, attribute)}
+
+		return MarketEntry(exchange.markets, exchange.currencies, fetched_at, shared)
+
+	def fetch(self, key: MarketKey) -> MarketEntry:
+		exchange = self.create_fetcher(key)
+		exchange.load_markets()
+
+		entry = self.capture(exchange, time.time())
+		self.persist(key, entry)
+
+		return entry
+
+	def load(self, key: MarketKey) -> Optional[MarketEntry]:
+		if not properties.get_or_default("markets.cache.persist", True):
+			return None
+
+		path = self.get_path(key)
+
+		if not path.exists():
+			return None
+
+		# noinspection PyBroadException
+		try:
+			with open(path, "r") as stream:
+				content = json.load(stream)
+
+			exchange = self.create_fetcher(key)
+			exchange.set_markets(content["markets"], content.get("currencies"))
+
+			return self.capture(exchange, float(content["fetchedAt"]))
+		except Exception:
+			from core.logger import logger
+			logger.log(logging.WARNING, traceback.format_exc())
+
+			return None
+
+	def persist(self, key: MarketKey, entry: MarketEntry):
+		if not properties.get_or_default("markets.cache.persist", True):
+			return
+
+		# noinspection PyBroadException
+		try:
+			path = self.get_path(key)
+			path.parent.mkdir(parents=True, exist_ok=True)
+
+			temporary_path = path.with_suffix(".tmp")
+			with open(temporary_path, "w") as stream:
+				json.dump({
+					"markets": list(entry.markets.values()),
+					"currencies": entry.currencies,
+					"fetchedAt": entry.fetched_at,
+				}, stream, default=str)
+
+			os.replace(temporary_path, path)
+		except Exception:
+			from core.logger import logger
+			logger.log(logging.WARNING, traceback.format_exc())
+
+	def get(self, exchange_id: str, exchange_environment: str) -> MarketEntry:
+		key = (exchange_id, exchange_environment)
+
+		entry = self.entries.get(key)
+
+		if entry is None:
+			with self.get_lock(key):
+				entry = self.entries.get(key)
+
+				if entry is None:
+					entry = self.load(key) or self.fetch(key)
+					self.entries[key] = entry
+
+		if entry.is_stale():
+			self.refresh_in_background(key)
+
+		return entry
+
+	def apply(self, exchange, exchange_id: str, exchange_environment: str):
+		key = (exchange_id, exchange_environment)
+
+		entry = self.get(exchange_id, exchange_environment)
+
+		for attribute, value in entry.shared.items():
+			setattr(exchange, attribute, value)
+
+		with self.lock:
+			self.instances.setdefault(key, weakref.WeakSet()).add(exchange)
+
+	def refresh_in_background(self, key: MarketKey):
+		with self.lock:
+			if key in self.refreshing:
+				return
+
+			self.refreshing.add(key)
+
+		def refresh():
+			# noinspection PyBroadException
+			try:
+				entry = self.fetch(key)
+				self.entries[key] = entry
+
+				with self.lock:
+					instances = list(self.instances.get(key, []))
+
+				for instance in instances:
+					for attribute, value in entry.shared.items():
+						setattr(instance, attribute, value)
+			except Exception:
+				from core.logger import logger
+				logger.log(logging.WARNING, traceback.format_exc())
+			finally:
+				with self.lock:
+					self.refreshing.discard(key)
+
+		threading.Thread(target=refresh, name=f"""markets-{key[0]}-{key[1]}""", daemon=True).start()
+
+
+market_cache = MarketCache.instance()
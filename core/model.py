@@ -4,20 +4,35 @@ import json
 import jsonpickle
 import re
 from dotmap import DotMap
+from functools import partial
 from singleton.singleton import ThreadSafeSingleton
-from typing import Any, Dict
+from typing import Any, Dict, Iterable, Iterator, List
 
 # noinspection PyUnresolvedReferences
 import ccxt as sync_ccxt
 # noinspection PyUnresolvedReferences
 import ccxt.async_support as async_ccxt
 from ccxt.base.types import OrderType, OrderSide
+from core.cache import execute_shared
 from core.decorators import handle_exceptions, async_handle_exceptions
-from core.types import MagicMethod, Environment, Credentials
+from core.dispatcher import dispatcher
+from core.projections import project, project_all, project_values
+from core.registry import exchange_registry
+from core.types import CachePolicy, MagicMethod, MAGIC_METHODS_BY_ALIAS, Environment, Credentials
 from core.utils import remove_non_allowed_characters
 
 ccxt = sync_ccxt
 
+TELEGRAM_MAX_MESSAGE_LENGTH = 4096
+
+
+async def dispatch(exchange, method, *args, **kwargs):
+	if isinstance(method, str):
+		method = getattr(exchange, method)
+
+	with exchange_registry.lease(exchange):
+		return await dispatcher.execute_for(f"""{exchange.id}|{exchange.apiKey}""", exchange.id, method, *args, **kwargs)
+
 
 # noinspection PyMethodMayBeStatic
 @handle_exceptions
@@ -216,7 +231,7 @@ class Model(object):
 		return balance
 
 	async def get_balances(self, exchange) -> Dict[str, Any]:
-		balances = exchange.fetch_balance()
+		balances = await dispatch(exchange, "fetch_balance")
 
 		non_zero_balances_keys = {key for key, value in balances.get("total", {}).items() if value > 0}
 		non_zero_balances = {key: balances[key] for key in non_zero_balances_keys}
@@ -229,220 +244,37 @@ class Model(object):
 		return sorted_balances
 
 	async def get_open_orders(self, exchange, market_id: str):
-		response = exchange.fetch_open_orders(market_id)
+		response = await dispatch(exchange, "fetch_open_orders", market_id)
 
-		output = [
-			{
-
-				"id": item.get("id"),
-				"clientOrderId": item.get("clientOrderId"),
-				# "timestamp": item.get("timestamp"),
-				# "lastTradeTimestamp": item.get("lastTradeTimestamp"),
-				"status": item.get("status"),
-				"symbol": item.get("symbol"),
-				"type": item.get("type"),
-				# "timeInForce": item.get("timeInForce"),
-				"side": item.get("side"),
-				"price": item.get("price"),
-				# "average": item.get("average"),
-				"amount": item.get("amount"),
-				"filled": item.get("filled"),
-				# "remaining": item.get("remaining"),
-				# "cost": item.get("cost"),
-				# "trades": item.get("trades"),
-				"datetime": item.get("datetime"),
-				"fee": item.get("fee"),
-				# "info": item.get("info"),
-				# "fees": item.get("fees"),
-				# "lastUpdateTimestamp": item.get("lastUpdateTimestamp"),
-				# "postOnly": item.get("postOnly"),
-				# "reduceOnly": item.get("reduceOnly"),
-				# "stopPrice": item.get("stopPrice"),
-				# "triggerPrice": item.get("triggerPrice"),
-				# "takeProfitPrice": item.get("takeProfitPrice"),
-				# "stopLossPrice": item.get("stopLossPrice")
-
-			} for item in response
-		]
-
-		return output
+		return project_all("order", response, default="open_orders")
 
 	async def market_buy_order(self, exchange, market_id: str, amount: float):
-		response = exchange.create_order(market_id, "market", "buy", amount)
+		response = await dispatch(exchange, "create_order", market_id, "market", "buy", amount)
 
-		output = {
-			'id': response.get("id"),
-			'clientOrderId': response.get("clientOrderId"),
-			'symbol': response.get("symbol"),
-			'type': response.get("type"),
-			'side': response.get("side"),
-			'amount': response.get("amount"),
-			'price': response.get("price"),
-			'filled': response.get("filled"),
-			'status': response.get("status"),
-			'datetime': response.get("datetime"),
-			# 'timestamp': response.get('timestamp'),
-			# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-			# 'timeInForce': response.get('timeInForce'),
-			# 'average': response.get('average'),
-			# 'remaining': response.get('remaining'),
-			# 'cost': response.get('cost'),
-			# 'trades': response.get('trades'),
-			'fee': response.get('fee'),
-			# 'fees': response.get('fees'),
-			# 'info': response.get('info'),
-			# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-			# 'postOnly': response.get('postOnly'),
-			# 'reduceOnly': response.get('reduceOnly'),
-			# 'stopPrice': response.get('stopPrice'),
-			# 'triggerPrice': response.get('triggerPrice'),
-			# 'takeProfitPrice': response.get('takeProfitPrice'),
-			# 'stopLossPrice': response.get('stopLossPrice'),
-		}
-
-		return output
+		return project("order", response)
 
 	async def market_sell_order(self, exchange, market_id: str, amount: float):
-		response = exchange.create_order(market_id, "market", "sell", amount)
-
-		output = {
-			'id': response.get("id"),
-			'clientOrderId': response.get("clientOrderId"),
-			'symbol': response.get("symbol"),
-			'type': response.get("type"),
-			'side': response.get("side"),
-			'amount': response.get("amount"),
-			'price': response.get("price"),
-			'filled': response.get("filled"),
-			'status': response.get("status"),
-			'datetime': response.get("datetime"),
-			# 'timestamp': response.get('timestamp'),
-			# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-			# 'timeInForce': response.get('timeInForce'),
-			# 'average': response.get('average'),
-			# 'remaining': response.get('remaining'),
-			# 'cost': response.get('cost'),
-			# 'trades': response.get('trades'),
-			'fee': response.get('fee'),
-			# 'fees': response.get('fees'),
-			# 'info': response.get('info'),
-			# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-			# 'postOnly': response.get('postOnly'),
-			# 'reduceOnly': response.get('reduceOnly'),
-			# 'stopPrice': response.get('stopPrice'),
-			# 'triggerPrice': response.get('triggerPrice'),
-			# 'takeProfitPrice': response.get('takeProfitPrice'),
-			# 'stopLossPrice': response.get('stopLossPrice'),
-		}
+		response = await dispatch(exchange, "create_order", market_id, "market", "sell", amount)
 
-		return output
+		return project("order", response)
 
 	async def limit_buy_order(self, exchange, market_id: str, amount: float, price: float):
-		response = exchange.create_order(market_id, "limit", "buy", amount, price)
-
-		output = {
-			'id': response.get("id"),
-			'clientOrderId': response.get("clientOrderId"),
-			'symbol': response.get("symbol"),
-			'type': response.get("type"),
-			'side': response.get("side"),
-			'amount': response.get("amount"),
-			'price': response.get("price"),
-			'filled': response.get("filled"),
-			'status': response.get("status"),
-			'datetime': response.get("datetime"),
-			# 'timestamp': response.get('timestamp'),
-			# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-			# 'timeInForce': response.get('timeInForce'),
-			# 'average': response.get('average'),
-			# 'remaining': response.get('remaining'),
-			# 'cost': response.get('cost'),
-			# 'trades': response.get('trades'),
-			'fee': response.get('fee'),
-			# 'fees': response.get('fees'),
-			# 'info': response.get('info'),
-			# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-			# 'postOnly': response.get('postOnly'),
-			# 'reduceOnly': response.get('reduceOnly'),
-			# 'stopPrice': response.get('stopPrice'),
-			# 'triggerPrice': response.get('triggerPrice'),
-			# 'takeProfitPrice': response.get('takeProfitPrice'),
-			# 'stopLossPrice': response.get('stopLossPrice'),
-		}
+		response = await dispatch(exchange, "create_order", market_id, "limit", "buy", amount, price)
 
-		return output
+		return project("order", response)
 
 	async def limit_sell_order(self, exchange, market_id: str, amount: float, price: float):
-		response = exchange.create_order(market_id, "limit", "sell", amount, price)
+		response = await dispatch(exchange, "create_order", market_id, "limit", "sell", amount, price)
 
-		output = {
-			'id': response.get("id"),
-			'clientOrderId': response.get("clientOrderId"),
-			'symbol': response.get("symbol"),
-			'type': response.get("type"),
-			'side': response.get("side"),
-			'amount': response.get("amount"),
-			'price': response.get("price"),
-			'filled': response.get("filled"),
-			'status': response.get("status"),
-			'datetime': response.get("datetime"),
-			# 'timestamp': response.get('timestamp'),
-			# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-			# 'timeInForce': response.get('timeInForce'),
-			# 'average': response.get('average'),
-			# 'remaining': response.get('remaining'),
-			# 'cost': response.get('cost'),
-			# 'trades': response.get('trades'),
-			'fee': response.get('fee'),
-			# 'fees': response.get('fees'),
-			# 'info': response.get('info'),
-			# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-			# 'postOnly': response.get('postOnly'),
-			# 'reduceOnly': response.get('reduceOnly'),
-			# 'stopPrice': response.get('stopPrice'),
-			# 'triggerPrice': response.get('triggerPrice'),
-			# 'takeProfitPrice': response.get('takeProfitPrice'),
-			# 'stopLossPrice': response.get('stopLossPrice'),
-		}
-
-		return output
+		return project("order", response)
 
 	async def place_order(self, exchange, market: str, order_type: OrderType, order_side: OrderSide, amount: float, price: float = None, stop_loss_price: float = None):
-		response = exchange.create_order(market, order_type, order_side, amount, price)
+		response = await dispatch(exchange, "create_order", market, order_type, order_side, amount, price)
+
 		if response.get("status") == "rejected":
-			output = {'status': response.get('status')}
-		else:
-			output = {
-				'id': response.get("id"),
-				'clientOrderId': response.get("clientOrderId"),
-				'symbol': response.get("symbol"),
-				'type': response.get("type"),
-				'side': response.get("side"),
-				'amount': response.get("amount"),
-				'price': response.get("price"),
-				'filled': response.get("filled"),
-				'status': response.get("status"),
-				'datetime': response.get("datetime"),
-				# 'timestamp': response.get('timestamp'),
-				# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-				# 'timeInForce': response.get('timeInForce'),
-				# 'average': response.get('average'),
-				# 'remaining': response.get('remaining'),
-				# 'cost': response.get('cost'),
-				# 'trades': response.get('trades'),
-				'fee': response.get('fee'),
-				# 'fees': response.get('fees'),
-				# 'info': response.get('info'),
-				# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-				# 'postOnly': response.get('postOnly'),
-				# 'reduceOnly': response.get('reduceOnly'),
-				# 'stopPrice': response.get('stopPrice'),
-				# 'triggerPrice': response.get('triggerPrice'),
-				# 'takeProfitPrice': response.get('takeProfitPrice'),
-				# 'stopLossPrice': response.get('stopLossPrice'),
-			}
+			return {"status": response.get("status")}
 
-		return output
+		return project("order", response)
 
 	def __getattr__(self, method_name):
 		def call(exchange: Any):
@@ -451,10 +283,24 @@ class Model(object):
 			if callable(attribute):
 				@async_handle_exceptions
 				async def method(*args, **kwargs):
-					result = attribute(*args, **kwargs)
+					cache_policy = CachePolicy.get_by_id(kwargs.pop("cache", None))
+					fields = kwargs.pop("fields", None)
+					exchange_environment = exchange.options.get("environment")
+
+					result = await execute_shared(
+						exchange.id,
+						exchange_environment,
+						method_name,
+						partial(dispatch, exchange, attribute),
+						args,
+						kwargs,
+						user_id=f"""{exchange.id}|{exchange_environment}|{exchange.apiKey}""",
+						cache_policy=cache_policy
+					)
 					output = self.handle_magic_command_output(
 						method_name,
-						result
+						result,
+						fields
 					)
 
 					return output
@@ -466,545 +312,216 @@ class Model(object):
 		return call
 
 	def beautify(self, target: Any, indent=0) -> str:
+		return "".join(self.render_lines(target, indent))
+
+	def render(self, target: Any, max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH) -> Iterator[str]:
+		return self.pack_lines(self.render_lines(target), max_length)
+
+	def render_lines(self, target: Any, indent=0) -> Iterator[str]:
+		# Yields one line at a time, joining them once keeps large outputs like describe() linear.
+		prefix = "  " * indent
+
 		if target is None:
-			result = "  " * indent + "<empty result>" + "\n"
+			yield prefix + "<empty result>" + "\n"
 		elif isinstance(target, dict):
-			result = ""
+			if not target:
+				yield "<empty result>\n"
+				return
+
 			for key, value in target.items():
-				result += "  " * indent + str(key) + ":"
 				if isinstance(value, (dict, list)):
-					result += "\n" + self.beautify(value, indent + 1)
+					yield prefix + str(key) + ":" + "\n"
+					yield from self.render_lines(value, indent + 1)
 				else:
-					result += " " + str(value) + "\n"
+					yield prefix + str(key) + ": " + str(value) + "\n"
 		elif isinstance(target, list):
-			result = ""
-			for index, item in enumerate(target):
-				result += "  " * indent + f"-"
+			if not target:
+				yield "<empty list>\n"
+				return
+
+			for item in target:
 				if isinstance(item, (dict, list)):
-					result += "\n" + self.beautify(item, indent + 1)
+					yield prefix + "-" + "\n"
+					yield from self.render_lines(item, indent + 1)
 				else:
-					result += " " + str(item) + "\n"
+					yield prefix + "- " + str(item) + "\n"
 		else:
-			result = "  " * indent + str(target) + "\n"
+			value = str(target)
 
-		if str(result).strip() == "":
-			if isinstance(target, dict):
-				result = "<empty result>\n"
-			elif isinstance(target, list):
-				result = "<empty list>\n"
-			else:
-				result = "<empty result>\n"
+			yield (prefix + value + "\n") if value.strip() else "<empty result>\n"
 
-		return result
+	# noinspection PyMethodMayBeStatic
+	def pack_lines(self, lines: Iterable[str], max_length: int = TELEGRAM_MAX_MESSAGE_LENGTH) -> Iterator[str]:
+		# Packs lines into messages of at most max_length characters, only a single oversized line is split.
+		chunk: List[str] = []
+		size = 0
 
-	def handle_magic_command_output(self, method, response):
-		if MagicMethod.is_equivalent(method, MagicMethod.CANCEL_ALL_ORDERS):
-			output = [
-				{
-					'id': item.get('id'),
-					'clientOrderId': item.get('clientOrderId'),
-					'timestamp': item.get('timestamp'),
-					'datetime': item.get('datetime'),
-					# 'lastTradeTimestamp': item.get('lastTradeTimestamp'),
-					# 'lastUpdateTimestamp': item.get('lastUpdateTimestamp'),
-					'symbol': item.get('symbol'),
-					'type': item.get('type'),
-					# 'timeInForce': item.get('timeInForce'),
-					# 'postOnly': item.get('postOnly'),
-					# 'reduceOnly': item.get('reduceOnly'),
-					'side': item.get('side'),
-					'price': item.get('price'),
-					# 'triggerPrice': item.get('triggerPrice'),
-					'amount': item.get('amount'),
-					# 'cost': item.get('cost'),
-					# 'average': item.get('average'),
-					'filled': item.get('filled'),
-					# 'remaining': item.get('remaining'),
-					'status': item.get('status'),
-					'fee': item.get('fee'),
-					# 'trades': item.get('trades'),
-					# 'fees': item.get('fees'),
-					# 'stopPrice': item.get('stopPrice'),
-					# 'takeProfitPrice': item.get('takeProfitPrice'),
-					# 'stopLossPrice': item.get('stopLossPrice'),
-				} for item in response
-			]
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.CANCEL_ORDER):
-			output = {
-				'id': response.get('id'),
-				'clientOrderId': response.get('clientOrderId'),
-				# 'timestamp': response.get('timestamp'),
-				'datetime': response.get('datetime'),
-				# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-				# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-				'symbol': response.get('symbol'),
-				'type': response.get('type'),
-				# 'timeInForce': response.get('timeInForce'),
-				# 'postOnly': response.get('postOnly'),
-				# 'reduceOnly': response.get('reduceOnly'),
-				'side': response.get('side'),
-				'price': response.get('price'),
-				# 'triggerPrice': response.get('triggerPrice'),
-				'amount': response.get('amount'),
-				# 'cost': response.get('cost'),
-				# 'average': response.get('average'),
-				'filled': response.get('filled'),
-				# 'remaining': response.get('remaining'),
-				'status': response.get('status'),
-				'fee': response.get('fee'),
-				# 'trades': response.get('trades'),
-				# 'fees': response.get('fees'),
-				# 'stopPrice': response.get('stopPrice'),
-				# 'takeProfitPrice': response.get('takeProfitPrice'),
-				# 'stopLossPrice': response.get('stopLossPrice'),
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.CREATE_ORDER):
-			output = {
-				'id': response.get('id'),
-				'clientOrderId': response.get('clientOrderId'),
-				# 'timestamp': response.get('timestamp'),
-				'datetime': response.get('datetime'),
-				# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-				# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-				'symbol': response.get('symbol'),
-				'type': response.get('type'),
-				# 'timeInForce': response.get('timeInForce'),
-				# 'postOnly': response.get('postOnly'),
-				# 'reduceOnly': response.get('reduceOnly'),
-				'side': response.get('side'),
-				'price': response.get('price'),
-				# 'triggerPrice': response.get('triggerPrice'),
-				'amount': response.get('amount'),
-				# 'cost': response.get('cost'),
-				# 'average': response.get('average'),
-				'filled': response.get('filled'),
-				# 'remaining': response.get('remaining'),
-				'status': response.get('status'),
-				'fee': response.get('fee'),
-				# 'fees': response.get('fees'),
-				# 'stopPrice': response.get('stopPrice'),
-				# 'takeProfitPrice': response.get('takeProfitPrice'),
-				# 'stopLossPrice': response.get('stopLossPrice')
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.DESCRIBE):
-			output = response
-			output['apiKey'] = "****"
-			output['secret'] = "****"
-			output['password'] = "****"
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.DEPOSIT):
-			output = response
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_BALANCE):
-			output = response
-
-			if output.get("info"):
-				del output["info"]
-
-			if output.get("timestamp"):
-				del output["timestamp"]
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_CLOSED_ORDERS):
-			output = [
-				{
-					'id': item.get('id'),
-					'clientOrderId': item.get('clientOrderId'),
-					# 'timestamp': item.get('timestamp'),
-					'datetime': item.get('datetime'),
-					# 'lastTradeTimestamp': item.get('lastTradeTimestamp'),
-					# 'lastUpdateTimestamp': item.get('lastUpdateTimestamp'),
-					'symbol': item.get('symbol'),
-					'type': item.get('type'),
-					# 'timeInForce': item.get('timeInForce'),
-					# 'postOnly': item.get('postOnly'),
-					# 'reduceOnly': item.get('reduceOnly'),
-					'side': item.get('side'),
-					'price': item.get('price'),
-					# 'triggerPrice': item.get('triggerPrice'),
-					'amount': item.get('amount'),
-					# 'cost': item.get('cost'),
-					# 'average': item.get('average'),
-					'filled': item.get('filled'),
-					# 'remaining': item.get('remaining'),
-					'status': item.get('status'),
-					'fee': item.get('fee'),
-					# 'trades': item.get('trades'),
-					# 'fees': item.get('fees'),
-					# 'stopPrice': item.get('stopPrice'),
-					# 'takeProfitPrice': item.get('takeProfitPrice'),
-					# 'stopLossPrice': item.get('stopLossPrice'),
-				} for item in response
-			]
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_CURRENCIES):
-			output = {
-				key: {
-					# "info": value.get("info"),
-					"id": value.get("id"),
-					"numericId": value.get("numericId"),
-					# "code": value.get("code"),
-					"precision": value.get("precision"),
-					# "type": value.get("type"),
-					"name": value.get("name"),
-					# "active": value.get("active"),
-					# "deposit": value.get("deposit"),
-					# "withdraw": value.get("withdraw"),
-					# "fee": value.get("fee"),
-					# "fees": value.get("fees"),
-					# "networks": value.get("networks"),
-					# "limits": value.get("limits"),
-				} for key, value in response.items()
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_DEPOSIT_ADDRESSES):
-			if response.get("info"):
-				del response["info"]
-
-			output = {
-				key: {
-					# "info": value.get("info"),
-					"currency": value.get("currency"),
-					"address": value.get("address"),
-					"network": value.get("network"),
-					"tag": value.get("tag"),
-				} for key, value in response.items()
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_MARKETS):
-			output = {
-				item.get('symbol'): {
-					'id': item.get('id'),
-					# 'lowercaseId': item.get('lowercaseId'),
-					'symbol': item.get('symbol'),
-					'base': item.get('base'),
-					'quote': item.get('quote'),
-					# 'settle': item.get('settle'),
-					'baseId': item.get('baseId'),
-					'quoteId': item.get('quoteId'),
-					# 'settleId': item.get('settleId'),
-					# 'type': item.get('type'),
-					# 'spot': item.get('spot'),
-					# 'margin': item.get('margin'),
-					# 'swap': item.get('swap'),
-					# 'future': item.get('future'),
-					# 'option': item.get('option'),
-					# 'index': item.get('index'),
-					# 'active': item.get('active'),
-					# 'contract': item.get('contract'),
-					# 'linear': item.get('linear'),
-					# 'inverse': item.get('inverse'),
-					# 'subType': item.get('subType'),
-					'taker': item.get('taker'),
-					'maker': item.get('maker'),
-					# 'contractSize': item.get('contractSize'),
-					# 'expiry': item.get('expiry'),
-					# 'expiryDatetime': item.get('expiryDatetime'),
-					# 'strike': item.get('strike'),
-					# 'optionType': item.get('optionType'),
-					# 'created': item.get('created'),
-				} for item in response
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_MY_TRADES):
-			output = [
-				{
-					# 'id': item["info"].get('id'),
-					# 'p': item["info"].get('p'),
-					# 'q': item["info"].get('q'),
-					# 'infoSide': item["info"].get('side'),
-					# 'ts': item["info"].get('ts'),
-					'datetime': item.get('datetime'),
-					'symbol': item.get('symbol'),
-					'order': item.get('order'),
-					'type': item.get('type'),
-					# 'takerOrMaker': item.get('takerOrMaker'),
-					'side': item.get('side'),
-					'price': item.get('price'),
-					'amount': item.get('amount'),
-					# 'cost': item.get('cost'),
-					'fee': item.get('fee'),
-					# 'costFee': item['fees'].get('cost'),
-					# 'currency': item['fees'].get('currency'),
-					# 'rate': item['fees'].get('rate'),
-
-				} for item in response
-			]
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_OHLCV):
-			output = {
-				item[0]: {
-					"open": item[1],
-					"high": item[2],
-					"low": item[3],
-					"close": item[4],
-					"volume": item[5]
-				} for item in response
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_OPEN_ORDERS):
-			output = [
-				{
-					'id': item.get('id'),
-					'clientOrderId': item.get('clientOrderId'),
-					'datetime': item.get('datetime'),
-					# 'timestamp': item.get('timestamp'),
-					# 'lastTradeTimestamp': item.get('lastTradeTimestamp'),
-					'status': item.get('status'),
-					'symbol': item.get('symbol'),
-					'type': item.get('type'),
-					# 'timeInForce': item.get('timeInForce'),
-					'side': item.get('side'),
-					'price': item.get('price'),
-					# 'average': item.get('average'),
-					'amount': item.get('amount'),
-					'filled': item.get('filled'),
-					# 'remaining': item.get('remaining'),
-					# 'cost': item.get('cost'),
-					# 'trades': item.get('trades'),
-					# "feeCurrency": item["fee"].get("currency"),
-					# "feeCost": item["fee"].get("cost"),
-					# "feeRate": item["fee"].get("rate"),
-					# 'lastUpdateTimestamp': item.get('lastUpdateTimestamp'),
-					# 'postOnly': item.get('postOnly'),
-					# 'reduceOnly': item.get('reduceOnly'),
-					# 'stopPrice': item.get('stopPrice'),
-					# 'triggerPrice': item.get('triggerPrice'),
-					# 'takeProfitPrice': item.get('takeProfitPrice'),
-					# 'stopLossPrice': item.get('stopLossPrice'),
-				} for item in response
-			]
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_OPEN_ORDER):
-			output = {
-				'id': response.get('id'),
-				'clientOrderId': response.get('clientOrderId'),
-				'datetime': response.get('datetime'),
-				# 'timestamp': response.get('timestamp'),
-				# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-				'status': response.get('status'),
-				'symbol': response.get('symbol'),
-				'type': response.get('type'),
-				# 'timeInForce': response.get('timeInForce'),
-				'side': response.get('side'),
-				'price': response.get('price'),
-				# 'average': response.get('average'),
-				'amount': response.get('amount'),
-				'filled': response.get('filled'),
-				# 'remaining': response.get('remaining'),
-				# 'cost': response.get('cost'),
-				# 'trades': response.get('trades'),
-				# 'info': response.get('info'),
-				'fees': response.get('fees'),
-				# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-				# 'postOnly': response.get('postOnly'),
-				# 'reduceOnly': response.get('reduceOnly'),
-				# 'stopPrice': response.get('stopPrice'),
-				# 'triggerPrice': response.get('triggerPrice'),
-				# 'takeProfitPrice': response.get('takeProfitPrice'),
-				# 'stopLossPrice': response.get('stopLossPrice'),
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_ORDER):
-			output = {
-				'id': response.get('id'),
-				'clientOrderId': response.get('clientOrderId'),
-				'datetime': response.get('datetime'),
-				# 'timestamp': response.get('timestamp'),
-				# 'lastTradeTimestamp': response.get('lastTradeTimestamp'),
-				'status': response.get('status'),
-				'symbol': response.get('symbol'),
-				'type': response.get('type'),
-				# 'timeInForce': response.get('timeInForce'),
-				'side': response.get('side'),
-				'price': response.get('price'),
-				# 'average': response.get('average'),
-				'amount': response.get('amount'),
-				'filled': response.get('filled'),
-				# 'remaining': response.get('remaining'),
-				# 'cost': response.get('cost'),
-				# 'trades': response.get('trades'),
-				# 'info': response.get('info'),
-				'fees': response.get('fees'),
-				# 'lastUpdateTimestamp': response.get('lastUpdateTimestamp'),
-				# 'postOnly': response.get('postOnly'),
-				# 'reduceOnly': response.get('reduceOnly'),
-				# 'stopPrice': response.get('stopPrice'),
-				# 'triggerPrice': response.get('triggerPrice'),
-				# 'takeProfitPrice': response.get('takeProfitPrice'),
-				# 'stopLossPrice': response.get('stopLossPrice'),
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_ORDER_BOOK):
-			output = {
-				"bids": [
-					{
-						"price": item[0],
-						"amount": item[1]
-					} for item in response.get("bids")
-				],
-				"asks": [
-					{
-						"price": item[0],
-						"amount": item[1]
-					} for item in response.get("asks")
-				],
-				'datetime': response.get('datetime'),
-				# 'nonce': response.get('nonce'),
-				'symbol': response.get('symbol'),
-				# 'timestamp': response.get('timestamp'),
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_ORDERS):
-			output = [
+		for line in lines:
+			if size + len(line) > max_length and chunk:
+				yield "".join(chunk)
+				chunk = []
+				size = 0
+
+			while len(line) > max_length:
+				yield line[:max_length]
+				line = line[max_length:]
+
+			if line:
+				chunk.append(line)
+				size += len(line)
+
+		if chunk:
+			yield "".join(chunk)
+
+	def handle_magic_command_output(self, method, response, fields=None):
+		magic_method = method if isinstance(method, MagicMethod) else MAGIC_METHODS_BY_ALIAS.get(MagicMethod.normalize(method))
+		formatter = self.formatters.get(magic_method)
+
+		if formatter is None:
+			return response
+
+		return formatter(self, response, fields)
+
+	def format_cancel_all_orders(self, response, fields=None):
+		return project_all("order", response, fields, "cancel_all_orders")
+
+	def format_cancel_order(self, response, fields=None):
+		return project("order", response, fields, "summary")
+
+	def format_create_order(self, response, fields=None):
+		return project("order", response, fields, "summary")
+
+	def format_describe(self, response, fields=None):
+		# Responses may be shared with the cache and other callers, formatters build new dicts instead of editing them.
+		output = {**response, 'apiKey': "****", 'secret': "****", 'password': "****"}
+
+		return output
+
+	def format_deposit(self, response, fields=None):
+		output = response
+
+		return output
+
+	def format_fetch_balance(self, response, fields=None):
+		output = {key: value for key, value in response.items() if key not in ["info", "timestamp"] or not value}
+
+		return output
+
+	def format_fetch_closed_orders(self, response, fields=None):
+		return project_all("order", response, fields, "summary")
+
+	def format_fetch_currencies(self, response, fields=None):
+		return project_values("currency", response, fields)
+
+	def format_fetch_deposit_addresses(self, response, fields=None):
+		addresses = {key: value for key, value in response.items() if key != "info" or not value}
+
+		return project_values("deposit_address", addresses, fields)
+
+	def format_fetch_markets(self, response, fields=None):
+		return dict(zip([item.get("symbol") for item in response], project_all("market", response, fields)))
+
+	def format_fetch_my_trades(self, response, fields=None):
+		return project_all("trade", response, fields, "fetch_my_trades")
+
+	def format_fetch_ohlcv(self, response, fields=None):
+		output = {
+			item[0]: {
+				"open": item[1],
+				"high": item[2],
+				"low": item[3],
+				"close": item[4],
+				"volume": item[5]
+			} for item in response
+		}
+
+		return output
+
+	def format_fetch_open_orders(self, response, fields=None):
+		return project_all("order", response, fields, "fetch_open_orders")
+
+	def format_fetch_open_order(self, response, fields=None):
+		return project("order", response, fields, "fetch_order")
+
+	def format_fetch_order(self, response, fields=None):
+		return project("order", response, fields, "fetch_order")
+
+	def format_fetch_order_book(self, response, fields=None):
+		output = {
+			"bids": [
 				{
-					'id': item.get('id'),
-					'clientOrderId': item.get('clientOrderId'),
-					'datetime': item.get('datetime'),
-					# 'timestamp': item.get('timestamp'),
-					# 'lastTradeTimestamp': item.get('lastTradeTimestamp'),
-					'status': item.get('status'),
-					'symbol': item.get('symbol'),
-					'type': item.get('type'),
-					# 'timeInForce': item.get('timeInForce'),
-					'side': item.get('side'),
-					'price': item.get('price'),
-					# 'average': item.get('average'),
-					'amount': item.get('amount'),
-					'filled': item.get('filled'),
-					# 'remaining': item.get('remaining'),
-					# 'cost': item.get('cost'),
-					# 'trades': item.get('trades'),
-					# 'lastUpdateTimestamp': item.get('lastUpdateTimestamp'),
-					# 'postOnly': item.get('postOnly'),
-					# 'reduceOnly': item.get('reduceOnly'),
-					# 'stopPrice': item.get('stopPrice'),
-					# 'triggerPrice': item.get('triggerPrice'),
-					# 'takeProfitPrice': item.get('takeProfitPrice'),
-					# 'stopLossPrice': item.get('stopLossPrice'),
-					# 'info': item.get('info'),
-					'fees': item.get('fees')
-				} for item in response
-			]
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_STATUS):
-			output = {
-				'status': response.get('status'),
-				# 'updated': response.get('updated'),
-				# 'eta': response.get('eta'),
-				# 'url': response.get('url'),
-				# 'info': response.get('info'),
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_TICKER):
-			output = {
-				"symbol": response.get("symbol"),
-				"datetime": response.get("datetime"),
-				"last": response.get("last"),
-				# "open": response.get("open"),
-				# "high": response.get("high"),
-				# "low": response.get("low"),
-				# "close": response.get("close"),
-				# "bid": response.get("bid"),
-				# "ask": response.get("ask"),
-				# "change": response.get("change"),
-				# "percentage": response.get("percentage"),
-				# "average": response.get("average"),
-				# "baseVolume": response.get("baseVolume"),
-				# "quoteVolume": response.get("quoteVolume"),
-				# "info": response.get("info")
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_TICKERS):
-			output = {
-				key: {
-					'symbol': value.get('symbol'),
-					# 'timestamp': value.get('timestamp'),
-					'datetime': value.get('datetime'),
-					# 'high': value.get('high'),
-					# 'low': value.get('low'),
-					# 'bid': value.get('bid'),
-					# 'bidVolume': value.get('bidVolume'),
-					# 'ask': value.get('ask'),
-					# 'askVolume': value.get('askVolume'),
-					# 'vwap': value.get('vwap'),
-					# 'open': value.get('open'),
-					# 'close': value.get('close'),
-					'last': value.get('last'),
-					# 'previousClose': value.get('previousClose'),
-					# 'change': value.get('change'),
-					# 'percentage': value.get('percentage'),
-					# 'average': value.get('average'),
-					# 'baseVolume': value.get('baseVolume'),
-					# 'quoteVolume': value.get('quoteVolume'),
-					# 'info': value.get('info')
-				} for key, value in response.items()
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_TRADES):
-			output = [
+					"price": item[0],
+					"amount": item[1]
+				} for item in response.get("bids")
+			],
+			"asks": [
 				{
-					# 'info': item.get('info'),
-					# 'timestamp': item.get('timestamp'),
-					'datetime': item.get('datetime'),
-					'symbol': item.get('symbol'),
-					'id': item.get('id'),
-					'order': item.get('order'),
-					'type': item.get('type'),
-					# 'takerOrMaker': item.get('takerOrMaker'),
-					'side': item.get('side'),
-					'price': item.get('price'),
-					'amount': item.get('amount'),
-					# 'cost': item.get('cost'),
-					'fee': item.get('fee'),
-					# 'fees': item.get('fees'),
-				} for item in response
-			]
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.FETCH_TRADING_FEE):
-			output = {
-				# 'info': response.get('info'),
-				'symbol': response.get('symbol'),
-				'maker': response.get('maker'),
-				'taker': response.get('taker'),
-				# 'percentage': response.get('percentage'),
-				# 'tierBased': response.get('tierBased'),
-			}
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.SET_SANDBOX_MODE):
-			output = response
-
-			return output
-		elif MagicMethod.is_equivalent(method, MagicMethod.WITHDRAW):
-			output = response
-
-			return output
-		else:
-			return response
+					"price": item[0],
+					"amount": item[1]
+				} for item in response.get("asks")
+			],
+			'datetime': response.get('datetime'),
+			# 'nonce': response.get('nonce'),
+			'symbol': response.get('symbol'),
+			# 'timestamp': response.get('timestamp'),
+		}
+
+		return output
+
+	def format_fetch_orders(self, response, fields=None):
+		return project_all("order", response, fields, "fetch_order")
+
+	def format_fetch_status(self, response, fields=None):
+		return project("status", response, fields)
+
+	def format_fetch_ticker(self, response, fields=None):
+		return project("ticker", response, fields)
+
+	def format_fetch_tickers(self, response, fields=None):
+		return project_values("ticker", response, fields)
+
+	def format_fetch_trades(self, response, fields=None):
+		return project_all("trade", response, fields)
+
+	def format_fetch_trading_fee(self, response, fields=None):
+		return project("trading_fee", response, fields)
+
+	def format_set_sandbox_mode(self, response, fields=None):
+		output = response
+
+		return output
+
+	def format_withdraw(self, response, fields=None):
+		output = response
+
+		return output
+
+	formatters = {
+		MagicMethod.CANCEL_ALL_ORDERS: format_cancel_all_orders,
+		MagicMethod.CANCEL_ORDER: format_cancel_order,
+		MagicMethod.CREATE_ORDER: format_create_order,
+		MagicMethod.DESCRIBE: format_describe,
+		MagicMethod.DEPOSIT: format_deposit,
+		MagicMethod.FETCH_BALANCE: format_fetch_balance,
+		MagicMethod.FETCH_CLOSED_ORDERS: format_fetch_closed_orders,
+		MagicMethod.FETCH_CURRENCIES: format_fetch_currencies,
+		MagicMethod.FETCH_DEPOSIT_ADDRESSES: format_fetch_deposit_addresses,
+		MagicMethod.FETCH_MARKETS: format_fetch_markets,
+		MagicMethod.FETCH_MY_TRADES: format_fetch_my_trades,
+		MagicMethod.FETCH_OHLCV: format_fetch_ohlcv,
+		MagicMethod.FETCH_OPEN_ORDERS: format_fetch_open_orders,
+		MagicMethod.FETCH_OPEN_ORDER: format_fetch_open_order,
+		MagicMethod.FETCH_ORDER: format_fetch_order,
+		MagicMethod.FETCH_ORDER_BOOK: format_fetch_order_book,
+		MagicMethod.FETCH_ORDERS: format_fetch_orders,
+		MagicMethod.FETCH_STATUS: format_fetch_status,
+		MagicMethod.FETCH_TICKER: format_fetch_ticker,
+		MagicMethod.FETCH_TICKERS: format_fetch_tickers,
+		MagicMethod.FETCH_TRADES: format_fetch_trades,
+		MagicMethod.FETCH_TRADING_FEE: format_fetch_trading_fee,
+		MagicMethod.SET_SANDBOX_MODE: format_set_sandbox_mode,
+		MagicMethod.WITHDRAW: format_withdraw,
+	}
 
 	def dump(self, target: Any):
 		try:
@@ -0,0 +1,160 @@
+import math
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+
+# noinspection PyUnresolvedReferences
+import ccxt as sync_ccxt
+
+COLUMNS = ["timestamp", "open", "high", "low", "close", "volume"]
+
+
+class Candles(object):
+	def __init__(self, timestamps, open_, high, low, close, volume):
+		self.timestamps = timestamps
+		self.open = open_
+		self.high = high
+		self.low = low
+		self.close = close
+		self.volume = volume
+
+	@staticmethod
+	def from_rows(rows: Sequence[Sequence[float]]) -> "Candles":
+		if len(rows) == 0:
+			empty = np.empty(0, dtype=np.float64)
+
+			return Candles(np.empty(0, dtype=np.int64), empty, empty, empty, empty, empty)
+
+		array = np.asarray(rows, dtype=np.float64)
+
+		return Candles(
+			array[:, 0].astype(np.int64),
+			array[:, 1].copy(),
+			array[:, 2].copy(),
+			array[:, 3].copy(),
+			array[:, 4].copy(),
+			np.nan_to_num(array[:, 5]),
+		)
+
+	def __len__(self):
+		return len(self.timestamps)
+
+	def resample(self, timeframe: str) -> "Candles":
+		if len(self) == 0:
+			return self
+
+		duration = sync_ccxt.Exchange.parse_timeframe(timeframe) * 1000
+		buckets = self.timestamps - self.timestamps % duration
+
+		# Candles arrive sorted by time, so every bucket is a contiguous run of rows.
+		starts = np.concatenate(([0], np.flatnonzero(np.diff(buckets)) + 1))
+		ends = np.concatenate((starts[1:], [len(buckets)])) - 1
+
+		return Candles(
+			buckets[starts],
+			self.open[starts],
+			np.maximum.reduceat(self.high, starts),
+			np.minimum.reduceat(self.low, starts),
+			self.close[ends],
+			np.add.reduceat(self.volume, starts),
+		)
+
+	def sma(self, period: int):
+		output = np.full(len(self), np.nan)
+
+		if period <= 0 or len(self) < period:
+			return output
+
+		sums = np.cumsum(self.close)
+		sums[period:] = sums[period:] - sums[:-period]
+		output[period - 1:] = sums[period - 1:] / period
+
+		return output
+
+	def ema(self, period: int):
+		values = self.close
+		output = np.empty(len(values))
+
+		if len(values) == 0 or period <= 1:
+			return values.copy()
+
+		alpha = 2 / (period + 1)
+		decay = 1 - alpha
+		# Largest block for which decay ** -block stays well inside the float64 range.
+		block = max(1, int(600 / -math.log(decay)))
+		previous = values[0]
+
+		for start in range(0, len(values), block):
+			chunk = values[start:start + block]
+			exponents = np.arange(len(chunk))
+			powers = decay ** exponents
+
+			# y[j] = decay ** (j + 1) * y[-1] + alpha * sum(decay ** (j - i) * x[i] for i <= j), evaluated without a per-row loop.
+			output[start:start + len(chunk)] = decay * powers * previous + alpha * powers * np.cumsum(chunk / powers)
+			previous = output[start + len(chunk) - 1]
+
+		return output
+
+	def vwap(self):
+		typical_prices = (self.high + self.low + self.close) / 3
+		volumes = np.cumsum(self.volume)
+
+		with np.errstate(divide="ignore", invalid="ignore"):
+			return np.where(volumes > 0, np.cumsum(typical_prices * self.volume) / volumes, np.nan)
+
+	def indicator(self, name: str, period: Optional[int] = None):
+		if name == "sma":
+			return self.sma(period or 20)
+		elif name == "ema":
+			return self.ema(period or 20)
+		elif name == "vwap":
+			return self.vwap()
+
+		raise ValueError(f"""Unrecognized indicator "{name}".""")
+
+	def to_columns(self, indicators: Dict[str, Any] = None) -> Dict[str, List[Any]]:
+		columns = {
+			"timestamp": self.timestamps.tolist(),
+			"open": self.open.tolist(),
+			"high": self.high.tolist(),
+			"low": self.low.tolist(),
+			"close": self.close.tolist(),
+			"volume": self.volume.tolist(),
+		}
+
+		for name, values in (indicators or {}).items():
+			# NaN is not valid JSON, the warm-up rows of an indicator are sent as null.
+			columns[name] = np.where(np.isnan(values), None, values).tolist()
+
+		return columns
+
+
+def parse_indicators(target: str | Sequence[str] = None) -> List[tuple[str, str, Optional[int]]]:
+	if not target:
+		return []
+
+	if isinstance(target, str):
+		target = target.split(",")
+
+	indicators = []
+
+	for item in target:
+		name, _, period = str(item).strip().lower().partition(":")
+
+		if not name:
+			continue
+
+		indicators.append((f"""{name}{period}""" if period else name, name, int(period) if period else None))
+
+	return indicators
+
+
+def to_columnar(rows: Sequence[Sequence[float]], resample: str = None, indicators: str | Sequence[str] = None) -> Dict[str, List[Any]]:
+	candles = Candles.from_rows(rows)
+
+	if resample:
+		candles = candles.resample(resample)
+
+	return candles.to_columns({
+		key: candles.indicator(name, period) for key, name, period in parse_indicators(indicators)
+	})
@@ -0,0 +1,202 @@
+import datetime
+import time
+from functools import partial
+from singleton.singleton import ThreadSafeSingleton
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from core.properties import properties
+from core.streams import stream_hub
+from core.types import StreamChannel
+
+BookKey = Tuple[str, str, str]
+
+
+class LocalOrderBook(object):
+	def __init__(self, key: BookKey):
+		self.key = key
+		# Price levels as parallel arrays, bids descending and asks ascending like the exchange sends them.
+		self.bid_prices: List[float] = []
+		self.bid_amounts: List[float] = []
+		self.ask_prices: List[float] = []
+		self.ask_amounts: List[float] = []
+		self.nonce: Optional[int] = None
+		self.timestamp: Optional[int] = None
+		self.synchronized = False
+		self.updates = 0
+		self.rejected = 0
+		self.resyncs = 0
+		# Consecutive interruptions, a symbol the exchange keeps refusing is dropped once it reaches order_books.max_failures.
+		self.failures = 0
+		self.read_at = time.monotonic()
+
+	def apply(self, book: Optional[Any]) -> bool:
+		if book is None:
+			# The stream was interrupted, updates may have been missed until the next snapshot arrives.
+			self.failures += 1
+
+			if self.synchronized:
+				self.synchronized = False
+				self.resyncs += 1
+
+			return False
+
+		nonce = book.get("nonce")
+
+		if self.synchronized and nonce is not None and self.nonce is not None and nonce < self.nonce:
+			self.rejected += 1
+
+			return False
+
+		depth = int(properties.get_or_default("order_books.depth", 100))
+
+		bids = book["bids"][:depth]
+		asks = book["asks"][:depth]
+
+		self.bid_prices = [level[0] for level in bids]
+		self.bid_amounts = [level[1] for level in bids]
+		self.ask_prices = [level[0] for level in asks]
+		self.ask_amounts = [level[1] for level in asks]
+		self.nonce = nonce
+		self.timestamp = book.get("timestamp")
+		self.synchronized = True
+		self.failures = 0
+		self.updates += 1
+
+		return True
+
+	def best_bid(self) -> Optional[Tuple[float, float]]:
+		return (self.bid_prices[0], self.bid_amounts[0]) if self.bid_prices else None
+
+	def best_ask(self) -> Optional[Tuple[float, float]]:
+		return (self.ask_prices[0], self.ask_amounts[0]) if self.ask_prices else None
+
+	def view(self, limit: Optional[int] = None) -> Dict[str, Any]:
+		limit = int(limit) if limit else None
+
+		return {
+			"symbol": self.key[2],
+			"bids": [[price, amount] for price, amount in zip(self.bid_prices[:limit], self.bid_amounts[:limit])],
+			"asks": [[price, amount] for price, amount in zip(self.ask_prices[:limit], self.ask_amounts[:limit])],
+			"timestamp": self.timestamp,
+			"datetime": datetime.datetime.fromtimestamp(self.timestamp / 1000, datetime.UTC).isoformat() if self.timestamp else None,
+			"nonce": self.nonce,
+		}
+
+
+@ThreadSafeSingleton
+class OrderBookEngine(object):
+	def __init__(self):
+		self.books: Dict[BookKey, LocalOrderBook] = {}
+		self.listeners: Dict[BookKey, Callable[[Optional[Any]], None]] = {}
+		self.unsupported: set[str] = set()
+		self.failed_at: Dict[BookKey, float] = {}
+		self.last_sweep = time.monotonic()
+		self.hits = 0
+		self.misses = 0
+		self.refused = 0
+		self.failed = 0
+
+	def track(self, exchange_id: str, exchange_environment: str, symbol: str):
+		key = (exchange_id, exchange_environment, symbol)
+
+		if not symbol or key in self.books or key in self.failed_at or exchange_id in self.unsupported:
+			return
+
+		if not properties.get_or_default("order_books.enabled", True):
+			return
+
+		# Every tracked book holds an upstream subscription open, requests for new markets fall back to REST beyond the cap.
+		max_books = int(properties.get_or_default("order_books.max_books", 100))
+
+		if len(self.books) >= max_books:
+			self.sweep(True)
+
+			if len(self.books) >= max_books:
+				self.refused += 1
+
+				return
+
+		book = LocalOrderBook(key)
+		listener = partial(self.update, book)
+
+		try:
+			stream_hub.listen((exchange_id, exchange_environment, symbol, StreamChannel.ORDER_BOOK), listener)
+		except ValueError:
+			self.unsupported.add(exchange_id)
+
+			return
+
+		self.books[key] = book
+		self.listeners[key] = listener
+
+	def untrack(self, key: BookKey):
+		self.books.pop(key, None)
+		listener = self.listeners.pop(key, None)
+
+		if listener is not None:
+			stream_hub.unlisten((key[0], key[1], key[2], StreamChannel.ORDER_BOOK), listener)
+
+	def update(self, book: LocalOrderBook, data: Optional[Any]):
+		# Called from the watch loops, so idle books are released even when nobody reads any book.
+		book.apply(data)
+
+		if book.failures >= int(properties.get_or_default("order_books.max_failures", 5)):
+			self.failed += 1
+			self.failed_at[book.key] = time.monotonic()
+			self.untrack(book.key)
+
+		self.sweep()
+
+	def get_book(self, exchange_id: str, exchange_environment: str, symbol: str) -> Optional[LocalOrderBook]:
+		book = self.books.get((exchange_id, exchange_environment, symbol))
+
+		if book is None or not book.synchronized:
+			self.misses += 1
+
+			return None
+
+		book.read_at = time.monotonic()
+		self.hits += 1
+
+		return book
+
+	def get(self, exchange_id: str, exchange_environment: str, symbol: str, limit: Optional[int] = None) -> Optional[Dict[str, Any]]:
+		book = self.get_book(exchange_id, exchange_environment, symbol)
+
+		return book.view(limit) if book else None
+
+	def sweep(self, force: bool = False):
+		now = time.monotonic()
+
+		if not force and now - self.last_sweep < float(properties.get_or_default("order_books.sweep_interval", 10)):
+			return
+
+		self.last_sweep = now
+		idle_timeout = float(properties.get_or_default("order_books.idle_timeout", 300))
+
+		for key, book in list(self.books.items()):
+			if now - book.read_at > idle_timeout:
+				self.untrack(key)
+
+		# Failed markets are only retried after the same idle timeout.
+		for key, failed_at in list(self.failed_at.items()):
+			if now - failed_at > idle_timeout:
+				del self.failed_at[key]
+
+	def summary(self) -> Dict[str, Any]:
+		books = list(self.books.values())
+
+		return {
+			"books": len(books),
+			"synchronized": sum(1 for book in books if book.synchronized),
+			"hits": self.hits,
+			"misses": self.misses,
+			"refused": self.refused,
+			"failed": self.failed,
+			"updates": sum(book.updates for book in books),
+			"rejected": sum(book.rejected for book in books),
+			"resyncs": sum(book.resyncs for book in books),
+		}
+
+
+order_book_engine = OrderBookEngine.instance()
@@ -0,0 +1,134 @@
+from functools import lru_cache
+from operator import itemgetter
+from typing import Any, Callable, Dict, Iterable, List, Mapping, Sequence, Tuple
+
+from core.properties import properties
+
+FIELD_SETS: Dict[str, Dict[str, Tuple[str, ...]]] = {
+	"order": {
+		"minimal": ("id", "symbol", "side", "amount", "price", "status"),
+		"default": ("id", "clientOrderId", "symbol", "type", "side", "amount", "price", "filled", "status", "datetime", "fee"),
+		# The commands below have always answered with their own selection and order of fields.
+		"open_orders": ("id", "clientOrderId", "status", "symbol", "type", "side", "price", "amount", "filled", "datetime", "fee"),
+		"summary": ("id", "clientOrderId", "datetime", "symbol", "type", "side", "price", "amount", "filled", "status", "fee"),
+		"cancel_all_orders": ("id", "clientOrderId", "timestamp", "datetime", "symbol", "type", "side", "price", "amount", "filled", "status", "fee"),
+		"fetch_open_orders": ("id", "clientOrderId", "datetime", "status", "symbol", "type", "side", "price", "amount", "filled"),
+		"fetch_order": ("id", "clientOrderId", "datetime", "status", "symbol", "type", "side", "price", "amount", "filled", "fees"),
+		"full": (
+			"id", "clientOrderId", "symbol", "type", "side", "amount", "price", "filled", "remaining", "average", "cost", "status",
+			"timestamp", "datetime", "lastTradeTimestamp", "timeInForce", "postOnly", "reduceOnly", "triggerPrice", "stopLossPrice",
+			"takeProfitPrice", "fee", "fees",
+		),
+	},
+	"trade": {
+		"minimal": ("id", "symbol", "side", "price", "amount"),
+		"default": ("datetime", "symbol", "id", "order", "type", "side", "price", "amount", "fee"),
+		"fetch_my_trades": ("datetime", "symbol", "order", "type", "side", "price", "amount", "fee"),
+		"full": ("id", "order", "symbol", "type", "takerOrMaker", "side", "price", "amount", "cost", "fee", "fees", "timestamp", "datetime"),
+	},
+	"ticker": {
+		"minimal": ("symbol", "last"),
+		"default": ("symbol", "datetime", "last"),
+		"full": (
+			"symbol", "timestamp", "datetime", "high", "low", "bid", "bidVolume", "ask", "askVolume", "vwap", "open", "close", "last",
+			"previousClose", "change", "percentage", "average", "baseVolume", "quoteVolume",
+		),
+	},
+	"market": {
+		"minimal": ("id", "symbol"),
+		"default": ("id", "symbol", "base", "quote", "baseId", "quoteId", "taker", "maker"),
+		"full": (
+			"id", "symbol", "base", "quote", "settle", "baseId", "quoteId", "settleId", "type", "spot", "margin", "swap", "future",
+			"option", "active", "contract", "linear", "inverse", "taker", "maker", "precision", "limits",
+		),
+	},
+	"currency": {
+		"default": ("id", "numericId", "precision", "name"),
+		"full": ("id", "numericId", "code", "name", "type", "active", "deposit", "withdraw", "fee", "precision", "limits", "networks"),
+	},
+	"deposit_address": {
+		"default": ("currency", "address", "network", "tag"),
+	},
+	"trading_fee": {
+		"default": ("symbol", "maker", "taker"),
+		"full": ("symbol", "maker", "taker", "percentage", "tierBased"),
+	},
+	"status": {
+		"default": ("status",),
+		"full": ("status", "updated", "eta", "url"),
+	},
+}
+
+
+class Projection(object):
+	def __init__(self, fields: Sequence[str]):
+		self.fields = tuple(fields)
+
+		if len(self.fields) == 1:
+			field = self.fields[0]
+			self.getter: Callable[[Mapping[str, Any]], Tuple[Any, ...]] = lambda item: (item[field],)
+		else:
+			self.getter = itemgetter(*self.fields)
+
+	def apply(self, item: Mapping[str, Any]) -> Dict[str, Any]:
+		try:
+			return dict(zip(self.fields, self.getter(item)))
+		except KeyError:
+			# Unified ccxt structures carry every key, anything else takes the slower tolerant path.
+			return {field: item.get(field) for field in self.fields}
+
+	def apply_all(self, items: Iterable[Mapping[str, Any]]) -> List[Dict[str, Any]]:
+		fields = self.fields
+		getter = self.getter
+		items = list(items)
+
+		try:
+			return [dict(zip(fields, getter(item))) for item in items]
+		except KeyError:
+			return [self.apply(item) for item in items]
+
+	def apply_values(self, items: Mapping[str, Mapping[str, Any]]) -> Dict[str, Dict[str, Any]]:
+		return dict(zip(items.keys(), self.apply_all(items.values())))
+
+
+@lru_cache(maxsize=256)
+def compile_projection(fields: Tuple[str, ...]) -> Projection:
+	return Projection(fields)
+
+
+def get_fields(entity: str, fields: str | Sequence[str] = None, default: str = "default") -> Tuple[str, ...]:
+	# Without an explicit choice every command keeps its own default set.
+	if fields is None or fields == "" or fields == "default":
+		fields = default
+
+	if not isinstance(fields, str):
+		return tuple(str(field) for field in fields)
+
+	if "," in fields:
+		return tuple(field.strip() for field in fields.split(",") if field.strip())
+
+	configured = properties.get_or_default(f"""projections.{entity}.{fields}""", None)
+	if configured:
+		return tuple(configured)
+
+	field_set = FIELD_SETS.get(entity, {}).get(fields)
+	if field_set is None:
+		raise ValueError(f"""Field set "{fields}" not found for "{entity}".""")
+
+	return field_set
+
+
+def get_projection(entity: str, fields: str | Sequence[str] = None, default: str = "default") -> Projection:
+	return compile_projection(get_fields(entity, fields, default))
+
+
+def project(entity: str, item: Mapping[str, Any], fields: str | Sequence[str] = None, default: str = "default") -> Dict[str, Any]:
+	return get_projection(entity, fields, default).apply(item)
+
+
+def project_all(entity: str, items: Iterable[Mapping[str, Any]], fields: str | Sequence[str] = None, default: str = "default") -> List[Dict[str, Any]]:
+	return get_projection(entity, fields, default).apply_all(items)
+
+
+def project_values(entity: str, items: Mapping[str, Mapping[str, Any]], fields: str | Sequence[str] = None, default: str = "default") -> Dict[str, Dict[str, Any]]:
+	return get_projection(entity, fields, default).apply_values(items)
@@ -2,6 +2,7 @@ import os
 
 import yaml
 from singleton.singleton import ThreadSafeSingleton
+from typing import Any, Dict
 
 from core.constants import constants
 from core.utils import deep_merge
@@ -12,6 +13,8 @@ from core.extensions import DotMap
 class Properties(object):
 	def __init__(self):
 		self.properties = DotMap({}, _dynamic=False)
+		self.flattened: Dict[str, Any] = {}
+		self.environment: Dict[str, Any] = {}
 
 	def load(self, app):
 		self.load_from_app(app)
@@ -19,6 +22,7 @@ class Properties(object):
 		self.load_from_configuration_files()
 		self.load_from_database()
 		self.load_from_environment_variables()
+		self.compile()
 		self.define_extra_properties()
 
 	def load_from_app(self, app):
@@ -58,6 +62,55 @@ class Properties(object):
 	def load_from_environment_variables(self):
 		pass
 
+	def compile(self):
+		self.flattened = {}
+		self.environment = {}
+		self.flatten("", self.properties)
+
+	def flatten(self, prefix: str, target: Dict[str, Any]):
+		for key, value in target.items():
+			if not isinstance(key, str):
+				continue
+
+			full_key = f"{prefix}{key}"
+			self.flattened[full_key] = value
+
+			if isinstance(value, dict):
+				self.flatten(f"{full_key}.", value)
+
+	def unflatten(self, prefix: str, target: Dict[str, Any]):
+		for key, value in target.items():
+			if not isinstance(key, str):
+				continue
+
+			full_key = f"{prefix}{key}"
+			self.flattened.pop(full_key, None)
+
+			if isinstance(value, dict):
+				self.unflatten(f"{full_key}.", value)
+
+	def refresh(self, key: str):
+		previous = self.flattened.get(key)
+		if isinstance(previous, dict):
+			self.unflatten(f"{key}.", previous)
+
+		keys = key.split(".")
+		last_key = keys.pop()
+
+		node = self.properties
+		prefix = ""
+		for current_key in keys:
+			node = node[current_key]
+			prefix = f"{prefix}{current_key}"
+			self.flattened[prefix] = node
+			prefix = f"{prefix}."
+
+		value = node[last_key]
+		self.flattened[key] = value
+
+		if isinstance(value, dict):
+			self.flatten(f"{key}.", value)
+
 	def get_or_default_as(self, key, type, default=None):
 		# TODO Finish implementation
 		raise NotImplemented()
@@ -80,18 +133,23 @@ class Properties(object):
 		# 	output = request_parameters.safe_deep_get(key)
 		# 	if output is not None: return output
 
-		output = self.properties.safe_deep_get(key)
+		output = self.flattened.get(key)
 		if output is not None: return output
 
-		modified_key = key.replace('.', '_')
-		output = os.environ.get(modified_key, None)
+		output = self.environment.get(key)
 		if output is not None: return output
 
-		modified_key = modified_key.upper()
+		modified_key = key.replace('.', '_')
 		output = os.environ.get(modified_key, None)
-		if output is not None: return output
 
-		if isinstance(output, DotMap): return default
+		if output is None:
+			output = os.environ.get(modified_key.upper(), None)
+
+		# Misses are not remembered, a variable exported later must still be found.
+		if output is not None:
+			self.environment[key] = output
+
+			return output
 
 		return default
 
@@ -102,6 +160,8 @@ class Properties(object):
 		finally:
 			self.properties._dynamic = False
 
+		self.refresh(key)
+
 	def define_extra_properties(self):
 		self.set("resources_path", os.path.join(self.get("root_path"), "resources"))
 		self.set("resources_configuration_path", os.path.join(self.get("resources_path"), "configuration"))
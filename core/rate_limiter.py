@@ -0,0 +1,141 @@
+import asyncio
+import time
+from singleton.singleton import ThreadSafeSingleton
+from threading import Lock
+from typing import Any, Dict, Optional, Tuple
+
+from ccxt.async_support import Exchange as WebSocketExchange
+from core.properties import properties
+
+
+class TokenBucket(object):
+	def __init__(self, rate: float, capacity: float):
+		self.lock = Lock()
+		self.rate = rate
+		self.capacity = capacity
+		self.tokens = capacity
+		self.updated_at = time.monotonic()
+		self.waits = 0
+		self.waited = 0.0
+
+	def reserve(self, cost: float) -> float:
+		with self.lock:
+			now = time.monotonic()
+			self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+			self.updated_at = now
+			self.tokens -= cost
+
+			if self.tokens >= 0:
+				return 0.0
+
+			return -self.tokens / self.rate
+
+	def record(self, wait: float):
+		with self.lock:
+			self.waits += 1
+			self.waited += wait
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"rate": self.rate,
+			"capacity": self.capacity,
+			"waits": self.waits,
+			"waited": self.waited,
+		}
+
+
+@ThreadSafeSingleton
+class RateLimiter(object):
+	def __init__(self):
+		self.lock = Lock()
+		self.buckets: Dict[Tuple[str, ...], TokenBucket] = {}
+
+	def get_bucket(self, key: Tuple[str, ...], rate: float, capacity: float) -> TokenBucket:
+		bucket = self.buckets.get(key)
+
+		if bucket is None:
+			with self.lock:
+				bucket = self.buckets.setdefault(key, TokenBucket(rate, capacity))
+
+		return bucket
+
+	# noinspection PyMethodMayBeStatic
+	def get_limit(self, exchange_id: str, kind: str, name: str, default: float) -> float:
+		return float(properties.get_or_default(f"""rate_limiter.exchanges.{exchange_id}.{kind}.{name}""", default))
+
+	def get_buckets(self, exchange, exchange_id: str, exchange_environment: str, api_key: Optional[str]) -> list[TokenBucket]:
+		# ccxt expresses its limit as milliseconds between two requests of cost 1.
+		default_rate = 1000 / float(getattr(exchange, "rateLimit", None) or 1000)
+
+		buckets = [
+			self.get_bucket(
+				("ip", exchange_id, exchange_environment),
+				self.get_limit(exchange_id, "ip", "rate", default_rate),
+				self.get_limit(exchange_id, "ip", "capacity", default_rate)
+			)
+		]
+
+		if api_key:
+			buckets.append(self.get_bucket(
+				("key", exchange_id, exchange_environment, api_key),
+				self.get_limit(exchange_id, "key", "rate", default_rate),
+				self.get_limit(exchange_id, "key", "capacity", default_rate)
+			))
+
+		return buckets
+
+	# noinspection PyMethodMayBeStatic
+	def reserve(self, buckets: list[TokenBucket], cost: float) -> Tuple[float, list[TokenBucket]]:
+		waits = [(bucket.reserve(cost), bucket) for bucket in buckets]
+		wait = max(item[0] for item in waits)
+
+		return wait, [item[1] for item in waits if item[0] > 0]
+
+	def bind(self, exchange, exchange_id: str, exchange_environment: str, api_key: Optional[str] = None):
+		buckets = self.get_buckets(exchange, exchange_id, exchange_environment, api_key)
+		costs = properties.get_or_default(f"""rate_limiter.costs.{exchange_id}""", {})
+		calculate_rate_limiter_cost = exchange.calculate_rate_limiter_cost
+
+		def calculate_cost(api, method, path, params, config={}):
+			cost = costs.get(path) if costs else None
+
+			if cost is None:
+				return calculate_rate_limiter_cost(api, method, path, params, config)
+
+			return cost
+
+		if isinstance(exchange, WebSocketExchange):
+			async def throttle(cost=None):
+				wait, delayed = self.reserve(buckets, float(cost or 1))
+
+				if wait > 0:
+					for bucket in delayed:
+						bucket.record(wait)
+
+					await asyncio.sleep(wait)
+		else:
+			def throttle(cost=None):
+				wait, delayed = self.reserve(buckets, float(cost or 1))
+
+				if wait > 0:
+					for bucket in delayed:
+						bucket.record(wait)
+
+					time.sleep(wait)
+
+		exchange.enableRateLimit = True
+		exchange.throttle = throttle
+		exchange.calculate_rate_limiter_cost = calculate_cost
+
+	def summary(self) -> Dict[str, Any]:
+		output = {}
+
+		for key, bucket in list(self.buckets.items()):
+			# API keys are never reported, only the bucket kind, exchange and environment.
+			name = "|".join(key[:3]) if key[0] == "ip" else f"""key|{key[1]}|{key[2]}|{key[3][:4]}***"""
+			output[name] = bucket.summary()
+
+		return output
+
+
+rate_limiter = RateLimiter.instance()
@@ -0,0 +1,264 @@
+import asyncio
+import logging
+import sys
+import time
+import traceback
+from contextlib import contextmanager
+from functools import partial
+from singleton.singleton import ThreadSafeSingleton
+from threading import Lock, RLock
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from core.properties import properties
+from core.types import Protocol
+
+ExchangeKey = Tuple[str, str, str, str]
+
+
+def estimate_size(target: Any, depth: int = 4, seen: Set[int] = None) -> int:
+	if seen is None:
+		seen = set()
+
+	if id(target) in seen:
+		return 0
+
+	seen.add(id(target))
+
+	size = sys.getsizeof(target)
+
+	if depth <= 0:
+		return size
+
+	if isinstance(target, dict):
+		for key, value in target.items():
+			size += estimate_size(key, depth - 1, seen) + estimate_size(value, depth - 1, seen)
+	elif isinstance(target, (list, tuple, set)):
+		for item in target:
+			size += estimate_size(item, depth - 1, seen)
+	elif hasattr(target, "__dict__"):
+		size += estimate_size(vars(target), depth - 1, seen)
+
+	return size
+
+
+class_sizes: Dict[type, int] = {}
+
+
+def estimate_class_size(instance: Any) -> int:
+	# Instances of one exchange class share their layout, so the walk only runs for the first one.
+	size = class_sizes.get(type(instance))
+
+	if size is None:
+		size = class_sizes.setdefault(type(instance), estimate_size(instance))
+
+	return size
+
+
+class ExchangeEntry(object):
+	def __init__(self, key: ExchangeKey, factory: Callable[[], Any]):
+		self.key = key
+		self.factory = factory
+		self.lock = Lock()
+		self.instance = None
+		self.size = 0
+		self.references = 0
+		self.last_used = time.monotonic()
+
+	def materialize(self) -> Any:
+		self.last_used = time.monotonic()
+
+		if self.instance is None:
+			with self.lock:
+				if self.instance is None:
+					instance = self.factory()
+					self.size = estimate_class_size(instance)
+					self.instance = instance
+
+		return self.instance
+
+
+@ThreadSafeSingleton
+class ExchangeRegistry(object):
+	def __init__(self):
+		self.lock = RLock()
+		self.entries: Dict[ExchangeKey, ExchangeEntry] = {}
+		self.instances: Dict[int, ExchangeEntry] = {}
+		self.credentials: Dict[Tuple[str, str, str], Any] = {}
+		self.user_keys: Dict[str, Set[ExchangeKey]] = {}
+		self.last_used: Dict[str, float] = {}
+		self.last_sweep = time.monotonic()
+		self.eviction_listeners: List[Callable[[str], None]] = []
+		self.closing: Set[asyncio.Task] = set()
+
+	def add_eviction_listener(self, listener: Callable[[str], None]):
+		self.eviction_listeners.append(listener)
+
+	def register(self, user_id: str, exchange_id: str, exchange_environment: str, credentials: Any, factory: Callable[[str], Any]):
+		previous_entries = []
+
+		with self.lock:
+			self.credentials[(user_id, exchange_id, exchange_environment)] = credentials
+
+			for protocol in [Protocol.REST.value, Protocol.WebSocket.value]:
+				key = (user_id, exchange_id, exchange_environment, protocol)
+
+				previous = self.entries.get(key)
+				if previous is not None:
+					previous_entries.append(previous)
+
+				self.entries[key] = ExchangeEntry(key, partial(factory, protocol))
+				self.user_keys.setdefault(user_id, set()).add(key)
+
+			self.last_used[user_id] = time.monotonic()
+
+		for previous in previous_entries:
+			self.dematerialize(previous)
+
+		self.sweep()
+
+	def get(self, user_id: str, exchange_id: str, exchange_environment: str, exchange_protocol: str) -> Optional[Any]:
+		entry = self.entries.get((user_id, exchange_id, exchange_environment, exchange_protocol))
+
+		if entry is None:
+			return None
+
+		instance = entry.materialize()
+		self.instances[id(instance)] = entry
+		self.last_used[user_id] = time.monotonic()
+		self.sweep()
+
+		return instance
+
+	async def materialize(self, user_id: str, exchange_id: str, exchange_environment: str, exchange_protocol: str) -> Optional[Any]:
+		entry = self.entries.get((user_id, exchange_id, exchange_environment, exchange_protocol))
+
+		if entry is not None and entry.instance is None:
+			# Building a client loads its markets synchronously, so it runs on an executor thread instead of the event loop.
+			await asyncio.get_running_loop().run_in_executor(None, entry.materialize)
+
+		return self.get(user_id, exchange_id, exchange_environment, exchange_protocol)
+
+	def peek(self, user_id: str, exchange_id: str, exchange_environment: str, exchange_protocol: str) -> Optional[Any]:
+		# Only returns an instance that already exists, nothing is created, touched or swept.
+		entry = self.entries.get((user_id, exchange_id, exchange_environment, exchange_protocol))
+
+		return entry.instance if entry is not None else None
+
+	@contextmanager
+	def lease(self, instance: Any):
+		entry = self.instances.get(id(instance))
+
+		if entry is None or entry.instance is not instance:
+			yield instance
+
+			return
+
+		with entry.lock:
+			entry.references += 1
+
+		try:
+			yield instance
+		finally:
+			with entry.lock:
+				entry.references -= 1
+				entry.last_used = time.monotonic()
+
+	def get_credentials(self, user_id: str, exchange_id: str, exchange_environment: str) -> Optional[Any]:
+		return self.credentials.get((user_id, exchange_id, exchange_environment))
+
+	def remove_user(self, user_id: str):
+		with self.lock:
+			keys = self.user_keys.pop(user_id, set())
+			self.last_used.pop(user_id, None)
+
+			for credentials_key in [item for item in self.credentials.keys() if item[0] == user_id]:
+				del self.credentials[credentials_key]
+
+			entries = [self.entries.pop(key) for key in keys if key in self.entries]
+
+		for entry in entries:
+			self.dematerialize(entry)
+
+	def dematerialize(self, entry: ExchangeEntry):
+		with entry.lock:
+			instance = entry.instance
+			entry.instance = None
+			entry.size = 0
+
+		if instance is not None:
+			self.instances.pop(id(instance), None)
+			self.close(instance)
+
+	def sweep(self):
+		now = time.monotonic()
+
+		if now - self.last_sweep < float(properties.get_or_default("registry.sweep_interval", 60)):
+			return
+
+		self.last_sweep = now
+
+		idle_timeout = float(properties.get_or_default("registry.idle_timeout", 86400))
+		idle_users = [user_id for user_id, last_used in list(self.last_used.items()) if now - last_used > idle_timeout]
+
+		for user_id in idle_users:
+			self.remove_user(user_id)
+
+			for listener in self.eviction_listeners:
+				listener(user_id)
+
+		instance_idle_timeout = float(properties.get_or_default("registry.instance_idle_timeout", 900))
+
+		for entry in list(self.entries.values()):
+			if entry.instance is not None and entry.references == 0 and now - entry.last_used > instance_idle_timeout:
+				self.dematerialize(entry)
+
+	def close(self, instance: Any):
+		close = getattr(instance, "close", None)
+
+		if not asyncio.iscoroutinefunction(close):
+			return
+
+		try:
+			loop = asyncio.get_running_loop()
+		except RuntimeError:
+			from core.logger import logger
+			logger.log(logging.WARNING, f"""Unable to close "{type(instance).__name__}" outside of an event loop.""")
+
+			return
+
+		# References are kept until the close finishes, otherwise the task could be collected before it runs.
+		task = loop.create_task(close())
+		self.closing.add(task)
+		task.add_done_callback(self.on_closed)
+
+	def on_closed(self, task: asyncio.Task):
+		self.closing.discard(task)
+
+		if not task.cancelled() and task.exception() is not None:
+			from core.logger import logger
+			logger.log(logging.WARNING, "".join(traceback.format_exception(task.exception())))
+
+	async def shutdown(self):
+		with self.lock:
+			entries = list(self.entries.values())
+
+		for entry in entries:
+			self.dematerialize(entry)
+
+		if self.closing:
+			await asyncio.gather(*list(self.closing), return_exceptions=True)
+
+	def summary(self) -> Dict[str, Any]:
+		entries = list(self.entries.values())
+		materialized = [entry for entry in entries if entry.instance is not None]
+
+		return {
+			"users": len(self.user_keys),
+			"exchanges": len(entries),
+			"materialized": len(materialized),
+			"leased": sum(1 for entry in materialized if entry.references > 0),
+			"bytes": sum(entry.size for entry in materialized),
+		}
+
+
+exchange_registry = ExchangeRegistry.instance()
@@ -0,0 +1,143 @@
+import heapq
+import time
+from collections import OrderedDict
+from dotmap import DotMap
+from singleton.singleton import ThreadSafeSingleton
+from threading import RLock
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from core.properties import properties
+
+
+@ThreadSafeSingleton
+class SessionRegistry(object):
+	def __init__(self):
+		self.lock = RLock()
+		self.users: Dict[str, DotMap[str, Any]] = {}
+		self.telegram_ids: Dict[str, str] = {}
+		self.tokens: Dict[str, Tuple[str, float]] = {}
+		self.user_telegram_ids: Dict[str, Set[str]] = {}
+		self.user_tokens: Dict[str, Set[str]] = {}
+		self.expirations: List[Tuple[float, str]] = []
+
+	def register(self, user_id: str, user: DotMap[str, Any], telegram_id: str | int = None, token: str = None, expiration: float = None):
+		with self.lock:
+			self.users[user_id] = user
+
+			if telegram_id is not None:
+				self.telegram_ids[str(telegram_id)] = user_id
+				self.user_telegram_ids.setdefault(user_id, set()).add(str(telegram_id))
+
+			if token:
+				self.register_token(token, user_id, expiration)
+
+	def register_token(self, token: str, user_id: str, expiration: float = None):
+		with self.lock:
+			self.evict_expired_tokens()
+
+			expiration = expiration if expiration is not None else float("inf")
+
+			self.tokens[token] = (user_id, expiration)
+			self.user_tokens.setdefault(user_id, set()).add(token)
+			heapq.heappush(self.expirations, (expiration, token))
+
+	def unregister(self, user_id: str):
+		with self.lock:
+			self.users.pop(user_id, None)
+
+			for telegram_id in self.user_telegram_ids.pop(user_id, set()):
+				self.telegram_ids.pop(telegram_id, None)
+
+			for token in self.user_tokens.pop(user_id, set()):
+				self.tokens.pop(token, None)
+
+	def unregister_token(self, token: str):
+		with self.lock:
+			entry = self.tokens.pop(token, None)
+
+			if entry:
+				self.user_tokens.get(entry[0], set()).discard(token)
+
+	def evict_expired_tokens(self):
+		now = time.time()
+
+		with self.lock:
+			while self.expirations and self.expirations[0][0] <= now:
+				expiration, token = heapq.heappop(self.expirations)
+
+				entry = self.tokens.get(token)
+				if entry and entry[1] == expiration:
+					self.unregister_token(token)
+
+	def get_user_id(self, id_or_user_telegram_id_or_jwt_token: str | int) -> Optional[str]:
+		key = str(id_or_user_telegram_id_or_jwt_token)
+
+		if key in self.users:
+			return key
+
+		user_id = self.telegram_ids.get(key)
+		if user_id is not None:
+			return user_id
+
+		entry = self.tokens.get(key)
+		if entry is not None:
+			if entry[1] > time.time():
+				return entry[0]
+
+			self.evict_expired_tokens()
+
+		return None
+
+	def get(self, id_or_user_telegram_id_or_jwt_token: str | int) -> Optional[DotMap[str, Any]]:
+		user_id = self.get_user_id(id_or_user_telegram_id_or_jwt_token)
+
+		if user_id is None:
+			return None
+
+		return self.users.get(user_id)
+
+
+@ThreadSafeSingleton
+class TokenCache(object):
+	def __init__(self):
+		self.lock = RLock()
+		self.entries: OrderedDict[str, Tuple[str, float]] = OrderedDict()
+
+	def get(self, token: str) -> Optional[Tuple[str, float]]:
+		with self.lock:
+			entry = self.entries.get(token)
+
+			if entry is None:
+				return None
+
+			if entry[1] <= time.time():
+				del self.entries[token]
+
+				return None
+
+			self.entries.move_to_end(token)
+
+			return entry
+
+	def get_subject(self, token: str) -> Optional[str]:
+		entry = self.get(token)
+
+		return entry[0] if entry else None
+
+	def put(self, token: str, subject: str, expiration: float):
+		size = int(properties.get_or_default("server.authentication.jwt.cache.size", 10000))
+
+		with self.lock:
+			self.entries[token] = (subject, expiration)
+			self.entries.move_to_end(token)
+
+			while len(self.entries) > size:
+				self.entries.popitem(last=False)
+
+	def invalidate(self, token: str):
+		with self.lock:
+			self.entries.pop(token, None)
+
+
+sessions = SessionRegistry.instance()
+token_cache = TokenCache.instance()
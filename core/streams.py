@@ -0,0 +1,238 @@
+import asyncio
+import json
+import logging
+import traceback
+from singleton.singleton import ThreadSafeSingleton
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+# noinspection PyUnresolvedReferences
+import ccxt.pro as pro_ccxt
+from core.constants import constants
+from core.markets import market_cache
+from core.properties import properties
+from core.rate_limiter import rate_limiter
+from core.types import StreamChannel
+
+StreamKey = Tuple[str, str, str, StreamChannel]
+
+
+class Subscription(object):
+	def __init__(self, key: StreamKey):
+		self.key = key
+		self.subscribers: Set[asyncio.Queue] = set()
+		self.listeners: Set[Callable[[Optional[Any]], None]] = set()
+		self.task: Optional[asyncio.Task] = None
+		self.last_message: Optional[str] = None
+		self.published = 0
+
+
+@ThreadSafeSingleton
+class StreamHub(object):
+	def __init__(self):
+		self.exchanges: Dict[Tuple[str, str], Any] = {}
+		self.subscriptions: Dict[StreamKey, Subscription] = {}
+		self.dropped = 0
+
+	# noinspection PyMethodMayBeStatic
+	def create_outbox(self) -> asyncio.Queue:
+		return asyncio.Queue(maxsize=int(properties.get_or_default("streams.outbox.size", 100)))
+
+	async def get_exchange(self, exchange_id: str, exchange_environment: str):
+		key = (exchange_id, exchange_environment)
+
+		exchange = self.exchanges.get(key)
+
+		if exchange is None:
+			exchange = getattr(pro_ccxt, exchange_id)({
+				"options": {
+					"environment": exchange_environment,
+				}
+			})
+
+			if exchange_environment != constants.environments.production:
+				exchange.set_sandbox_mode(True)
+
+			# Market loading is synchronous and may hit the network the first time.
+			await asyncio.get_running_loop().run_in_executor(None, market_cache.apply, exchange, exchange_id, exchange_environment)
+			rate_limiter.bind(exchange, exchange_id, exchange_environment)
+
+			exchange = self.exchanges.setdefault(key, exchange)
+
+		return exchange
+
+	def get_subscription(self, key: StreamKey) -> Subscription:
+		if key[0] not in pro_ccxt.exchanges:
+			raise ValueError(f"""Exchange "{key[0]}" does not support streaming.""")
+
+		if not key[2]:
+			raise ValueError("A symbol is required to subscribe.")
+
+		subscription = self.subscriptions.get(key)
+
+		if subscription is None:
+			subscription = Subscription(key)
+			subscription.task = asyncio.get_running_loop().create_task(self.watch(subscription))
+			self.subscriptions[key] = subscription
+
+		return subscription
+
+	def subscribe(self, key: StreamKey, outbox: asyncio.Queue):
+		subscription = self.get_subscription(key)
+		subscription.subscribers.add(outbox)
+
+		if subscription.last_message is not None:
+			self.deliver(outbox, subscription.last_message)
+
+	def unsubscribe(self, key: StreamKey, outbox: asyncio.Queue):
+		subscription = self.subscriptions.get(key)
+
+		if subscription is None:
+			return
+
+		subscription.subscribers.discard(outbox)
+		self.discard_if_idle(subscription)
+
+	# In-process listeners receive the raw ccxt payloads, or None when the stream is interrupted.
+	def listen(self, key: StreamKey, listener: Callable[[Optional[Any]], None]):
+		self.get_subscription(key).listeners.add(listener)
+
+	def unlisten(self, key: StreamKey, listener: Callable[[Optional[Any]], None]):
+		subscription = self.subscriptions.get(key)
+
+		if subscription is None:
+			return
+
+		subscription.listeners.discard(listener)
+		self.discard_if_idle(subscription)
+
+	def discard_if_idle(self, subscription: Subscription):
+		if subscription.subscribers or subscription.listeners:
+			return
+
+		if self.subscriptions.get(subscription.key) is subscription:
+			del self.subscriptions[subscription.key]
+
+		subscription.task.cancel()
+
+	async def watch(self, subscription: Subscription):
+		exchange_id, exchange_environment, symbol, channel = subscription.key
+
+		retry_delay = float(properties.get_or_default("streams.retry.delay", 1))
+		retry_max_delay = float(properties.get_or_default("streams.retry.max_delay", 30))
+		delay = retry_delay
+
+		exchange = None
+
+		try:
+			while True:
+				# noinspection PyBroadException
+				try:
+					exchange = exchange or await self.get_exchange(exchange_id, exchange_environment)
+					data = await getattr(exchange, channel.method)(symbol)
+					delay = retry_delay
+				except asyncio.CancelledError:
+					raise
+				except Exception:
+					from core.logger import logger
+					logger.log(logging.WARNING, traceback.format_exc())
+
+					self.notify(subscription, None)
+
+					await asyncio.sleep(delay)
+					delay = min(delay * 2, retry_max_delay)
+
+					continue
+
+				self.notify(subscription, data)
+
+				if subscription.subscribers:
+					self.publish(subscription, self.render(subscription.key, data))
+				else:
+					subscription.last_message = None
+		finally:
+			await self.release(exchange_id, exchange_environment, symbol, channel)
+
+	async def release(self, exchange_id: str, exchange_environment: str, symbol: str, channel: StreamChannel):
+		exchange = self.exchanges.get((exchange_id, exchange_environment))
+
+		if exchange is None:
+			return
+
+		# noinspection PyBroadException
+		try:
+			unwatch = getattr(exchange, f"""un_{channel.method}""", None)
+			if unwatch is not None:
+				await unwatch(symbol)
+
+			if not any(key[:2] == (exchange_id, exchange_environment) for key in self.subscriptions):
+				self.exchanges.pop((exchange_id, exchange_environment), None)
+				await exchange.close()
+		except Exception:
+			from core.logger import logger
+			logger.log(logging.DEBUG, traceback.format_exc())
+
+	# noinspection PyMethodMayBeStatic
+	def render(self, key: StreamKey, data: Any) -> str:
+		exchange_id, exchange_environment, symbol, channel = key
+
+		if channel == StreamChannel.ORDER_BOOK:
+			depth = int(properties.get_or_default("streams.order_book.depth", 25))
+
+			data = {
+				"symbol": data.get("symbol"),
+				"timestamp": data.get("timestamp"),
+				"nonce": data.get("nonce"),
+				"bids": [list(level[:2]) for level in data["bids"][:depth]],
+				"asks": [list(level[:2]) for level in data["asks"][:depth]],
+			}
+
+		# Serialized once per upstream update, however many clients receive it.
+		return json.dumps({
+			"exchangeId": exchange_id,
+			"environment": exchange_environment,
+			"symbol": symbol,
+			"channel": channel.id,
+			"data": data,
+		}, default=str)
+
+	# noinspection PyMethodMayBeStatic
+	def notify(self, subscription: Subscription, data: Optional[Any]):
+		for listener in list(subscription.listeners):
+			# noinspection PyBroadException
+			try:
+				listener(data)
+			except Exception:
+				from core.logger import logger
+				logger.log(logging.WARNING, traceback.format_exc())
+
+	def publish(self, subscription: Subscription, message: str):
+		# Trades are incremental, replaying the last batch to a new subscriber would duplicate them.
+		if subscription.key[3] != StreamChannel.TRADES:
+			subscription.last_message = message
+
+		subscription.published += 1
+
+		for outbox in list(subscription.subscribers):
+			self.deliver(outbox, message)
+
+	def deliver(self, outbox: asyncio.Queue, message: str):
+		# A slow client loses its oldest updates instead of holding back everybody else.
+		if outbox.full():
+			outbox.get_nowait()
+			self.dropped += 1
+
+		outbox.put_nowait(message)
+
+	def summary(self) -> Dict[str, Any]:
+		subscriptions = list(self.subscriptions.values())
+
+		return {
+			"exchanges": len(self.exchanges),
+			"subscriptions": len(subscriptions),
+			"subscribers": sum(len(subscription.subscribers) for subscription in subscriptions),
+			"published": sum(subscription.published for subscription in subscriptions),
+			"dropped": self.dropped,
+		}
+
+
+stream_hub = StreamHub.instance()
@@ -1,7 +1,7 @@
+import asyncio
 import codecs
 import json
 import os
-import requests
 import sys
 import textwrap
 from dotmap import DotMap
@@ -9,7 +9,7 @@ from singleton.singleton import ThreadSafeSingleton
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, CallbackQuery, BotCommand, WebAppInfo, \
 	KeyboardButton, ReplyKeyboardMarkup
 from telegram.ext import Application, CommandHandler, ContextTypes, CallbackQueryHandler, filters, MessageHandler
-from typing import Any
+from typing import Any, Iterable
 from typing import List
 
 # noinspection PyUnresolvedReferences
@@ -19,8 +19,10 @@ import ccxt.async_support as async_ccxt
 from core.constants import constants
 from core.decorators import handle_exceptions
 from core.helpers import get_user, get_user_exchange
-from core.model import model
+from core.model import model, TELEGRAM_MAX_MESSAGE_LENGTH
 from core.properties import properties
+from core.telegram_client import telegram_client
+from core.telegram_outbox import telegram_outbox
 from core.types import MagicMethod, Credentials, Protocol, Environment
 
 ccxt = sync_ccxt
@@ -46,6 +48,10 @@ administrators = properties.get_or_default("telegram.admin.users", [])
 administrators = [username.strip().replace("@", "") for username in administrators if username.strip()]
 TELEGRAM_ADMIN_USERNAMES = TELEGRAM_ADMIN_USERNAMES + administrators
 
+EXCHANGE_ID: str = properties.get_or_default("exchange.id", constants.default.exchange.id)
+EXCHANGE_ENVIRONMENT: str = properties.get_or_default("exchange.environment", Environment.PRODUCTION.value)
+EXCHANGE_WEB_APP_URL: str = properties.get_or_default("exchange.web_app.url", constants.default.exchange.web_app.url)
+
 
 @handle_exceptions
 @ThreadSafeSingleton
@@ -56,7 +62,7 @@ class Telegram(object):
 
 	# noinspection PyMethodMayBeStatic
 	async def initialize(self):
-		self.application = Application.builder().token(TELEGRAM_TOKEN).build()
+		self.application = Application.builder().token(TELEGRAM_TOKEN).post_init(self.post_init).build()
 
 		commands = [
 			BotCommand("start", "| Starts the bot"),
@@ -135,6 +141,12 @@ class Telegram(object):
 		self.application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, self.text_handler))
 		self.application.add_handler(MessageHandler(filters.COMMAND, self.handle_magic_command_input))
 
+	# noinspection PyMethodMayBeStatic,PyUnusedLocal
+	async def post_init(self, application: Application):
+		# Runs on the polling loop, the logger hands its alerts over to it from any other thread.
+		from core.logger import logger
+		logger.bind_loop(asyncio.get_running_loop())
+
 	def run(self):
 		if TELEGRAM_LISTEN_COMMANDS:
 			self.application.run_polling()
@@ -186,8 +198,8 @@ class Telegram(object):
 
 			# context.user_data["sign_in"] = {}
 			context.user_data["sign_in"] = {
-				"exchange_id": properties.get_or_default("exchange.id", constants.default.exchange.id),
-				"exchange_environment": properties.get_or_default("exchange.environment", Environment.PRODUCTION.value),
+				"exchange_id": EXCHANGE_ID,
+				"exchange_environment": EXCHANGE_ENVIRONMENT,
 			}
 			await self.send_message("Signing In", update, context, query)
 			await self.send_message("Enter your exchange API key. Ex.: a1aa22be-0aa0-b54a-80c1-fa9e111112c2", update, context, query)
@@ -257,7 +269,7 @@ class Telegram(object):
 					data["sign_in_step"] = "ask_exchange_environment"
 					await self.send_message("""Enter the exchange environment ("production", "staging", "development")""", update, context, query)
 				else:
-					await self.send_message(f"""Please enter a valid exchange id. Ex.: {properties.get_or_default("exchange.id")}""", update, context, query)
+					await self.send_message(f"""Please enter a valid exchange id. Ex.: {EXCHANGE_ID}""", update, context, query)
 			elif data["sign_in_step"] == "ask_exchange_environment":
 				await update.message.delete()
 				if self.model.validate_exchange_environment(text):
@@ -549,42 +561,26 @@ class Telegram(object):
 		if not await self.validate_request(update, context, magic_method.is_private):
 			return
 
-		command = magic_method.id
-		command = self.camel_to_snake(command)
+		command = magic_method.snake_id
 
-		exchange = self.get_user_exchange(update)
+		exchange = await self.get_user_exchange(update)
+
+		if exchange is None:
+			await self.send_message(constants.errors.sign_in_required, update, context, query)
+			return
 
 		method = getattr(self.model, command, None)
 
 		if not method:
-			await self.send_message(f"""Unrecognized command "{command}" for exchange {properties.get_or_default("exchange.id", constants.default.exchange.id).capitalize()}.""", update, context, query)
+			await self.send_message(f"""Unrecognized command "{command}" for exchange {EXCHANGE_ID.capitalize()}.""", update, context, query)
 			return
 
 		message = await method(exchange)(*positional_args, **named_args)
 
-		message = self.model.beautify(message)
+		message = self.model.render(message)
 
 		await self.send_message(message, update, context, query)
 
-	# noinspection PyMethodMayBeStatic
-	def camel_to_snake(self, target: str):
-		result = [target[0].lower()]
-		i = 1
-		while i < len(target):
-			if target[i].isupper():
-				if (i + 1 < len(target) and target[i + 1].isupper()) or (i + 1 == len(target)):
-					start = i
-					while i + 1 < len(target) and target[i + 1].isupper():
-						i += 1
-					result.append('_' + target[start:i+1].lower())
-				else:
-					result.append('_' + target[i].lower())
-			else:
-				result.append(target[i])
-			i += 1
-
-		return ''.join(result)
-
 	# noinspection PyMethodMayBeStatic
 	def parse_argument(self, arg):
 		try:
@@ -601,13 +597,13 @@ class Telegram(object):
 		return arg
 
 	# noinspection PyMethodMayBeStatic
-	def get_user_exchange(self, update: Update):
+	async def get_user_exchange(self, update: Update):
 		user_telegram_id = update.effective_user.id
-		exchange_id = properties.get_or_default("exchange.id")
-		exchange_environment = Environment.get_by_id(properties.get_or_default(f"exchange.environment"))
+		exchange_id = EXCHANGE_ID
+		exchange_environment = Environment.get_by_id(EXCHANGE_ENVIRONMENT)
 		exchange_protocol = Protocol.REST
 
-		exchange = get_user_exchange(user_telegram_id, exchange_id, exchange_environment, exchange_protocol)
+		exchange = await get_user_exchange(user_telegram_id, exchange_id, exchange_environment, exchange_protocol)
 
 		return exchange
 
@@ -617,8 +613,8 @@ class Telegram(object):
 
 		command_buttons = [
 			[KeyboardButton(
-				text=f"""{properties.get_or_default("exchange.id", constants.default.exchange.id).capitalize()} App""",
-				web_app=WebAppInfo(url=properties.get_or_default("exchange.web_app.url", constants.default.exchange.web_app.url))
+				text=f"""{EXCHANGE_ID.capitalize()} App""",
+				web_app=WebAppInfo(url=EXCHANGE_WEB_APP_URL)
 			)],
 			[InlineKeyboardButton("Sign In", callback_data="sign_in")],
 			[InlineKeyboardButton("Sign Out", callback_data="sign_out")],
@@ -635,8 +631,8 @@ class Telegram(object):
 
 		web_app_keyboard = [
 			[KeyboardButton(
-				text=f"""{properties.get_or_default("exchange.id", constants.default.exchange.id).capitalize()} App""",
-				web_app=WebAppInfo(url=properties.get_or_default("exchange.web_app.url", constants.default.exchange.web_app.url))
+				text=f"""{EXCHANGE_ID.capitalize()} App""",
+				web_app=WebAppInfo(url=EXCHANGE_WEB_APP_URL)
 			)]
 		]
 		reply_keyboard_markup = ReplyKeyboardMarkup(web_app_keyboard, resize_keyboard=True)
@@ -644,7 +640,7 @@ class Telegram(object):
 		await self.send_message(
 			textwrap.dedent(
 				f"""
-					*🤖 Welcome to {properties.get_or_default("exchange.id", constants.default.exchange.id).capitalize()} Trading Bot! 📈*
+					*🤖 Welcome to {EXCHANGE_ID.capitalize()} Trading Bot! 📈*
 					
 					*Available commands:*
 					
@@ -689,7 +685,7 @@ class Telegram(object):
 		await self.send_message(
 			textwrap.dedent(
 				f"""
-					*🤖 Welcome to {str(properties.get_or_default("exchange.id", constants.default.exchange.id).capitalize()).upper()} Trading Bot! 📈*
+					*🤖 Welcome to {str(EXCHANGE_ID.capitalize()).upper()} Trading Bot! 📈*
 					
 					Here are the available commands:
 					
@@ -767,8 +763,8 @@ class Telegram(object):
 				return
 
 			if len(context.args) == 3:
-				exchange_id = properties.get_or_default("exchange.id", constants.default.exchange.id)
-				exchange_environment = properties.get_or_default("exchange.environment", Environment.PRODUCTION.value)
+				exchange_id = EXCHANGE_ID
+				exchange_environment = EXCHANGE_ENVIRONMENT
 				exchange_api_key = (context.args[0:1] or [None])[0]
 				exchange_api_secret = (context.args[1:2] or [None])[0]
 				exchange_options_sub_account_id = (context.args[2:3] or [None])[0]
@@ -806,7 +802,7 @@ class Telegram(object):
 		if self.model.validate_exchange_id(exchange_id):
 			exchange_id = self.model.sanitize_exchange_id(exchange_id)
 		else:
-			await self.send_message(f"""Please enter a valid exchange ID. Ex.: {properties.get_or_default("exchange.id", constants.default.exchange.id)}""", update, context, query)
+			await self.send_message(f"""Please enter a valid exchange ID. Ex.: {EXCHANGE_ID}""", update, context, query)
 			return
 
 		if self.model.validate_exchange_environment(exchange_environment):
@@ -885,7 +881,7 @@ class Telegram(object):
 			token_id = None
 
 		if self.model.validate_token_id(token_id):
-			exchange = self.get_user_exchange(update)
+			exchange = await self.get_user_exchange(update)
 			token_id = self.model.sanitize_token_id(token_id)
 			message = await self.model.get_balance(exchange, token_id)
 
@@ -898,7 +894,7 @@ class Telegram(object):
 		if not await self.validate_request(update, context, True):
 			return
 
-		exchange = self.get_user_exchange(update)
+		exchange = await self.get_user_exchange(update)
 		message = await self.model.get_balances(exchange)
 
 		message = self.model.beautify(message)
@@ -916,7 +912,7 @@ class Telegram(object):
 			market_id = None
 
 		if self.model.validate_market_id(market_id):
-			exchange = self.get_user_exchange(update)
+			exchange = await self.get_user_exchange(update)
 			market_id = self.model.sanitize_market_id(market_id)
 			message = await self.model.get_open_orders(exchange, market_id)
 
@@ -951,7 +947,7 @@ class Telegram(object):
 			await self.send_message("Please enter a valid amount. Ex.: 123.4567", update, context, query)
 			return
 
-		exchange = self.get_user_exchange(update)
+		exchange = await self.get_user_exchange(update)
 		message = await self.model.market_buy_order(exchange, market_id, amount)
 
 		message = self.model.beautify(message)
@@ -982,7 +978,7 @@ class Telegram(object):
 			await self.send_message("Please enter a valid amount. Ex.: 123.4567", update, context, query)
 			return
 
-		exchange = self.get_user_exchange(update)
+		exchange = await self.get_user_exchange(update)
 		message = await self.model.market_sell_order(exchange, market_id, amount)
 
 		message = self.model.beautify(message)
@@ -1022,7 +1018,7 @@ class Telegram(object):
 			await self.send_message("Please enter a valid price. Ex.: 123.4567", update, context, query)
 			return
 
-		exchange = self.get_user_exchange(update)
+		exchange = await self.get_user_exchange(update)
 		message = await self.model.limit_buy_order(exchange, market_id, amount, price)
 
 		message = self.model.beautify(message)
@@ -1062,7 +1058,7 @@ class Telegram(object):
 			await self.send_message("Please enter a valid price. Ex.: 123.4567", update, context, query)
 			return
 
-		exchange = self.get_user_exchange(update)
+		exchange = await self.get_user_exchange(update)
 		message = await self.model.limit_sell_order(exchange, market_id, amount, price)
 
 		message = self.model.beautify(message)
@@ -1121,7 +1117,7 @@ class Telegram(object):
 				await self.send_message("Please enter a valid price. Ex.: 123.4567", update, context, query)
 				return
 
-		exchange = self.get_user_exchange(update)
+		exchange = await self.get_user_exchange(update)
 		message = await self.model.place_order(exchange, market_id, order_type, order_side, amount, price)
 
 		message = self.model.beautify(message)
@@ -1130,9 +1126,8 @@ class Telegram(object):
 		await self.send_message(message, update, context, query)
 
 	# noinspection PyMethodMayBeStatic,PyUnusedLocal
-	async def send_message(self, message: str, update: Update = None, context: ContextTypes.DEFAULT_TYPE = None, query: CallbackQuery = None, parse_mode: str = None, reply_markup = None):
-		formatted = message
-		max_length = 4096
+	async def send_message(self, message: str | Iterable[str], update: Update = None, context: ContextTypes.DEFAULT_TYPE = None, query: CallbackQuery = None, parse_mode: str = None, reply_markup = None):
+		max_length = TELEGRAM_MAX_MESSAGE_LENGTH
 
 		# noinspection PyUnusedLocal
 		def get_chat_id(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery):
@@ -1157,15 +1152,7 @@ class Telegram(object):
 				return await context.bot.send_message(get_chat_id(update, context, query), message, parse_mode=parse_mode, reply_markup=reply_markup)
 
 			async def fallback_send(message: str):
-				return requests.get(
-					url=f"https://api.telegram.org/bot{TELEGRAM_TOKEN}/sendMessage",
-					params={
-						"text": message,
-						"chat_id": get_chat_id(update, context, query),
-						"parse_mode": parse_mode,
-						"reply_markup": reply_markup,
-					}
-				)
+				return await telegram_client.send_message(TELEGRAM_TOKEN, get_chat_id(update, context, query), message, parse_mode, reply_markup)
 
 			if query and query.message:
 				return query_send
@@ -1176,15 +1163,32 @@ class Telegram(object):
 
 			return fallback_send
 
+		# noinspection PyUnresolvedReferences
+		def get_route(update: Update, context: ContextTypes.DEFAULT_TYPE, query: CallbackQuery):
+			if query and query.message:
+				return "query", query.message.chat_id, query.message.message_id
+			elif update and update.message:
+				return "update", update.message.chat_id, update.message.message_id
+			elif context and context.bot:
+				return "context", get_chat_id(update, context, query)
+
+			return "fallback", get_chat_id(update, context, query)
+
 		reply_method = get_reply_method(update, context, query, parse_mode, reply_markup)
 
-		if len(formatted) <= max_length:
-			await reply_method(formatted)
-		else:
-			for start in range(0, len(formatted), max_length):
-				message_part = formatted[start:start + max_length]
+		if isinstance(message, str) and len(message) > max_length:
+			message = self.model.pack_lines(message.splitlines(keepends=True), max_length)
+
+		if telegram_outbox.is_enabled():
+			# The handler returns right away, the chat worker paces the delivery.
+			chat_id = query.message.chat_id if query and query.message else get_chat_id(update, context, query)
+			telegram_outbox.enqueue(chat_id, message, reply_method, parse_mode, {"reply_markup": reply_markup}, get_route(update, context, query))
+
+			return
 
-				await reply_method(message_part)
+		# Chunks are produced lazily and already end on line boundaries.
+		for message_part in [message] if isinstance(message, str) else message:
+			await reply_method(message_part)
 
 
 telegram = Telegram.instance()
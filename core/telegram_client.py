@@ -0,0 +1,94 @@
+import asyncio
+import httpx
+from singleton.singleton import ThreadSafeSingleton
+from typing import Any, Dict, Optional
+
+from telegram.error import NetworkError, RetryAfter, TelegramError, TimedOut
+
+from core.properties import properties
+
+
+@ThreadSafeSingleton
+class TelegramClient(object):
+	def __init__(self):
+		self.clients: Dict[int, httpx.AsyncClient] = {}
+		self.semaphores: Dict[int, asyncio.Semaphore] = {}
+		self.requests = 0
+		self.errors = 0
+
+	def get_client(self) -> httpx.AsyncClient:
+		# Pooled connections belong to the loop that opened them, every loop gets its own client.
+		key = id(asyncio.get_running_loop())
+
+		client = self.clients.get(key)
+		if client is None:
+			connections = int(properties.get_or_default("telegram.api.connections", 10))
+			timeout = float(properties.get_or_default("telegram.api.timeout", 10))
+
+			client = self.clients[key] = httpx.AsyncClient(
+				base_url=properties.get_or_default("telegram.api.url", "https://api.telegram.org"),
+				limits=httpx.Limits(max_connections=connections, max_keepalive_connections=connections),
+				timeout=httpx.Timeout(timeout),
+			)
+			self.semaphores[key] = asyncio.Semaphore(int(properties.get_or_default("telegram.api.concurrency", connections)))
+
+		return client
+
+	async def call(self, token: str, method: str, parameters: Dict[str, Any]) -> Any:
+		client = self.get_client()
+		semaphore = self.semaphores[id(asyncio.get_running_loop())]
+		payload = {key: value for key, value in parameters.items() if value is not None}
+
+		try:
+			async with semaphore:
+				self.requests += 1
+				response = await client.post(f"""/bot{token}/{method}""", json=payload)
+
+			body = response.json()
+		except httpx.TimeoutException:
+			self.errors += 1
+			raise TimedOut()
+		except (httpx.HTTPError, ValueError) as exception:
+			self.errors += 1
+			raise NetworkError(f"""Telegram API call "{method}" failed: {exception}""")
+
+		if body.get("ok"):
+			return body.get("result")
+
+		self.errors += 1
+		retry_after = (body.get("parameters") or {}).get("retry_after")
+
+		# Surfaced like the PTB errors so the outbox handles flood waits the same way for both paths.
+		if retry_after is not None:
+			raise RetryAfter(int(retry_after))
+
+		raise TelegramError(body.get("description") or f"""Telegram API call "{method}" failed with status {response.status_code}.""")
+
+	async def send_message(self, token: str, chat_id: Any, text: str, parse_mode: Optional[str] = None, reply_markup: Any = None) -> Any:
+		if reply_markup is not None and hasattr(reply_markup, "to_dict"):
+			reply_markup = reply_markup.to_dict()
+
+		return await self.call(token, "sendMessage", {
+			"chat_id": chat_id,
+			"text": text,
+			"parse_mode": parse_mode,
+			"reply_markup": reply_markup,
+		})
+
+	async def close(self):
+		key = id(asyncio.get_running_loop())
+		client = self.clients.pop(key, None)
+		self.semaphores.pop(key, None)
+
+		if client is not None:
+			await client.aclose()
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"clients": len(self.clients),
+			"requests": self.requests,
+			"errors": self.errors,
+		}
+
+
+telegram_client = TelegramClient.instance()
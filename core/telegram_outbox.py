@@ -0,0 +1,181 @@
+import asyncio
+import datetime
+import logging
+import time
+import traceback
+from singleton.singleton import ThreadSafeSingleton
+from typing import Any, Awaitable, Callable, Dict, Iterable, Optional, Tuple
+
+from telegram.error import RetryAfter
+
+from core.properties import properties
+from core.rate_limiter import TokenBucket
+
+ChatKey = Tuple[int, Any]
+RouteKey = Tuple[Any, ...]
+
+
+class OutboundMessage(object):
+	def __init__(self, text: str | Iterable[str], send: Callable[[str], Awaitable[Any]], parse_mode: Optional[str] = None, options: Optional[Dict[str, Any]] = None, route: Optional[RouteKey] = None):
+		# A long result is queued as one entry and its chunks are only rendered when the worker reaches them.
+		self.text = text
+		self.send = send
+		self.parse_mode = parse_mode
+		self.options = options or {}
+		# Identifies where send delivers, every call builds a new send for the same destination.
+		self.route = route
+		self.mergeable = isinstance(text, str)
+
+	def can_merge(self, other: "OutboundMessage") -> bool:
+		if not self.mergeable or not other.mergeable:
+			return False
+
+		if self.send is not other.send and (self.route is None or self.route != other.route):
+			return False
+
+		return self.parse_mode == other.parse_mode and self.options == other.options
+
+
+@ThreadSafeSingleton
+class TelegramOutbox(object):
+	def __init__(self):
+		self.queues: Dict[ChatKey, asyncio.Queue] = {}
+		self.workers: Dict[ChatKey, asyncio.Task] = {}
+		global_rate = float(properties.get_or_default("telegram.outbox.global_rate", 30))
+		self.global_bucket = TokenBucket(global_rate, global_rate)
+		self.sent = 0
+		self.merged = 0
+		self.retried = 0
+		self.dropped = 0
+		self.failed = 0
+
+	# noinspection PyMethodMayBeStatic
+	def is_enabled(self) -> bool:
+		return bool(properties.get_or_default("telegram.outbox.enabled", True))
+
+	def enqueue(self, chat_id: Any, text: str | Iterable[str], send: Callable[[str], Awaitable[Any]], parse_mode: Optional[str] = None, options: Optional[Dict[str, Any]] = None, route: Optional[RouteKey] = None):
+		# Queues and workers are bound to the loop of the handler that enqueued the message.
+		key = (id(asyncio.get_running_loop()), chat_id)
+
+		queue = self.queues.get(key)
+		if queue is None:
+			queue = self.queues[key] = asyncio.Queue(int(properties.get_or_default("telegram.outbox.size", 1000)))
+
+		# A flooded chat loses its oldest messages instead of growing without bound.
+		if queue.full():
+			queue.get_nowait()
+			self.dropped += 1
+
+		queue.put_nowait(OutboundMessage(text, send, parse_mode, options, route))
+
+		worker = self.workers.get(key)
+		if worker is None or worker.done():
+			self.workers[key] = asyncio.create_task(self.work(key, queue))
+
+	def merge(self, message: OutboundMessage, queue: asyncio.Queue) -> OutboundMessage:
+		if not message.mergeable:
+			return message
+
+		max_length = int(properties.get_or_default("telegram.outbox.max_length", 4096))
+		texts = [message.text]
+		size = len(message.text)
+
+		# Only the head of the queue is merged, so messages are never reordered.
+		while not queue.empty():
+			# noinspection PyProtectedMember,PyUnresolvedReferences
+			following: OutboundMessage = queue._queue[0]
+
+			if not message.can_merge(following) or size + 1 + len(following.text) > max_length:
+				break
+
+			queue.get_nowait()
+			texts.append(following.text)
+			size += 1 + len(following.text)
+			self.merged += 1
+
+		if len(texts) == 1:
+			return message
+
+		return OutboundMessage("\n".join(texts), message.send, message.parse_mode, message.options, message.route)
+
+	async def work(self, key: ChatKey, queue: asyncio.Queue):
+		chat_interval = float(properties.get_or_default("telegram.outbox.chat_interval", 1))
+		idle_timeout = float(properties.get_or_default("telegram.outbox.idle_timeout", 60))
+		sent_at = float("-inf")
+
+		try:
+			while True:
+				try:
+					message = await asyncio.wait_for(queue.get(), idle_timeout)
+				except asyncio.TimeoutError:
+					return
+
+				message = self.merge(message, queue)
+
+				for text in [message.text] if isinstance(message.text, str) else message.text:
+					delay = sent_at + chat_interval - time.monotonic()
+					if delay > 0:
+						await asyncio.sleep(delay)
+
+					await self.deliver(message.send, text)
+					sent_at = time.monotonic()
+		finally:
+			if self.workers.get(key) is asyncio.current_task():
+				del self.workers[key]
+
+				if queue.empty():
+					self.queues.pop(key, None)
+
+	async def deliver(self, send: Callable[[str], Awaitable[Any]], text: str):
+		retries = int(properties.get_or_default("telegram.outbox.retries", 3))
+
+		for attempt in range(retries + 1):
+			wait = self.global_bucket.reserve(1)
+			if wait > 0:
+				self.global_bucket.record(wait)
+				await asyncio.sleep(wait)
+
+			try:
+				await send(text)
+				self.sent += 1
+
+				return
+			except RetryAfter as exception:
+				if attempt < retries:
+					self.retried += 1
+					await asyncio.sleep(self.get_retry_after(exception))
+
+					continue
+
+				self.failed += 1
+				logging.error(traceback.format_exc())
+			except Exception:
+				self.failed += 1
+				# Logged without the application logger, it would route the failure back to Telegram.
+				logging.error(traceback.format_exc())
+
+			return
+
+	# noinspection PyMethodMayBeStatic
+	def get_retry_after(self, exception: RetryAfter) -> float:
+		retry_after = exception.retry_after
+
+		if isinstance(retry_after, datetime.timedelta):
+			return retry_after.total_seconds()
+
+		return float(retry_after)
+
+	def summary(self) -> Dict[str, Any]:
+		return {
+			"chats": len(self.workers),
+			"queued": sum(queue.qsize() for queue in self.queues.values()),
+			"sent": self.sent,
+			"merged": self.merged,
+			"retried": self.retried,
+			"dropped": self.dropped,
+			"failed": self.failed,
+			"global": self.global_bucket.summary(),
+		}
+
+
+telegram_outbox = TelegramOutbox.instance()
@@ -1,9 +1,10 @@
+import re
 from dataclasses import dataclass
 from dotmap import DotMap
 from enum import Enum
 from pydantic import BaseModel
 from starlette.status import *
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Mapping, Optional
 
 
 class Environment(Enum):
@@ -55,21 +56,21 @@ class MagicMethod(Enum):
 	DEPOSIT = ("deposit", True)
 	FETCH_BALANCE = ("fetchBalance", True)
 	FETCH_CLOSED_ORDERS = ("fetchClosedOrders", True)
-	FETCH_CURRENCIES = ("fetchCurrencies", True)
+	FETCH_CURRENCIES = ("fetchCurrencies", False)
 	FETCH_DEPOSIT_ADDRESSES = ("fetchDepositAddresses", True)
-	FETCH_MARKETS = ("fetchMarkets", True)
+	FETCH_MARKETS = ("fetchMarkets", False)
 	FETCH_MY_TRADES = ("fetchMyTrades", True)
-	FETCH_OHLCV = ("fetchOHLCV", True)
+	FETCH_OHLCV = ("fetchOHLCV", False)
 	FETCH_OPEN_ORDER = ("fetchOpenOrder", True)
 	FETCH_OPEN_ORDERS = ("fetchOpenOrders", True)
 	FETCH_ORDER = ("fetchOrder", True)
-	FETCH_ORDER_BOOK = ("fetchOrderBook", True)
+	FETCH_ORDER_BOOK = ("fetchOrderBook", False)
 	FETCH_ORDERS = ("fetchOrders", True)
 	FETCH_ORDERS_ALL_MARKETS = ("fetchOrdersAllMarkets", True)
-	FETCH_STATUS = ("fetchStatus", True)
-	FETCH_TICKER = ("fetchTicker", True)
-	FETCH_TICKERS = ("fetchTickers", True)
-	FETCH_TRADES = ("fetchTrades", True)
+	FETCH_STATUS = ("fetchStatus", False)
+	FETCH_TICKER = ("fetchTicker", False)
+	FETCH_TICKERS = ("fetchTickers", False)
+	FETCH_TRADES = ("fetchTrades", False)
 	FETCH_TRADING_FEE = ("fetchTradingFee", True)
 	SET_SANDBOX_MODE = ("setSandboxMode", True)
 	WITHDRAW = ("withdraw", True)
@@ -77,18 +78,64 @@ class MagicMethod(Enum):
 	def __init__(self, id: str, is_private: bool):
 		self.id = id
 		self.is_private = is_private
+		self.snake_id = re.sub(r"(?<=[a-z0-9])(?=[A-Z])", "_", id).lower()
+
+	@staticmethod
+	def normalize(target: str) -> str:
+		return str(target).replace("_", "").lower()
 
 	@staticmethod
 	def is_equivalent(target: str, method: Any):
-		return str(target).replace("_", "").lower() == method.id.replace("_", "").lower()
+		return MagicMethod.normalize(target) == MagicMethod.normalize(method.id)
 
 	@staticmethod
 	def find(target: str):
-		for method in MagicMethod:
-			if MagicMethod.is_equivalent(target, method):
-				return method
+		method = MAGIC_METHODS_BY_ALIAS.get(MagicMethod.normalize(target))
+
+		if method is None:
+			raise ValueError(f"""Unrecognized magic method "{target}".""")
+
+		return method
+
+
+# Built once, so resolving "fetch_order_book", "fetchOrderBook" or "FETCHORDERBOOK" is a single lookup.
+MAGIC_METHODS_BY_ALIAS: Dict[str, MagicMethod] = {MagicMethod.normalize(method.id): method for method in MagicMethod}
+
+
+class CachePolicy(Enum):
+	BYPASS = "bypass"
+	INVALIDATE = "invalidate"
+
+	@staticmethod
+	def get_by_id(id_: str):
+		if not id_:
+			return None
+
+		for policy in CachePolicy:
+			if policy.value == str(id_).lower():
+				return policy
+
+		raise ValueError(f"""Cache policy with id "{id_}" not found.""")
+
+
+class StreamChannel(Enum):
+	ORDER_BOOK = ("orderBook", "watch_order_book")
+	TICKER = ("ticker", "watch_ticker")
+	TRADES = ("trades", "watch_trades")
+
+	def __init__(self, id: str, method: str):
+		self.id = id
+		self.method = method
+
+	@staticmethod
+	def get_by_id(id_: str):
+		target = str(id_).replace("_", "").lower()
+
+		for channel in StreamChannel:
+			if target in [channel.id.lower(), channel.method.replace("_", "").lower()]:
+				return channel
 
-		raise ValueError(f"""Unrecognized magic method "{target}".""")
+		raise ValueError(f"""Stream channel with id "{id_}" not found.""")
 
 
 class Protocol(Enum):
@@ -129,6 +176,51 @@ class CCXTAPIRequest(APIRequest):
 	exchange_protocol: Protocol
 	exchange_method: str
 	exchange_method_parameters: DotMap[str, Any] = None
+	cache_policy: str = None
+	output_format: str = None
+	output_options: DotMap[str, Any] = None
+
+
+class RequestParameters(object):
+	def __init__(self, *layers: Mapping[str, Any]):
+		self.layers = layers
+		self.resolved: Dict[str, Any] = {}
+
+	def get(self, key: str, default: Any = None) -> Any:
+		if key in self.resolved:
+			return self.resolved[key]
+
+		for layer in self.layers:
+			value = layer.get(key)
+
+			if value is not None:
+				if isinstance(value, dict) and not isinstance(value, DotMap):
+					value = DotMap(value, _dynamic=False)
+
+				self.resolved[key] = value
+
+				return value
+
+		return default
+
+	def __getitem__(self, key: str) -> Any:
+		value = self.get(key)
+
+		if value is None:
+			raise KeyError(key)
+
+		return value
+
+	def __contains__(self, key: str) -> bool:
+		return self.get(key) is not None
+
+	def toDict(self) -> Dict[str, Any]:
+		output = {}
+
+		for layer in reversed(self.layers):
+			output.update(layer)
+
+		return output
 
 
 class APIResponse(DotMap):
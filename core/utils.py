@@ -49,6 +49,15 @@ def dump(target: Any):
 		return target
 
 
+class DatabaseMixin(object):
+	@property
+	def database(self):
+		# Imported on first use, the database path is only known once the properties are loaded.
+		from core.database import database
+
+		return database
+
+
 def escape_html(text: str) -> str:
 	return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;").replace('"', "&quot;").replace("'", "&apos;")
 
@@ -0,0 +1,27 @@
+create table if not exists main.candle
+(
+    exchange_id          TEXT    not null,
+    exchange_environment TEXT    not null,
+    symbol               TEXT    not null,
+    timeframe            TEXT    not null,
+    timestamp            integer not null,
+    open                 REAL,
+    high                 REAL,
+    low                  REAL,
+    close                REAL,
+    volume               REAL,
+    constraint candle_pk
+        primary key (exchange_id, exchange_environment, symbol, timeframe, timestamp)
+) without rowid;
+
+create table if not exists main.candle_series
+(
+    exchange_id          TEXT    not null,
+    exchange_environment TEXT    not null,
+    symbol               TEXT    not null,
+    timeframe            TEXT    not null,
+    start_timestamp      integer not null,
+    end_timestamp        integer not null,
+    constraint candle_series_pk
+        primary key (exchange_id, exchange_environment, symbol, timeframe)
+);
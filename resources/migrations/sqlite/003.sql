@@ -0,0 +1,55 @@
+create table if not exists main.trade_history
+(
+    account      TEXT    not null,
+    symbol       TEXT    not null,
+    id           TEXT    not null,
+    order_id     TEXT,
+    timestamp    integer not null,
+    side         TEXT,
+    price        REAL,
+    amount       REAL,
+    data         TEXT    not null,
+    constraint trade_history_pk
+        primary key (account, symbol, id)
+) without rowid;
+
+create index if not exists trade_history_timestamp_index
+    on trade_history (account, symbol, timestamp);
+
+create index if not exists trade_history_account_timestamp_index
+    on trade_history (account, timestamp);
+
+create table if not exists main.order_history
+(
+    account         TEXT    not null,
+    symbol          TEXT    not null,
+    id              TEXT    not null,
+    client_order_id TEXT,
+    timestamp       integer not null,
+    status          TEXT,
+    side            TEXT,
+    price           REAL,
+    amount          REAL,
+    filled          REAL,
+    data            TEXT    not null,
+    constraint order_history_pk
+        primary key (account, symbol, id)
+) without rowid;
+
+create index if not exists order_history_timestamp_index
+    on order_history (account, symbol, timestamp);
+
+create index if not exists order_history_account_timestamp_index
+    on order_history (account, timestamp);
+
+create table if not exists main.history_cursor
+(
+    account         TEXT    not null,
+    kind            TEXT    not null,
+    symbol          TEXT    not null,
+    start_timestamp integer not null default 0,
+    timestamp       integer not null,
+    synced_at       integer not null,
+    constraint history_cursor_pk
+        primary key (account, kind, symbol)
+);
@@ -0,0 +1,107 @@
+import asyncio
+import threading
+import time
+
+import pytest
+
+
+class CallTracker(object):
+	# Shared by the fake exchanges of a test, it records how many calls overlapped and where they ran.
+	def __init__(self):
+		self.lock = threading.Lock()
+		self.active = 0
+		self.peak = 0
+		self.calls = 0
+		self.threads = set()
+
+	def enter(self):
+		with self.lock:
+			self.active += 1
+			self.calls += 1
+			self.peak = max(self.peak, self.active)
+			self.threads.add(threading.get_ident())
+
+	def leave(self):
+		with self.lock:
+			self.active -= 1
+
+
+class FakeExchange(object):
+	def __init__(self, tracker: CallTracker, exchange_id: str = "fakeexchange", api_key: str = "key", duration: float = 0):
+		self.tracker = tracker
+		self.id = exchange_id
+		self.apiKey = api_key
+		self.options = {"environment": "production"}
+		self.duration = duration
+		self.closed = 0
+
+	def call(self, result):
+		self.tracker.enter()
+
+		try:
+			# Blocks like a synchronous ccxt REST call.
+			time.sleep(self.duration)
+		finally:
+			self.tracker.leave()
+
+		return result
+
+	def fetch_time(self):
+		return self.call(int(time.time() * 1000))
+
+	def fetch_balance(self):
+		return self.call({
+			"info": {},
+			"BTC": {"free": 0.5, "used": 0.0, "total": 0.5},
+			"USDT": {"free": 100.0, "used": 0.0, "total": 100.0},
+			"ETH": {"free": 0.0, "used": 0.0, "total": 0.0},
+			"total": {"BTC": 0.5, "USDT": 100.0, "ETH": 0.0},
+		})
+
+	async def close(self):
+		self.closed += 1
+
+
+class Heartbeat(object):
+	# Ticks on the event loop while it is entered, a blocked loop shows up as one long gap between two ticks.
+	def __init__(self, interval: float = 0.005):
+		self.interval = interval
+		self.beats = 0
+		self.longest = 0.0
+		self.stop = None
+		self.task = None
+
+	async def __aenter__(self):
+		self.stop = asyncio.Event()
+		self.task = asyncio.create_task(self.run())
+
+		return self
+
+	async def __aexit__(self, *args):
+		self.stop.set()
+		await self.task
+
+	async def run(self):
+		while not self.stop.is_set():
+			started_at = time.monotonic()
+			await asyncio.sleep(self.interval)
+			self.beats += 1
+			self.longest = max(self.longest, time.monotonic() - started_at)
+
+
+@pytest.fixture
+def tracker() -> CallTracker:
+	return CallTracker()
+
+
+@pytest.fixture
+def fake_exchange(tracker):
+	def build(exchange_id: str = "fakeexchange", api_key: str = "key", duration: float = 0) -> FakeExchange:
+		return FakeExchange(tracker, exchange_id, api_key, duration)
+
+	return build
+
+
+@pytest.fixture
+def heartbeat():
+	return Heartbeat
@@ -0,0 +1,71 @@
+import asyncio
+import time
+
+from core.candle_store import candle_store
+
+MINUTE = 60 * 1000
+
+
+class MemoryCandleStore(type(candle_store)):
+	# Keeps the series in memory instead of the database.
+	def __init__(self):
+		super().__init__()
+		self.candles = {}
+		self.coverage = {}
+
+	def touch(self, key):
+		pass
+
+	def store(self, key, candles):
+		for candle in candles:
+			self.candles[(key, int(candle[0]))] = candle
+
+	def select(self, key, start, end):
+		return [candle for (series, timestamp), candle in sorted(self.candles.items(), key=lambda item: item[0][1]) if series == key and start <= timestamp <= end]
+
+	def get_coverage(self, key):
+		return self.coverage.get(key)
+
+	def set_coverage(self, key, start, end):
+		self.coverage[key] = (start, end)
+
+
+def candle(timestamp):
+	return [timestamp, 1.0, 1.0, 1.0, 1.0, 1.0]
+
+
+def test_a_short_page_only_covers_the_candles_written():
+	store = MemoryCandleStore()
+	current = int(time.time() * 1000) // MINUTE * MINUTE
+	start = current - 9 * MINUTE
+	# The exchange answers with three candles and then an empty page, as during an outage.
+	available = [candle(start + index * MINUTE) for index in range(3)]
+
+	async def fetch(symbol, timeframe, since, limit):
+		return [item for item in available if item[0] >= since][:limit]
+
+	asyncio.run(store.get(fetch, "fake", "production", "BTC/USDT", "1m", start, 10))
+
+	assert store.coverage[("fake", "production", "BTC/USDT", "1m")] == (start, start + 2 * MINUTE)
+
+	available = [candle(start + index * MINUTE) for index in range(10)]
+	candles = asyncio.run(store.get(fetch, "fake", "production", "BTC/USDT", "1m", start, 10))
+
+	# The missing candles are fetched again instead of being treated as stored.
+	assert [item[0] for item in candles] == [start + index * MINUTE for index in range(10)]
+
+
+def test_an_empty_refresh_keeps_the_coverage():
+	store = MemoryCandleStore()
+	key = ("fake", "production", "BTC/USDT", "1m")
+	store.coverage[key] = (0, 10 * MINUTE)
+
+	class Fetcher(object):
+		parse_timeframe = staticmethod(lambda timeframe: 60)
+
+		def fetch_ohlcv(self, symbol, timeframe, since):
+			return [candle(since)] if since == 11 * MINUTE else []
+
+	store.refresh_series(Fetcher(), key)
+
+	assert store.coverage[key] == (0, 11 * MINUTE)
@@ -0,0 +1,42 @@
+import asyncio
+
+import core.controller
+from core.controller import ccxt_batch
+from core.types import APIResponseStatus, CCXTAPIRequest, CCXTAPIResponse
+
+
+async def fake_ccxt(request: CCXTAPIRequest) -> CCXTAPIResponse:
+	if request.exchange_method == "broken":
+		raise TypeError("broken call")
+
+	if request.exchange_method == "slow":
+		await asyncio.sleep(10)
+
+	response = CCXTAPIResponse()
+	response.title = f"""{request.exchange_id}.{request.exchange_method}"""
+	response.status = APIResponseStatus.SUCCESS
+	response.status_code = response.status.http_code
+	response.result = request.exchange_method
+
+	return response
+
+
+def build_requests(*methods):
+	return [CCXTAPIRequest(user_id=None, exchange_id="fake", exchange_environment=None, exchange_protocol=None, exchange_method=method) for method in methods]
+
+
+def test_an_exception_only_fails_its_own_call(monkeypatch):
+	monkeypatch.setattr(core.controller, "ccxt", fake_ccxt)
+
+	responses = asyncio.run(ccxt_batch(build_requests("fetch_ticker", "broken", "fetch_balance")))
+
+	assert [response.status for response in responses] == [APIResponseStatus.SUCCESS, APIResponseStatus.METHOD_EXECUTION_ERROR, APIResponseStatus.SUCCESS]
+	assert responses[1].result["exception"] == "broken call"
+
+
+def test_an_exception_cancels_the_rest_when_failing_fast(monkeypatch):
+	monkeypatch.setattr(core.controller, "ccxt", fake_ccxt)
+
+	responses = asyncio.run(asyncio.wait_for(ccxt_batch(build_requests("broken", "slow"), fail_fast=True), 5))
+
+	assert [response.status for response in responses] == [APIResponseStatus.METHOD_EXECUTION_ERROR, APIResponseStatus.EXPECTATION_FAILED_ERROR]
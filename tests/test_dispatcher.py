@@ -0,0 +1,47 @@
+import asyncio
+import threading
+
+from core.controller import ccxt
+from core.dispatcher import dispatcher
+from core.registry import exchange_registry
+from core.types import APIResponseStatus, CCXTAPIRequest, Protocol
+
+CONCURRENT_CALLS = 200
+CALL_DURATION = 0.02
+# Run inline, the calls would hold the loop for CONCURRENT_CALLS * CALL_DURATION (4 s) in one stretch.
+LOOP_STALL_BOUND = 1.0
+
+
+def build_request(user_id: str, exchange_id: str) -> CCXTAPIRequest:
+	return CCXTAPIRequest(
+		user_id=user_id,
+		exchange_id=exchange_id,
+		exchange_environment="production",
+		exchange_protocol=Protocol.REST.value,
+		exchange_method="fetch_time",
+	)
+
+
+def test_200_concurrent_run_calls_keep_the_loop_responsive(fake_exchange, tracker, heartbeat):
+	exchange_registry.register("user-slowexchange", "slowexchange", "production", None, lambda protocol: fake_exchange("slowexchange", duration=CALL_DURATION))
+	executed = dispatcher.summary().get("slowexchange", {}).get("count", 0)
+
+	async def main():
+		async with heartbeat() as beats:
+			responses = await asyncio.gather(*[ccxt(build_request("user-slowexchange", "slowexchange")) for _ in range(CONCURRENT_CALLS)])
+
+		exchange_registry.remove_user("user-slowexchange")
+
+		return responses, beats, threading.get_ident()
+
+	responses, beats, loop_thread = asyncio.run(main())
+
+	assert all(response.status == APIResponseStatus.SUCCESS for response in responses)
+
+	# Every blocking call went through the dispatcher onto its worker threads.
+	assert tracker.calls == CONCURRENT_CALLS
+	assert loop_thread not in tracker.threads
+	assert dispatcher.summary()["slowexchange"]["count"] - executed == CONCURRENT_CALLS
+
+	assert beats.beats > 0
+	assert beats.longest < LOOP_STALL_BOUND
@@ -0,0 +1,128 @@
+import json
+import tracemalloc
+
+from dotmap import DotMap
+from starlette.requests import Request
+
+from core.helpers import extract_all_parameters
+from core.utils import deep_merge
+
+REQUESTS = 1000
+
+BODY = json.dumps({
+	"token": "eyJhbGciOiJIUzI1NiJ9.e30.signature",
+	"exchangeId": "binance",
+	"exchangeEnvironment": "production",
+	"method": "fetch_ticker",
+	"parameters": {"symbol": "BTC/USDT"},
+}).encode()
+
+
+def build_request() -> Request:
+	async def receive():
+		return {"type": "http.request", "body": BODY, "more_body": False}
+
+	return Request({
+		"type": "http",
+		"method": "POST",
+		"path": "/run",
+		"path_params": {},
+		"query_string": b"",
+		"headers": [
+			(b"host", b"localhost"),
+			(b"user-agent", b"pytest"),
+			(b"accept", b"application/json"),
+			(b"content-type", b"application/json"),
+			(b"content-length", str(len(BODY)).encode()),
+			(b"cookie", b"session=abc"),
+		],
+	}, receive)
+
+
+# noinspection PyBroadException,PyUnusedLocal
+async def extract_all_parameters_eagerly(request: Request):
+	# The implementation replaced by the lazy view, kept to compare against.
+	headers = DotMap(dict(request.headers), _dynamic=False)
+	path_parameters = DotMap(request.path_params, _dynamic=False)
+	query_parameters = DotMap(request.query_params, _dynamic=False)
+
+	try:
+		body = DotMap(await request.json())
+	except Exception as exception:
+		body = DotMap({})
+
+	parameters = DotMap({}, _dynamic=False)
+	parameters = DotMap(deep_merge(parameters.toDict(), headers), _dynamic=False)
+	parameters = DotMap(deep_merge(parameters.toDict(), path_parameters), _dynamic=False)
+	parameters = DotMap(deep_merge(parameters.toDict(), query_parameters), _dynamic=False)
+	parameters = DotMap(deep_merge(parameters.toDict(), body.toDict()), _dynamic=False)
+	parameters = DotMap(deep_merge(parameters.toDict(), request.cookies), _dynamic=False)
+
+	return parameters
+
+
+def run(coroutine):
+	# Nothing awaited here suspends, so the coroutine completes without an event loop.
+	try:
+		coroutine.send(None)
+	except StopIteration as stop:
+		return stop.value
+
+	raise RuntimeError("The coroutine was suspended.")
+
+
+def measure(extract):
+	requests = [build_request() for _ in range(REQUESTS)]
+	results = []
+
+	tracemalloc.start()
+
+	try:
+		tracemalloc.reset_peak()
+		start, _ = tracemalloc.get_traced_memory()
+
+		for request in requests:
+			parameters = run(extract(request))
+			results.append((parameters, parameters.get("token"), parameters.get("exchangeId"), parameters.get("method")))
+
+		current, peak = tracemalloc.get_traced_memory()
+		blocks = sum(statistic.count for statistic in tracemalloc.take_snapshot().statistics("filename"))
+	finally:
+		tracemalloc.stop()
+
+	return {
+		"blocks": blocks / REQUESTS,
+		"bytes": (current - start) / REQUESTS,
+		"peak": (peak - start) / REQUESTS,
+	}
+
+
+def test_lazy_parameters_resolve_like_the_eager_merge():
+	eager = run(extract_all_parameters_eagerly(build_request()))
+	lazy = run(extract_all_parameters(build_request()))
+
+	for key in ["token", "exchangeId", "exchangeEnvironment", "method", "session", "user-agent"]:
+		assert lazy.get(key) == eager.get(key)
+
+	assert lazy.get("parameters").toDict() == eager.get("parameters").toDict()
+
+
+def test_json_body_is_parsed_once_per_request():
+	request = build_request()
+
+	first = run(extract_all_parameters(request))
+	second = run(extract_all_parameters(request))
+
+	assert first is second
+
+
+def test_lazy_parameters_allocate_less_per_request():
+	eager = measure(extract_all_parameters_eagerly)
+	lazy = measure(extract_all_parameters)
+
+	print()
+	for name, result in [("eager", eager), ("lazy", lazy)]:
+		print(f"""{name:>6}: {result["blocks"]:8.1f} blocks {result["bytes"]:10.1f} bytes {result["peak"]:10.1f} peak bytes per request""")
+
+	assert lazy["blocks"] < eager["blocks"]
+	assert lazy["bytes"] < eager["bytes"]
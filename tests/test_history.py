@@ -0,0 +1,107 @@
+import asyncio
+import sqlite3
+import time
+from pathlib import Path
+
+import pytest
+
+from core.history import history
+from core.properties import properties
+from core.types import MagicMethod
+
+DAY = 86400 * 1000
+MIGRATION = Path(__file__).parent.parent / "resources" / "migrations" / "sqlite" / "003.sql"
+
+
+class MemoryDatabase(object):
+	def __init__(self):
+		self.connection = sqlite3.connect(":memory:", isolation_level=None, check_same_thread=False)
+		self.connection.row_factory = sqlite3.Row
+		self.connection.executescript(MIGRATION.read_text())
+
+	def execute(self, query, parameters=None):
+		cursor = self.connection.cursor()
+
+		if isinstance(parameters, list) and parameters and isinstance(parameters[0], dict):
+			cursor.executemany(query, parameters)
+		else:
+			cursor.execute(query, parameters or ())
+
+		return [dict(row) for row in cursor.fetchall()]
+
+	select = insert = execute
+
+
+class MemoryHistory(type(history)):
+	def __init__(self):
+		super().__init__()
+		self.memory = MemoryDatabase()
+
+	@property
+	def database(self):
+		return self.memory
+
+
+class FakeExchange(object):
+	def __init__(self, orders):
+		self.orders = orders
+		self.calls = 0
+
+	async def fetch_orders(self, symbol=None, since=None, limit=None):
+		self.calls += 1
+		orders = sorted(self.orders.values(), key=lambda order: order["timestamp"])
+
+		if since is None:
+			return [dict(order) for order in orders[-limit:]]
+
+		return [dict(order) for order in orders if order["timestamp"] >= since][:limit]
+
+
+def order(id, timestamp, status):
+	return {"id": id, "symbol": "BTC/USDT", "timestamp": timestamp, "status": status}
+
+
+@pytest.fixture
+def settings(monkeypatch):
+	monkeypatch.setitem(properties.flattened, "history.sync.page_size", 2)
+	monkeypatch.setitem(properties.flattened, "history.sync.order_overlap", 86400)
+
+
+def test_old_open_orders_are_refreshed_on_every_sync(settings):
+	store = MemoryHistory()
+	now = int(time.time() * 1000)
+	exchange = FakeExchange({"old": order("old", now - 3 * DAY, "open"), "recent": order("recent", now, "closed")})
+
+	async def scenario():
+		await store.get(exchange.fetch_orders, MagicMethod.FETCH_ORDERS, "user", "BTC/USDT")
+
+		# Filled well after the overlap window that is fetched again.
+		exchange.orders["old"]["status"] = "closed"
+
+		return await store.get(exchange.fetch_orders, MagicMethod.FETCH_ORDERS, "user", "BTC/USDT", force=True)
+
+	orders = asyncio.run(scenario())
+
+	assert {item["id"]: item["status"] for item in orders} == {"old": "closed", "recent": "closed"}
+	assert store.summary()["stale"] == 0
+
+
+def test_open_orders_beyond_the_refresh_budget_pass_through(settings, monkeypatch):
+	monkeypatch.setitem(properties.flattened, "history.sync.refresh_pages", 1)
+	store = MemoryHistory()
+	now = int(time.time() * 1000)
+	orders = {"old": order("old", now - 5 * DAY, "open")}
+	orders.update({f"filled-{day}": order(f"filled-{day}", now - day * DAY, "closed") for day in range(1, 5)})
+	exchange = FakeExchange(orders)
+
+	async def scenario():
+		await store.get(exchange.fetch_orders, MagicMethod.FETCH_ORDERS, "user", "BTC/USDT", since=now - 6 * DAY)
+		exchange.orders["old"]["status"] = "canceled"
+
+		return await store.get(exchange.fetch_orders, MagicMethod.FETCH_ORDERS, "user", "BTC/USDT", since=now - 6 * DAY, limit=1, force=True)
+
+	result = asyncio.run(scenario())
+
+	assert store.summary()["stale"] == 1
+	assert store.summary()["passed_through"] == 1
+	assert result[0]["status"] == "canceled"
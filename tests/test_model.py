@@ -0,0 +1,67 @@
+import asyncio
+import threading
+
+from core.dispatcher import dispatcher
+from core.model import model
+from core.properties import properties
+
+CHATS = 100
+CALL_DURATION = 0.05
+# Run inline, the chats would hold the loop for CHATS * CALL_DURATION (5 s) in one stretch.
+LOOP_STALL_BOUND = 1.0
+
+
+async def balances(exchange) -> str:
+	# What the /balances handler does before replying.
+	return model.beautify(await model.get_balances(exchange))
+
+
+def test_100_chats_requesting_balances_at_once(fake_exchange, tracker, heartbeat):
+	exchanges = [fake_exchange("fakebalances", f"""chat-{chat}""", CALL_DURATION) for chat in range(CHATS)]
+	workers = int(properties.get_or_default("dispatcher.workers", 8))
+
+	async def main():
+		async with heartbeat() as beats:
+			messages = await asyncio.gather(*[balances(exchange) for exchange in exchanges])
+
+		return messages, beats, threading.get_ident()
+
+	messages, beats, loop_thread = asyncio.run(main())
+
+	assert all("BTC" in message and "USDT" in message and "ETH" not in message for message in messages)
+
+	# The blocking calls ran on the dispatcher workers, never more at once than it has.
+	assert tracker.calls == CHATS
+	assert loop_thread not in tracker.threads
+	assert tracker.peak <= workers
+
+	assert beats.beats > 0
+	assert beats.longest < LOOP_STALL_BOUND
+
+
+def test_one_user_is_limited_to_its_own_concurrency(fake_exchange, tracker):
+	exchange = fake_exchange("fakebalancesuser", "single-chat", CALL_DURATION)
+	limit = int(properties.get_or_default("dispatcher.user.concurrency", 2))
+
+	async def main():
+		await asyncio.gather(*[model.get_balances(exchange) for _ in range(10)])
+
+	# The API and the bot run separate loops, the same user may reach the exchange from both.
+	asyncio.run(main())
+	asyncio.run(main())
+
+	assert tracker.peak <= limit
+	assert tracker.calls == 20
+	assert dispatcher.summary()["fakebalancesuser"]["count"] == 20
+
+
+def test_formatters_leave_shared_responses_untouched():
+	# Cached and coalesced responses are handed to every caller, formatting one must not change the others.
+	balance = {"info": {"raw": True}, "timestamp": 1700000000000, "BTC": {"free": 0.5, "used": 0.0, "total": 0.5}}
+	description = {"id": "fake", "apiKey": "key", "secret": "secret", "password": "password"}
+
+	assert "info" not in model.handle_magic_command_output("fetch_balance", balance)
+	assert model.handle_magic_command_output("describe", description)["apiKey"] == "****"
+
+	assert balance["info"] == {"raw": True} and balance["timestamp"] == 1700000000000
+	assert description["apiKey"] == "key"
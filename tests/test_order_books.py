@@ -0,0 +1,84 @@
+import pytest
+
+import core.order_books
+from core.order_books import order_book_engine
+from core.properties import properties
+from core.types import StreamChannel
+
+SNAPSHOT = {"bids": [[99.0, 1.0]], "asks": [[101.0, 2.0]], "nonce": 1, "timestamp": 1700000000000}
+
+
+class FakeStreamHub(object):
+	def __init__(self):
+		self.listeners = {}
+
+	def listen(self, key, listener):
+		self.listeners[key] = listener
+
+	def unlisten(self, key, listener):
+		if self.listeners.get(key) is listener:
+			del self.listeners[key]
+
+	def publish(self, symbol, data):
+		self.listeners[("fake", "production", symbol, StreamChannel.ORDER_BOOK)](data)
+
+
+@pytest.fixture
+def stream_hub(monkeypatch):
+	hub = FakeStreamHub()
+	monkeypatch.setattr(core.order_books, "stream_hub", hub)
+
+	return hub
+
+
+@pytest.fixture
+def engine(stream_hub):
+	# A fresh engine, the module level one is shared with the rest of the process.
+	return type(order_book_engine)()
+
+
+def test_books_are_served_once_the_stream_delivers(engine, stream_hub):
+	engine.track("fake", "production", "BTC/USDT")
+
+	assert engine.get("fake", "production", "BTC/USDT") is None
+
+	stream_hub.publish("BTC/USDT", SNAPSHOT)
+
+	assert engine.get("fake", "production", "BTC/USDT")["bids"] == [[99.0, 1.0]]
+
+
+def test_tracking_is_capped(engine, stream_hub, monkeypatch):
+	monkeypatch.setitem(properties.flattened, "order_books.max_books", 2)
+
+	for symbol in ["A/USDT", "B/USDT", "C/USDT"]:
+		engine.track("fake", "production", symbol)
+
+	assert len(stream_hub.listeners) == 2
+	assert engine.summary()["refused"] == 1
+
+
+def test_repeated_failures_stop_tracking(engine, stream_hub, monkeypatch):
+	monkeypatch.setitem(properties.flattened, "order_books.max_failures", 3)
+	engine.track("fake", "production", "TYPO/USDT")
+
+	for _ in range(3):
+		stream_hub.publish("TYPO/USDT", None)
+
+	assert not stream_hub.listeners
+	assert engine.summary()["failed"] == 1
+
+	# The same market is not subscribed again until the idle timeout passes.
+	engine.track("fake", "production", "TYPO/USDT")
+	assert not stream_hub.listeners
+
+
+def test_unread_books_are_released_from_the_watch_loop(engine, stream_hub, monkeypatch):
+	monkeypatch.setitem(properties.flattened, "order_books.sweep_interval", 0)
+	monkeypatch.setitem(properties.flattened, "order_books.idle_timeout", 0)
+
+	engine.track("fake", "production", "BTC/USDT")
+	stream_hub.publish("BTC/USDT", SNAPSHOT)
+
+	# No read happened, the update itself swept the book away.
+	assert not stream_hub.listeners
+	assert engine.summary()["books"] == 0
@@ -0,0 +1,154 @@
+import copy
+
+import pytest
+
+from core.model import model
+from core.projections import project, project_all
+from core.types import MagicMethod
+
+ORDER = {
+	"id": "1", "clientOrderId": "c1", "timestamp": 1700000000000, "datetime": "2023-11-14T22:13:20.000Z", "lastTradeTimestamp": None,
+	"lastUpdateTimestamp": None, "status": "open", "symbol": "BTC/USDT", "type": "limit", "timeInForce": "GTC", "side": "buy",
+	"price": 35000.0, "average": None, "amount": 0.5, "filled": 0.1, "remaining": 0.4, "cost": 3500.0, "trades": [],
+	"fee": {"cost": 1.0, "currency": "USDT"}, "fees": [{"cost": 1.0, "currency": "USDT"}], "postOnly": False, "reduceOnly": False,
+	"stopPrice": None, "triggerPrice": None, "takeProfitPrice": None, "stopLossPrice": None, "info": {},
+}
+
+TRADE = {
+	"id": "t1", "order": "1", "timestamp": 1700000000000, "datetime": "2023-11-14T22:13:20.000Z", "symbol": "BTC/USDT", "type": "limit",
+	"takerOrMaker": "maker", "side": "buy", "price": 35000.0, "amount": 0.1, "cost": 3500.0,
+	"fee": {"cost": 1.0, "currency": "USDT"}, "fees": [{"cost": 1.0, "currency": "USDT"}], "info": {},
+}
+
+TICKER = {"symbol": "BTC/USDT", "timestamp": 1700000000000, "datetime": "2023-11-14T22:13:20.000Z", "high": 36000.0, "low": 34000.0, "last": 35000.0, "info": {}}
+
+MARKET = {
+	"id": "BTCUSDT", "symbol": "BTC/USDT", "base": "BTC", "quote": "USDT", "baseId": "BTC", "quoteId": "USDT", "taker": 0.001,
+	"maker": 0.0008, "active": True, "precision": {"amount": 6, "price": 2}, "info": {},
+}
+
+CURRENCY = {"id": "BTC", "numericId": 1, "code": "BTC", "name": "Bitcoin", "precision": 8, "active": True, "info": {}}
+
+DEPOSIT_ADDRESS = {"currency": "BTC", "address": "bc1q", "network": "BTC", "tag": None, "info": {}}
+
+TRADING_FEE = {"symbol": "BTC/USDT", "maker": 0.0008, "taker": 0.001, "percentage": True, "tierBased": False, "info": {}}
+
+STATUS = {"status": "ok", "updated": 1700000000000, "eta": None, "url": None, "info": {}}
+
+# Fields, in order, that every formatter returned before the projections replaced them.
+BASELINE = {
+	MagicMethod.CANCEL_ALL_ORDERS: ("list", ORDER, ("id", "clientOrderId", "timestamp", "datetime", "symbol", "type", "side", "price", "amount", "filled", "status", "fee")),
+	MagicMethod.CANCEL_ORDER: ("item", ORDER, ("id", "clientOrderId", "datetime", "symbol", "type", "side", "price", "amount", "filled", "status", "fee")),
+	MagicMethod.CREATE_ORDER: ("item", ORDER, ("id", "clientOrderId", "datetime", "symbol", "type", "side", "price", "amount", "filled", "status", "fee")),
+	MagicMethod.FETCH_CLOSED_ORDERS: ("list", ORDER, ("id", "clientOrderId", "datetime", "symbol", "type", "side", "price", "amount", "filled", "status", "fee")),
+	MagicMethod.FETCH_CURRENCIES: ("values", CURRENCY, ("id", "numericId", "precision", "name")),
+	MagicMethod.FETCH_DEPOSIT_ADDRESSES: ("values", DEPOSIT_ADDRESS, ("currency", "address", "network", "tag")),
+	MagicMethod.FETCH_MARKETS: ("markets", MARKET, ("id", "symbol", "base", "quote", "baseId", "quoteId", "taker", "maker")),
+	MagicMethod.FETCH_MY_TRADES: ("list", TRADE, ("datetime", "symbol", "order", "type", "side", "price", "amount", "fee")),
+	MagicMethod.FETCH_OPEN_ORDERS: ("list", ORDER, ("id", "clientOrderId", "datetime", "status", "symbol", "type", "side", "price", "amount", "filled")),
+	MagicMethod.FETCH_OPEN_ORDER: ("item", ORDER, ("id", "clientOrderId", "datetime", "status", "symbol", "type", "side", "price", "amount", "filled", "fees")),
+	MagicMethod.FETCH_ORDER: ("item", ORDER, ("id", "clientOrderId", "datetime", "status", "symbol", "type", "side", "price", "amount", "filled", "fees")),
+	MagicMethod.FETCH_ORDERS: ("list", ORDER, ("id", "clientOrderId", "datetime", "status", "symbol", "type", "side", "price", "amount", "filled", "fees")),
+	MagicMethod.FETCH_STATUS: ("item", STATUS, ("status",)),
+	MagicMethod.FETCH_TICKER: ("item", TICKER, ("symbol", "datetime", "last")),
+	MagicMethod.FETCH_TICKERS: ("values", TICKER, ("symbol", "datetime", "last")),
+	MagicMethod.FETCH_TRADES: ("list", TRADE, ("datetime", "symbol", "id", "order", "type", "side", "price", "amount", "fee")),
+	MagicMethod.FETCH_TRADING_FEE: ("item", TRADING_FEE, ("symbol", "maker", "taker")),
+}
+
+
+def build_response(shape, sample):
+	if shape == "item":
+		return copy.deepcopy(sample)
+
+	second = {**copy.deepcopy(sample), "id": f"""{sample.get("id")}-2""", "symbol": "ETH/USDT"}
+
+	if shape == "values":
+		return {"BTC": copy.deepcopy(sample), "ETH": second, **({"info": {"raw": True}} if sample is DEPOSIT_ADDRESS else {})}
+
+	return [copy.deepcopy(sample), second]
+
+
+def build_baseline(shape, response, fields):
+	def select(item):
+		return {field: item.get(field) for field in fields}
+
+	if shape == "item":
+		return select(response)
+
+	if shape == "values":
+		return {key: select(value) for key, value in response.items() if key != "info"}
+
+	if shape == "markets":
+		return {item.get("symbol"): select(item) for item in response}
+
+	return [select(item) for item in response]
+
+
+def assert_same_output(output, expected):
+	assert output == expected
+
+	# Rendered replies list the fields in dictionary order, so the order must match as well.
+	if isinstance(expected, list):
+		assert [list(item) for item in output] == [list(item) for item in expected]
+	elif all(isinstance(value, dict) for value in expected.values()) and expected:
+		assert list(output) == list(expected)
+		assert [list(value) for value in output.values()] == [list(value) for value in expected.values()]
+	else:
+		assert list(output) == list(expected)
+
+
+@pytest.mark.parametrize("magic_method", list(BASELINE), ids=lambda magic_method: magic_method.id)
+def test_default_projection_matches_baseline(magic_method):
+	shape, sample, fields = BASELINE[magic_method]
+	response = build_response("list" if shape == "markets" else shape, sample)
+	expected = build_baseline(shape, copy.deepcopy(response), fields)
+
+	output = model.handle_magic_command_output(magic_method.id, response)
+
+	assert_same_output(output, expected)
+
+
+def test_fetch_balance_matches_baseline():
+	response = {"info": {"raw": True}, "timestamp": 1700000000000, "datetime": None, "BTC": {"free": 1.0, "used": 0.0, "total": 1.0}}
+
+	output = model.handle_magic_command_output(MagicMethod.FETCH_BALANCE.id, copy.deepcopy(response))
+
+	assert output == {"datetime": None, "BTC": {"free": 1.0, "used": 0.0, "total": 1.0}}
+
+
+def test_fetch_ohlcv_matches_baseline():
+	response = [[1700000000000, 1.0, 2.0, 0.5, 1.5, 10.0], [1700000060000, 1.5, 2.5, 1.0, 2.0, 20.0]]
+
+	output = model.handle_magic_command_output(MagicMethod.FETCH_OHLCV.id, response)
+
+	assert output == {
+		1700000000000: {"open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5, "volume": 10.0},
+		1700000060000: {"open": 1.5, "high": 2.5, "low": 1.0, "close": 2.0, "volume": 20.0},
+	}
+
+
+def test_fetch_order_book_matches_baseline():
+	response = {"symbol": "BTC/USDT", "datetime": None, "timestamp": None, "nonce": 1, "bids": [[34999.0, 1.0]], "asks": [[35001.0, 2.0]]}
+
+	output = model.handle_magic_command_output(MagicMethod.FETCH_ORDER_BOOK.id, response)
+
+	assert_same_output(output, {
+		"bids": [{"price": 34999.0, "amount": 1.0}],
+		"asks": [{"price": 35001.0, "amount": 2.0}],
+		"datetime": None,
+		"symbol": "BTC/USDT",
+	})
+
+
+def test_order_builders_match_baseline():
+	# market/limit buy/sell and place_order, then get_open_orders.
+	assert list(project("order", ORDER)) == ["id", "clientOrderId", "symbol", "type", "side", "amount", "price", "filled", "status", "datetime", "fee"]
+	assert [list(item) for item in project_all("order", [ORDER], default="open_orders")] == [
+		["id", "clientOrderId", "status", "symbol", "type", "side", "price", "amount", "filled", "datetime", "fee"]
+	]
+
+
+def test_explicit_fields_replace_the_default():
+	assert model.handle_magic_command_output(MagicMethod.FETCH_ORDER.id, copy.deepcopy(ORDER), "id,status") == {"id": "1", "status": "open"}
+	assert list(model.handle_magic_command_output(MagicMethod.FETCH_ORDER.id, copy.deepcopy(ORDER), "minimal")) == ["id", "symbol", "side", "amount", "price", "status"]
@@ -0,0 +1,105 @@
+import asyncio
+import threading
+import time
+
+from core.helpers import update_user
+from core.properties import properties
+from core.registry import exchange_registry
+from core.types import Credentials, Protocol
+
+USERS = 500
+
+
+def build_credentials(user: int) -> Credentials:
+	return Credentials(
+		userTelegramId=str(100000 + user),
+		exchangeId="binance",
+		exchangeEnvironment="production",
+		exchangeApiKey=f"""key{user}""",
+		exchangeApiSecret=f"""secret{user}""",
+		exchangeOptions={},
+	)
+
+
+def test_500_sign_ins_build_no_clients():
+	before = exchange_registry.summary()
+
+	users = [update_user(build_credentials(user)) for user in range(USERS)]
+	after = exchange_registry.summary()
+
+	async def main():
+		for user in users:
+			exchange_registry.remove_user(user.id)
+
+	asyncio.run(main())
+
+	# A REST and a WebSocket entry per user, none of them built until it is first used.
+	assert after["exchanges"] - before["exchanges"] == 2 * USERS
+	assert after["materialized"] == before["materialized"]
+	assert after["bytes"] == before["bytes"]
+	assert exchange_registry.summary()["exchanges"] == before["exchanges"]
+
+
+def test_clients_are_built_per_protocol_and_closed_when_idle(fake_exchange, monkeypatch):
+	monkeypatch.setitem(properties.flattened, "registry.sweep_interval", 0)
+	monkeypatch.setitem(properties.flattened, "registry.instance_idle_timeout", 0.05)
+
+	built = []
+
+	def factory(protocol: str):
+		built.append(fake_exchange())
+
+		return built[-1]
+
+	exchange_registry.register("idle-user", "fakeexchange", "production", None, factory)
+	materialized = exchange_registry.summary()["materialized"]
+
+	async def main():
+		instance = exchange_registry.get("idle-user", "fakeexchange", "production", Protocol.REST.value)
+		assert exchange_registry.summary()["materialized"] == materialized + 1
+
+		with exchange_registry.lease(instance):
+			time.sleep(0.1)
+
+			# Leased clients survive the sweep even past their idle timeout.
+			exchange_registry.sweep()
+			assert exchange_registry.peek("idle-user", "fakeexchange", "production", Protocol.REST.value) is instance
+
+		time.sleep(0.1)
+		exchange_registry.sweep()
+		assert exchange_registry.peek("idle-user", "fakeexchange", "production", Protocol.REST.value) is None
+
+		await exchange_registry.shutdown()
+
+	asyncio.run(main())
+
+	assert len(built) == 1
+	assert built[0].closed == 1
+	assert exchange_registry.summary()["materialized"] == materialized
+
+
+def test_clients_are_built_off_the_event_loop(fake_exchange):
+	threads = []
+
+	def factory(protocol: str):
+		# Stands in for the synchronous market loading done by create_exchange.
+		threads.append(threading.get_ident())
+
+		return fake_exchange()
+
+	exchange_registry.register("executor-user", "fakeexchange", "production", None, factory)
+
+	async def main():
+		instance = await exchange_registry.materialize("executor-user", "fakeexchange", "production", Protocol.REST.value)
+
+		# Already built, later calls return the same client without going through the executor.
+		assert await exchange_registry.materialize("executor-user", "fakeexchange", "production", Protocol.REST.value) is instance
+
+		exchange_registry.remove_user("executor-user")
+
+		return threading.get_ident()
+
+	loop_thread = asyncio.run(main())
+
+	assert len(threads) == 1
+	assert threads[0] != loop_thread
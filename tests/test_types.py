@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from core.model import model
+from core.types import MagicMethod
+
+ROUNDS = 500
+
+NAMES = [spelling for method in MagicMethod for spelling in (method.id, method.snake_id, method.id.upper())]
+
+
+def find_linearly(target: str) -> MagicMethod:
+	# How commands were resolved before the alias table.
+	for method in MagicMethod:
+		if str(target).replace("_", "").lower() == method.id.replace("_", "").lower():
+			return method
+
+	raise ValueError(f"""Unrecognized magic method "{target}".""")
+
+
+def camel_to_snake(target: str) -> str:
+	result = [target[0].lower()]
+	i = 1
+	while i < len(target):
+		if target[i].isupper():
+			if (i + 1 < len(target) and target[i + 1].isupper()) or (i + 1 == len(target)):
+				start = i
+				while i + 1 < len(target) and target[i + 1].isupper():
+					i += 1
+				result.append('_' + target[start:i+1].lower())
+			else:
+				result.append('_' + target[i].lower())
+		else:
+			result.append(target[i])
+		i += 1
+
+	return ''.join(result)
+
+
+def resolve_linearly(name: str):
+	method = find_linearly(name)
+
+	# The output chain compared every branch in turn until one matched.
+	for candidate in MagicMethod:
+		if MagicMethod.is_equivalent(name, candidate):
+			break
+
+	return method, camel_to_snake(method.id)
+
+
+def resolve(name: str):
+	method = MagicMethod.find(name)
+	model.formatters.get(method)
+
+	return method, method.snake_id
+
+
+def measure(resolver) -> float:
+	started_at = time.perf_counter()
+
+	for _ in range(ROUNDS):
+		for name in NAMES:
+			resolver(name)
+
+	return time.perf_counter() - started_at
+
+
+def test_lookup_resolves_like_the_linear_scan():
+	assert len(MagicMethod) == 25
+
+	for name in NAMES:
+		assert resolve(name) == resolve_linearly(name)
+
+
+@pytest.mark.parametrize("resolver", [find_linearly, MagicMethod.find])
+def test_unknown_commands_are_rejected(resolver):
+	with pytest.raises(ValueError):
+		resolver("fetch_nothing")
+
+
+def test_lookup_is_faster_than_the_linear_scan():
+	linear = measure(resolve_linearly)
+	lookup = measure(resolve)
+	resolutions = ROUNDS * len(NAMES)
+
+	print()
+	print(f"""{resolutions} resolutions: linear {linear * 1e9 / resolutions:.0f} ns, lookup {lookup * 1e9 / resolutions:.0f} ns each""")
+
+	assert lookup < linear / 2